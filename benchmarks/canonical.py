@@ -0,0 +1,68 @@
+"""
+Micro-benchmark: serializing one clawshield execution.
+
+Compares the previous path, which encoded the action request for the
+approval hash and then the payload again for the log, against the shared
+canonical encoding used by the engine now.
+
+    python -m benchmarks.canonical [--size-kb 256] [--rounds 50]
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import time
+import uuid
+import argparse
+import hashlib
+from openexec.crypto import action_request_hash, canonical_hash, canonical_json
+from openexec.receipts import make_receipt
+
+def make_payload(size_kb: int) -> dict:
+    row = {"name": "item", "tags": ["a", "b", "c"], "value": 12345.678, "note": "x" * 40}
+    count = max(1, size_kb * 1024 // len(json.dumps(row)))
+    return {"template": "report", "rows": [dict(row, id=i) for i in range(count)]}
+
+def previous_path(action: str, payload: dict, result: dict) -> str:
+    canonical_hash({"action": action, "payload": payload})
+    json.dumps(payload, sort_keys=True)
+    exec_id = str(uuid.uuid4())
+    result_json = json.dumps(result, sort_keys=True)
+    return hashlib.sha256(f"{exec_id}:{result_json}".encode()).hexdigest()
+
+def shared_path(action: str, payload: dict, result: dict) -> str:
+    payload_json = canonical_json(payload)
+    action_request_hash(action, payload_json)
+    exec_id = str(uuid.uuid4())
+    return make_receipt(exec_id, json.dumps(result, sort_keys=True))
+
+def timed(fn, rounds: int, *args) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(*args)
+    return (time.perf_counter() - start) / rounds * 1000
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-kb", type=int, default=256)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    payload = make_payload(args.size_kb)
+    result = {"status": "ok"}
+    previous = timed(previous_path, args.rounds, "report", payload, result)
+    shared = timed(shared_path, args.rounds, "report", payload, result)
+    report = {
+        "payload_bytes": len(canonical_json(payload)),
+        "rounds": args.rounds,
+        "previous_ms": round(previous, 3),
+        "shared_ms": round(shared, 3),
+        "saving_pct": round((1 - shared / previous) * 100, 1),
+    }
+    print(json.dumps(report))
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Load and latency benchmark for /execute.
+
+Runs a matrix of scenarios and prints one JSON document with p50/p95/p99
+latency and requests/sec per cell, so runs can be diffed across commits:
+
+    python -m benchmarks.load --output bench.json
+    python -m benchmarks.load --target inprocess --mode clawshield \\
+        --payload-kb 1,256 --replay-ratio 0,0.9 --concurrency 1,32
+
+Targets are ``inprocess`` (ASGI transport, no sockets) and ``uvicorn`` (a
+local server on a free port). Storage is ``file`` (a temporary SQLite file)
+or ``memory`` (a SQLite file on a RAM-backed filesystem, falling back to a
+temporary file where /dev/shm is absent). Each (target, mode, storage)
+combination runs in a fresh subprocess, because the database URL and mode
+are read at import time. Approval artifacts are minted with
+``clawshield_client.mint_approval_artifact`` before timing starts.
+
+Requires httpx.
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import time
+import uuid
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TENANT = "bench-tenant"
+
+def _csv(cast):
+    return lambda text: [cast(v) for v in text.split(",") if v]
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+def _database_url(storage: str, workdir: str) -> str:
+    base = "/dev/shm" if storage == "memory" and os.path.isdir("/dev/shm") else workdir
+    return f"sqlite:///{os.path.join(base, f'openexec-bench-{uuid.uuid4().hex}.db')}"
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _build_requests(count: int, payload_kb: int, replay_ratio: float, mode: str, private_key):
+    from openexec.clawshield_client import mint_approval_artifact
+
+    payload = {"blob": "x" * (payload_kb * 1024)}
+    artifact = None
+    if mode == "clawshield":
+        artifact = mint_approval_artifact({"action": "echo", "payload": payload}, private_key, TENANT,
+                                          ttl_seconds=3600)
+    replays = int(count * replay_ratio)
+    warm = [f"warm-{uuid.uuid4().hex}" for _ in range(min(replays, 64) or 0)]
+    nonces = [warm[i % len(warm)] for i in range(replays)] + [uuid.uuid4().hex for _ in range(count - replays)]
+    body = {"action": "echo", "payload": payload}
+    if artifact:
+        body["approval_artifact"] = artifact
+    warmup = [json.dumps(dict(body, nonce=n)).encode() for n in warm]
+    timed = [json.dumps(dict(body, nonce=n)).encode() for n in nonces]
+    return warmup, timed
+
+async def _drive(client, bodies: List[bytes], concurrency: int) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    queue: "asyncio.Queue[bytes]" = asyncio.Queue()
+    for body in bodies:
+        queue.put_nowait(body)
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                body = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            resp = await client.post("/execute", content=body, headers={"content-type": "application/json"})
+            latencies.append(time.perf_counter() - start)
+            if resp.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(bodies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "rps": round(len(bodies) / wall, 1) if wall else 0.0,
+    }
+
+async def _run_matrix(client, cell: dict, private_key) -> List[dict]:
+    results = []
+    for payload_kb in cell["payload_kb"]:
+        for replay_ratio in cell["replay_ratio"]:
+            for concurrency in cell["concurrency"]:
+                warmup, bodies = _build_requests(cell["requests"], payload_kb, replay_ratio, cell["mode"], private_key)
+                for body in warmup:
+                    await client.post("/execute", content=body, headers={"content-type": "application/json"})
+                stats = await _drive(client, bodies, concurrency)
+                results.append({
+                    "target": cell["target"],
+                    "mode": cell["mode"],
+                    "storage": cell["storage"],
+                    "payload_kb": payload_kb,
+                    "replay_ratio": replay_ratio,
+                    "concurrency": concurrency,
+                    **stats,
+                })
+    return results
+
+async def _inprocess(cell: dict, private_key) -> List[dict]:
+    import httpx
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await _run_matrix(client, cell, private_key)
+
+async def _uvicorn(cell: dict, private_key) -> List[dict]:
+    import httpx
+
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=ROOT, env=os.environ.copy(),
+    )
+    try:
+        limits = httpx.Limits(max_connections=max(cell["concurrency"]))
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    if (await client.get("/ready")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn did not become ready")
+                await asyncio.sleep(0.1)
+            return await _run_matrix(client, cell, private_key)
+    finally:
+        server.terminate()
+        server.wait()
+
+def run_cell(cell: dict) -> List[dict]:
+    """Run one (target, mode, storage) cell in this process. Env must already be set."""
+    from openexec.clawshield_client import generate_test_keypair
+
+    private_key = None
+    if cell["mode"] == "clawshield":
+        private_key, public_key_pem = generate_test_keypair()
+        os.environ["CLAWSHIELD_PUBLIC_KEY"] = public_key_pem
+        os.environ["CLAWSHIELD_TENANT_ID"] = TENANT
+    runner = _inprocess if cell["target"] == "inprocess" else _uvicorn
+    return asyncio.run(runner(cell, private_key))
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="OpenExec /execute load benchmark")
+    parser.add_argument("--target", type=_csv(str), default=["inprocess", "uvicorn"])
+    parser.add_argument("--mode", type=_csv(str), default=["demo", "clawshield"])
+    parser.add_argument("--storage", type=_csv(str), default=["memory", "file"])
+    parser.add_argument("--payload-kb", type=_csv(int), default=[1, 64])
+    parser.add_argument("--replay-ratio", type=_csv(float), default=[0.0, 0.5])
+    parser.add_argument("--concurrency", type=_csv(int), default=[1, 16])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--output", default="")
+    parser.add_argument("--cell", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.cell:
+        print(json.dumps(run_cell(json.loads(args.cell))))
+        return {}
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="openexec-bench-") as workdir:
+        for target in args.target:
+            for mode in args.mode:
+                for storage in args.storage:
+                    cell = {
+                        "target": target, "mode": mode, "storage": storage,
+                        "payload_kb": args.payload_kb, "replay_ratio": args.replay_ratio,
+                        "concurrency": args.concurrency, "requests": args.requests,
+                    }
+                    env = dict(os.environ, OPENEXEC_MODE=mode, OPENEXEC_DB_URL=_database_url(storage, workdir))
+                    out = subprocess.check_output(
+                        [sys.executable, "-m", "benchmarks.load", "--cell", json.dumps(cell)],
+                        cwd=ROOT, env=env, text=True,
+                    )
+                    results.extend(json.loads(out.strip().splitlines()[-1]))
+                    db_path = env["OPENEXEC_DB_URL"][len("sqlite:///"):]
+                    for suffix in ("", "-wal", "-shm"):
+                        if os.path.exists(db_path + suffix):
+                            os.remove(db_path + suffix)
+
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return report
+
+if __name__ == "__main__":
+    main()
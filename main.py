@@ -1,20 +1,56 @@
-from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager, nullcontext
+from collections import deque
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import iterate_in_threadpool
 from pydantic import BaseModel
-from openexec.models import ExecutionRequest
-from openexec.receipts import verify_receipt
-from openexec.engine import execute
-from openexec.approval_validator import ApprovalError
-from openexec.db import init_db
-import os
+from typing import List, Optional
+from openexec.models import ExecutionRequest, MerkleProof
+from openexec.receipts import (
+    verify_receipt, get_root, get_execution_proof, verify_anchored_receipt, start_sealer, stop_sealer,
+)
+from openexec.engine import ExecutionPending, execute_response_async, execute_batch_async
+from openexec.jobs import submit as submit_execution, start_workers, stop_workers
+from openexec.executor import get_pool_size, run_engine, run_verify, shutdown_executor, warm_process_pool
+from openexec.approval_validator import ApprovalError, check_approval
+from openexec.bulkhead import BulkheadFull, HandlerTimeout
+from openexec.admission import AdmissionRejected, admission_key, get_admission
+from openexec.registry import action_label, bulkhead_stats, has_cpu_bound_actions
+from openexec.db import init_db, close_group_commit_writer
+from openexec.replay import get_replay_index, peek_replay_index
+from openexec.response_cache import get_response_cache
+from openexec.memo import get_memo
+from openexec.streams import execute_stream
+from openexec.shards import shard_stats, sharding_enabled
+from openexec.metrics import count_outcome, render as render_metrics
+from openexec.ledger import list_executions, export_executions, decode_cursor, get_execution
+from openexec.policy import get_policy, install_reload_signal
+from openexec.tables import PENDING_STATUSES
+import json
+import asyncio
+import tempfile
 import datetime
 
 VERSION = "0.1.10"
+MAX_BATCH_SIZE = 500
+SPOOL_MAX_MEMORY = 1024 * 1024
 
 @asynccontextmanager
 async def lifespan(application):
     init_db()
+    install_reload_signal()
+    # Warm the replay filter from the ledger before serving, off the loop.
+    await run_engine(get_replay_index)
+    if has_cpu_bound_actions():
+        await run_engine(warm_process_pool)
+    start_sealer()
+    start_workers()
     yield
+    stop_workers()
+    stop_sealer()
+    shutdown_executor()
+    close_group_commit_writer()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -24,25 +60,35 @@ async def root():
 
 @app.get("/health")
 async def health():
-    exec_mode = os.getenv("OPENEXEC_MODE", "demo")
-    sig_status = "enabled" if exec_mode == "clawshield" else "disabled"
-    allowed_actions = os.getenv("OPENEXEC_ALLOWED_ACTIONS", "")
-    if allowed_actions:
-        allow_list = [a.strip() for a in allowed_actions.split(",") if a.strip()]
-        restriction = "restricted"
-    else:
-        allow_list = None
-        restriction = "open"
+    policy = get_policy()
     result = {
         "status": "healthy",
-        "exec_mode": exec_mode,
-        "signature_verification": sig_status,
-        "restriction": restriction,
+        "exec_mode": policy.mode_name,
+        "signature_verification": "enabled" if policy.mode_name == "clawshield" else "disabled",
+        "restriction": "restricted" if policy.allow_list else "open",
+        "policy_version": policy.version,
     }
-    if allow_list is not None:
-        result["allow_list"] = allow_list
+    if policy.allow_list:
+        result["allow_list"] = list(policy.allow_list)
     else:
         result["warning"] = "No execution allow-list configured"
+    replay_index = peek_replay_index()
+    if replay_index is not None:
+        result["replay_filter"] = replay_index.stats()
+    bulkheads = bulkhead_stats()
+    if bulkheads:
+        result["bulkheads"] = bulkheads
+    response_cache = get_response_cache()
+    if response_cache is not None:
+        result["response_cache"] = response_cache.stats()
+    memo = get_memo()
+    if memo is not None:
+        result["memo"] = memo.stats()
+    if sharding_enabled():
+        result["shards"] = shard_stats()
+    admission = get_admission()
+    if admission is not None:
+        result["admission"] = admission.stats()
     return result
 
 @app.get("/version")
@@ -52,19 +98,242 @@ def version():
         "timestamp": datetime.datetime.utcnow().isoformat()
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/ready")
 def ready():
     return {"ready": True}
 
+def _admitted(request: ExecutionRequest):
+    # Checked before any signature verification or database work.
+    admission = get_admission()
+    return admission.admit(admission_key(request)) if admission is not None else nullcontext()
+
+def _shed(request: ExecutionRequest, e: AdmissionRejected) -> HTTPException:
+    count_outcome(action_label(request.action), get_policy().mode_name, "rejected", e.reason)
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": e.retry_after_header})
+
 @app.post("/execute")
-def execute_action(request: ExecutionRequest):
+async def execute_action(request: ExecutionRequest):
+    try:
+        with _admitted(request):
+            body = await execute_response_async(request)
+        return Response(content=body, media_type="application/json")
+    except AdmissionRejected as e:
+        raise _shed(request, e)
+    except ApprovalError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except BulkheadFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except HandlerTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except ExecutionPending as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Location": f"/executions/{e.exec_id}"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+class _StreamSlot:
+    """Settles a stream once its response is over: the in-flight slot is held
+    until the last line has been sent, then released exactly once."""
+
+    def __init__(self, admission, close):
+        self.admission = admission
+        self.close = close
+        self.left = False
+
+    def leave(self) -> None:
+        if not self.left and self.admission is not None:
+            self.left = True
+            self.admission.leave()
+
+    async def release(self) -> None:
+        # Runs as the response's background task, which also covers a client
+        # that left before the body was iterated.
+        try:
+            if self.close is not None:
+                await self.close()
+        finally:
+            self.leave()
+
+async def _released(lines, slot: _StreamSlot):
+    if not hasattr(lines, "__aiter__"):
+        lines = iterate_in_threadpool(lines)
+    try:
+        async for line in lines:
+            yield line
+    finally:
+        slot.leave()
+
+@app.post("/execute/stream")
+async def execute_action_stream(request: ExecutionRequest):
+    admission = get_admission()
+    try:
+        if admission is not None:
+            admission.enter()
+            try:
+                admission.take(admission_key(request))
+            except AdmissionRejected:
+                admission.leave()
+                raise
+        try:
+            exec_id, lines, close = await execute_stream(request)
+        except Exception:
+            if admission is not None:
+                admission.leave()
+            raise
+    except AdmissionRejected as e:
+        raise _shed(request, e)
+    except ApprovalError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except ExecutionPending as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Location": f"/executions/{e.exec_id}"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    slot = _StreamSlot(admission, close)
+    return StreamingResponse(_released(lines, slot), media_type="application/x-ndjson",
+                             headers={"X-Execution-Id": exec_id}, background=BackgroundTask(slot.release))
+
+@app.post("/execute/async", status_code=202)
+async def execute_action_async(request: ExecutionRequest):
     try:
-        result = execute(request)
-        return result.model_dump()
+        with _admitted(request):
+            status = await run_engine(submit_execution, request)
+    except AdmissionRejected as e:
+        raise _shed(request, e)
     except ApprovalError as e:
         raise HTTPException(status_code=403, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    # A nonce that already finished is not accepted again; report its outcome.
+    code = 202 if status["status"] in PENDING_STATUSES else 200
+    return JSONResponse(status, status_code=code, headers={"Location": f"/executions/{status['id']}"})
+
+def _error_status(e: Exception) -> int:
+    if isinstance(e, AdmissionRejected):
+        return 429
+    if isinstance(e, ApprovalError):
+        return 403
+    if isinstance(e, BulkheadFull):
+        return 503
+    if isinstance(e, HandlerTimeout):
+        return 504
+    if isinstance(e, ExecutionPending):
+        return 409
+    if isinstance(e, ValueError):
+        return 400
+    return 500
+
+@app.post("/execute/batch")
+async def execute_batch_action(requests: List[ExecutionRequest]):
+    if len(requests) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {MAX_BATCH_SIZE} requests")
+    admission = get_admission()
+    if admission is None:
+        outcomes = await execute_batch_async(requests)
+    else:
+        # Each item is charged to its own tenant; the batch holds one in-flight slot.
+        admitted, outcomes = [], []
+        for request in requests:
+            try:
+                admission.take(admission_key(request))
+                admitted.append(request)
+                outcomes.append(None)
+            except AdmissionRejected as e:
+                count_outcome(action_label(request.action), get_policy().mode_name, "rejected", e.reason)
+                outcomes.append(e)
+        executed = iter([])
+        if admitted:
+            try:
+                admission.enter()
+            except AdmissionRejected as e:
+                raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": e.retry_after_header})
+            try:
+                executed = iter(await execute_batch_async(admitted))
+            finally:
+                admission.leave()
+        outcomes = [outcome if outcome is not None else next(executed) for outcome in outcomes]
+    results = []
+    for outcome in outcomes:
+        if isinstance(outcome, Exception):
+            results.append({"status_code": _error_status(outcome), "detail": str(outcome)})
+        else:
+            results.append({"status_code": 200, "result": outcome.model_dump()})
+    return {"results": results}
+
+async def _spool_body(request: Request):
+    # Spool the body before responding: StreamingResponse's disconnect
+    # listener competes for receive(), so the body cannot be read while the
+    # response streams. A spooled file keeps large batches out of memory.
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+def _check_approval_line(line: bytes) -> dict:
+    try:
+        item = json.loads(line)
+    except ValueError:
+        return {"valid": False, "error": "Invalid JSON"}
+    if not isinstance(item, dict) or not isinstance(item.get("action_request"), dict):
+        return {"valid": False, "error": "Each item needs an action_request object and an artifact"}
+    return check_approval(item["action_request"], item.get("artifact") or {})
+
+async def _stream_approval_verdicts(spool):
+    # Keep a couple of checks per verify thread in flight, so the pool stays
+    # busy but the response is never held in memory as a whole.
+    window = 2 * get_pool_size("verify")
+    pending = deque()
+    index = 0
+    try:
+        for line in spool:
+            if not line.strip():
+                continue
+            pending.append((index, asyncio.ensure_future(run_verify(_check_approval_line, line))))
+            index += 1
+            if len(pending) >= window:
+                i, task = pending.popleft()
+                yield json.dumps({"index": i, **await task}) + "\n"
+        while pending:
+            i, task = pending.popleft()
+            yield json.dumps({"index": i, **await task}) + "\n"
+    finally:
+        spool.close()
+
+@app.post("/approvals/verify")
+async def verify_approvals(request: Request):
+    spool = await _spool_body(request)
+    return StreamingResponse(_stream_approval_verdicts(spool), media_type="application/x-ndjson")
+
+@app.get("/executions")
+def get_executions(action: Optional[str] = None, approved: Optional[bool] = None,
+                   since: Optional[datetime.datetime] = None, until: Optional[datetime.datetime] = None,
+                   cursor: Optional[str] = None, limit: int = 100):
+    try:
+        return list_executions(action, approved, since, until, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/executions/export")
+def export_execution_log(action: Optional[str] = None, approved: Optional[bool] = None,
+                         since: Optional[datetime.datetime] = None, until: Optional[datetime.datetime] = None,
+                         cursor: Optional[str] = None):
+    if cursor is not None:
+        try:
+            decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(export_executions(action, approved, since, until, cursor),
+                             media_type="application/x-ndjson")
+
+@app.get("/executions/{exec_id}")
+def get_execution_status(exec_id: str):
+    execution = get_execution(exec_id)
+    if execution is None:
+        raise HTTPException(status_code=404, detail="Execution not found")
+    return execution
 
 class ReceiptVerifyRequest(BaseModel):
     exec_id: str
@@ -75,3 +344,26 @@ class ReceiptVerifyRequest(BaseModel):
 def verify_receipt_endpoint(req: ReceiptVerifyRequest):
     valid = verify_receipt(req.exec_id, req.result, req.receipt)
     return {"valid": valid}
+
+@app.get("/receipts/roots/{batch}")
+def get_receipt_root(batch: int):
+    root = get_root(batch)
+    if root is None:
+        raise HTTPException(status_code=404, detail="Unknown receipt root")
+    return root
+
+@app.get("/receipts/proofs/{exec_id}")
+def get_receipt_proof(exec_id: str):
+    proof = get_execution_proof(exec_id)
+    if proof is None:
+        raise HTTPException(status_code=404, detail="Execution not found or not yet anchored")
+    return proof
+
+class ProofVerifyRequest(BaseModel):
+    receipt: str
+    proof: MerkleProof
+
+@app.post("/receipts/proofs/verify")
+def verify_receipt_proof(req: ProofVerifyRequest):
+    valid = verify_anchored_receipt(req.receipt, req.proof.batch, req.proof.path)
+    return {"valid": valid}
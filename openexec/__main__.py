@@ -0,0 +1,101 @@
+"""
+Headless JSONL executor.
+
+Executes ExecutionRequest objects, one JSON object per line, without
+starting the HTTP server, and streams one result line per request in input
+order:
+
+    python -m openexec requests.jsonl > results.jsonl
+    producer | python -m openexec --parallel 16
+
+Each output line is ``{"index": n, "result": {...}}`` with the execution
+result, receipt and proof, or ``{"index": n, "error": "...", "type": "..."}``.
+At most ``--parallel`` requests run at once and at most twice that many are
+held in memory, so input of any length streams through. Only the standard
+library is imported up front; the engine and its database, model and
+crypto dependencies load once the arguments are parsed.
+"""
+
+import os
+import sys
+import json
+import argparse
+from collections import deque
+
+DEFAULT_PARALLEL = 8
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m openexec", description="Execute ExecutionRequest JSONL")
+    parser.add_argument("input", nargs="?", default="-", help="JSONL file of requests, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="File for result lines, or - for stdout")
+    parser.add_argument("-p", "--parallel", type=int,
+                        default=int(os.getenv("OPENEXEC_CLI_PARALLEL", DEFAULT_PARALLEL)),
+                        help="Requests executed concurrently")
+    parser.add_argument("--no-seal", action="store_true",
+                        help="Leave receipts for the server's sealer instead of anchoring them on exit")
+    return parser.parse_args(argv)
+
+def _execute_line(line: str) -> dict:
+    from openexec.engine import execute
+    from openexec.models import ExecutionRequest
+
+    try:
+        request = ExecutionRequest.model_validate_json(line)
+        return {"result": execute(request).model_dump()}
+    except Exception as e:
+        return {"error": str(e), "type": type(e).__name__}
+
+def run(lines, out, parallel: int = DEFAULT_PARALLEL) -> int:
+    """Execute request lines and write result lines; return the number of failures."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    failures = 0
+    pending: deque = deque()
+
+    def emit():
+        nonlocal failures
+        index, future = pending.popleft()
+        outcome = future.result()
+        failures += "error" in outcome
+        out.write(json.dumps({"index": index, **outcome}) + "\n")
+        out.flush()
+
+    with ThreadPoolExecutor(max_workers=max(1, parallel), thread_name_prefix="openexec-cli") as pool:
+        index = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            pending.append((index, pool.submit(_execute_line, line)))
+            index += 1
+            if len(pending) >= 2 * max(1, parallel):
+                emit()
+        while pending:
+            emit()
+    return failures
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+
+    from openexec.db import init_db, close_group_commit_writer
+    from openexec.executor import shutdown_executor
+    from openexec.receipts import seal_pending
+
+    init_db()
+    source = sys.stdin if args.input == "-" else open(args.input)
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        failures = run(source, out, args.parallel)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+        close_group_commit_writer()
+        shutdown_executor()
+    if not args.no_seal:
+        while seal_pending():
+            pass
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
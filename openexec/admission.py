@@ -0,0 +1,183 @@
+"""
+Per-tenant admission control.
+
+Requests are admitted before any signature verification, hashing or
+database work. Two limits apply:
+
+* a token bucket per tenant, keyed on the approval artifact's
+  ``tenant_id``, with ``mode:<mode>`` as the key for requests without an
+  artifact, refilled at ``OPENEXEC_TENANT_RATE`` requests/sec up to
+  ``OPENEXEC_TENANT_BURST``;
+* a global cap of ``OPENEXEC_MAX_IN_FLIGHT`` requests being executed.
+
+``OPENEXEC_TENANT_LIMITS`` overrides rate and burst per key, for example
+``{"acme": {"rate": 50, "burst": 100}}``. A request over either limit is
+rejected with AdmissionRejected, which carries a Retry-After hint.
+
+The tenant id is read before the signature is checked, so a forged id can
+only spend that tenant's tokens, never skip verification. The number of
+tracked buckets is bounded; the least recently used bucket is dropped
+first, and it comes back full.
+"""
+
+import os
+import json
+import math
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Optional
+from openexec.policy import get_policy
+
+DEFAULT_MAX_BUCKETS = 10_000
+
+class AdmissionRejected(Exception):
+    def __init__(self, message: str, reason: str, retry_after: float):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated", "rejected")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.rejected = 0
+
+    def take(self, count: int = 1) -> float:
+        """Take ``count`` tokens and return 0, or return the seconds until they would be available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= count:
+            self.tokens -= count
+            return 0.0
+        self.rejected += 1
+        if self.rate <= 0 or count > self.burst:
+            return math.inf
+        return (count - self.tokens) / self.rate
+
+class AdmissionController:
+    def __init__(self, rate: float = 0.0, burst: Optional[float] = None, max_in_flight: int = 0,
+                 overrides: Optional[Dict[str, dict]] = None, max_buckets: int = DEFAULT_MAX_BUCKETS):
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self.max_in_flight = max_in_flight
+        self.overrides = overrides or {}
+        self.max_buckets = max_buckets
+        self.in_flight = 0
+        self.rate_limited = 0
+        self.overloaded = 0
+
+    def _limits(self, key: str):
+        override = self.overrides.get(key)
+        if override is None:
+            return self.rate, self.burst
+        rate = float(override.get("rate", self.rate))
+        return rate, float(override.get("burst", max(rate, 1.0)))
+
+    def _bucket(self, key: str) -> Optional[TokenBucket]:
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            self._buckets.move_to_end(key)
+            return bucket
+        rate, burst = self._limits(key)
+        if rate <= 0 and key not in self.overrides:
+            return None
+        bucket = self._buckets[key] = TokenBucket(rate, burst)
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        return bucket
+
+    def take(self, key: str, count: int = 1) -> None:
+        """Charge ``count`` requests to the tenant's bucket or raise AdmissionRejected."""
+        with self._lock:
+            bucket = self._bucket(key)
+            wait = bucket.take(count) if bucket is not None else 0.0
+            if wait:
+                self.rate_limited += 1
+        if wait:
+            raise AdmissionRejected(f"Rate limit exceeded for '{key}'", "rate_limited",
+                                    wait if wait != math.inf else 60.0)
+
+    def enter(self) -> None:
+        with self._lock:
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                self.overloaded += 1
+                raise AdmissionRejected("Server is at its in-flight request limit", "overloaded", 1.0)
+            self.in_flight += 1
+
+    def leave(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    @contextmanager
+    def admit(self, key: str, count: int = 1):
+        self.enter()
+        try:
+            self.take(key, count)
+            yield
+        finally:
+            self.leave()
+
+    def stats(self) -> dict:
+        with self._lock:
+            tenants = {
+                key: {"rate": b.rate, "burst": b.burst, "tokens": round(min(b.burst, b.tokens), 3),
+                      "rejected": b.rejected}
+                for key, b in self._buckets.items() if b.rejected or key in self.overrides
+            }
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "max_in_flight": self.max_in_flight,
+                "in_flight": self.in_flight,
+                "rate_limited": self.rate_limited,
+                "overloaded": self.overloaded,
+                "tracked_tenants": len(self._buckets),
+                "tenants": tenants,
+            }
+
+def admission_key(request) -> str:
+    artifact = request.approval_artifact
+    if artifact is not None and artifact.tenant_id:
+        return artifact.tenant_id
+    return f"mode:{get_policy().mode_name}"
+
+_lock = threading.Lock()
+_controller: Optional[AdmissionController] = None
+_configured = False
+
+def get_admission() -> Optional[AdmissionController]:
+    """Return the process-wide controller, or None when no limit is configured."""
+    global _controller, _configured
+    if not _configured:
+        with _lock:
+            if not _configured:
+                rate = float(os.getenv("OPENEXEC_TENANT_RATE", "0"))
+                burst = os.getenv("OPENEXEC_TENANT_BURST", "")
+                max_in_flight = int(os.getenv("OPENEXEC_MAX_IN_FLIGHT", "0"))
+                overrides = json.loads(os.getenv("OPENEXEC_TENANT_LIMITS", "") or "{}")
+                if rate > 0 or max_in_flight > 0 or overrides:
+                    _controller = AdmissionController(
+                        rate, float(burst) if burst else None, max_in_flight, overrides,
+                        int(os.getenv("OPENEXEC_TENANT_BUCKETS", DEFAULT_MAX_BUCKETS)),
+                    )
+                _configured = True
+    return _controller
+
+def reset_admission() -> None:
+    global _controller, _configured
+    with _lock:
+        _controller = None
+        _configured = False
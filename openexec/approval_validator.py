@@ -1,25 +1,37 @@
-import os
 import datetime
-from openexec.crypto import canonical_hash, verify_ed25519_signature
+from typing import Optional
+from openexec.crypto import canonical_hash, verify_ed25519
+from openexec.policy import Policy, get_policy
+from openexec.metrics import timed
+from openexec.models import ApprovalArtifact
+from pydantic import ValidationError
 
 class ApprovalError(Exception):
-    pass
+    def __init__(self, message: str, reason: str = "rejected"):
+        super().__init__(message)
+        # Short, fixed label for metrics; the message carries the detail.
+        self.reason = reason
 
-def validate_approval(action_request: dict, artifact: dict) -> None:
-    request_hash = canonical_hash(action_request)
+def validate_approval(action_request: dict, artifact: dict, request_hash: Optional[str] = None,
+                      policy: Optional[Policy] = None) -> None:
+    policy = policy or get_policy()
+    action = action_request.get("action", "")
+    if request_hash is None:
+        with timed("canonical", action):
+            request_hash = canonical_hash(action_request)
     if artifact.get("action_hash") != request_hash:
-        raise ApprovalError("Action hash mismatch: approval does not match this request")
+        raise ApprovalError("Action hash mismatch: approval does not match this request", "hash_mismatch")
 
     expires_at = artifact.get("expires_at", "")
     if expires_at:
         try:
             expiry_time = datetime.datetime.fromisoformat(expires_at)
             if expiry_time < datetime.datetime.utcnow():
-                raise ApprovalError("Approval artifact expired")
+                raise ApprovalError("Approval artifact expired", "expired")
         except ValueError:
-            raise ApprovalError("Invalid expires_at timestamp")
+            raise ApprovalError("Invalid expires_at timestamp", "invalid_expiry")
     else:
-        raise ApprovalError("Missing expires_at in approval artifact")
+        raise ApprovalError("Missing expires_at in approval artifact", "missing_expiry")
 
     message = (
         artifact["approval_id"]
@@ -29,14 +41,41 @@ def validate_approval(action_request: dict, artifact: dict) -> None:
         + artifact["expires_at"]
     ).encode()
 
-    public_key_pem = os.getenv("CLAWSHIELD_PUBLIC_KEY", "")
-    if not public_key_pem:
-        raise ApprovalError("CLAWSHIELD_PUBLIC_KEY not configured")
+    with timed("signature", action):
+        _verify_signature(policy, message, artifact)
+
+    expected_tenant = policy.tenant_id
+    if expected_tenant and artifact.get("tenant_id") != expected_tenant:
+        raise ApprovalError(f"Tenant mismatch: expected {expected_tenant}, got {artifact.get('tenant_id')}", "tenant")
+
+def _verify_signature(policy: Policy, message: bytes, artifact: dict) -> None:
+    keyring = policy.keyring
+    if keyring is None:
+        raise ApprovalError(f"Keyring misconfigured: {policy.keyring_error}", "keyring")
+    if not len(keyring):
+        raise ApprovalError("CLAWSHIELD_PUBLIC_KEY not configured", "no_key")
+
+    key_id = artifact.get("key_id")
+    if key_id:
+        public_key = keyring.get(key_id)
+        if public_key is None:
+            raise ApprovalError(f"Unknown signing key: {key_id}", "unknown_key")
+        candidates = [public_key]
+    else:
+        candidates = keyring.keys()
 
     signature_b64 = artifact.get("signature", "")
-    if not verify_ed25519_signature(public_key_pem, message, signature_b64):
-        raise ApprovalError("Invalid signature: approval artifact is not authentic")
+    if not any(verify_ed25519(k, message, signature_b64) for k in candidates):
+        raise ApprovalError("Invalid signature: approval artifact is not authentic", "signature")
 
-    expected_tenant = os.getenv("CLAWSHIELD_TENANT_ID", "")
-    if expected_tenant and artifact.get("tenant_id") != expected_tenant:
-        raise ApprovalError(f"Tenant mismatch: expected {expected_tenant}, got {artifact.get('tenant_id')}")
+def check_approval(action_request: dict, artifact: dict) -> dict:
+    """Run validate_approval without raising, for pre-verification."""
+    try:
+        artifact = ApprovalArtifact.model_validate(artifact).model_dump()
+    except ValidationError:
+        return {"valid": False, "error": "Malformed approval artifact"}
+    try:
+        validate_approval(action_request, artifact)
+    except ApprovalError as e:
+        return {"valid": False, "error": str(e), "approval_id": artifact["approval_id"]}
+    return {"valid": True, "approval_id": artifact["approval_id"]}
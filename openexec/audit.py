@@ -0,0 +1,270 @@
+"""
+Full-ledger receipt audit.
+
+``/receipts/verify`` only checks a result string supplied by the caller.
+An audit instead walks execution_log in (timestamp, id) order with a
+streaming cursor and recomputes every stored receipt from the stored result.
+It then rebuilds every sealed Merkle batch from its live and archived
+leaves. Results held in execution_blob are decompressed on the workers and
+must match their content hash. A batch with fewer leaves than its root recorded has lost rows, and
+a batch whose rebuilt root differs has had receipts rewritten.
+
+Hashing runs on the process pool in fixed-size chunks, with a bounded
+window of chunks in flight. Progress is recorded as a checkpoint (the last
+audited row and batch, plus the running report). A run limited with
+``max_seconds`` stops cleanly, and the next run resumes where it left off.
+Once an audit completes, the next run starts from its checkpoint and only
+covers rows and batches added since. Pass ``restart`` to audit everything
+again.
+
+Streamed results are re-hashed from their execution_chunk rows on the
+main process, one storage chunk at a time, and compared on the workers.
+
+Rows on tenant shards (``OPENEXEC_SHARDS``) are not audited; the report
+lists those shards under ``unaudited_shards``.
+
+Archived rows are covered by the batch check only, since their results
+live in the compressed segments. Queued and running rows are skipped; once
+they complete and are sealed, their batch covers them.
+
+Run ``python -m openexec.audit --checkpoint audit.json`` from cron.
+"""
+
+import os
+import json
+import time
+import argparse
+from collections import deque
+from typing import List, Optional, Sequence
+from sqlalchemy import select, tuple_, union_all
+from openexec.blobs import blob_hash, decode
+from openexec.db import SessionLocal
+from openexec.executor import get_process_workers, submit_process
+from openexec.ledger import decode_cursor, encode_cursor
+from openexec.shards import all_shards
+from openexec.merkle import build_levels, leaf_hash
+from openexec.receipts import make_receipt
+from openexec.streams import STREAMED, stream_receipt
+from openexec.tables import ArchivedExecution, ExecutionBlob, ExecutionLog, PENDING_STATUSES, ReceiptRoot
+
+DEFAULT_CHUNK = 5000
+STREAM = "stream"
+CHECKPOINT_INTERVAL = 30.0
+MAX_REPORTED = 1000
+
+def _check_rows(rows: Sequence[tuple]) -> dict:
+    mismatched, missing = [], []
+    unreceipted = 0
+    for exec_id, result, receipt, ref, codec, data in rows:
+        if codec == STREAM:
+            # Streamed results arrive with their receipt already recomputed.
+            if data != receipt:
+                mismatched.append(exec_id)
+            continue
+        if result is None and data is not None:
+            # Decompressed here, on the worker; a blob must match its key.
+            result = decode(codec, data)
+            if blob_hash(result) != ref:
+                mismatched.append(exec_id)
+                continue
+        if result is None:
+            missing.append(exec_id)
+        elif receipt is None:
+            # Written before receipts were stored; the receipt is derived
+            # from the result when the row is sealed, so nothing to compare.
+            unreceipted += 1
+        elif make_receipt(exec_id, result) != receipt:
+            mismatched.append(exec_id)
+    return {"rows": len(rows), "mismatched": mismatched, "missing_results": missing, "unreceipted": unreceipted}
+
+def _check_batch(batch: int, root: str, size: int, receipts: List[Optional[str]]) -> Optional[dict]:
+    if len(receipts) != size:
+        error = "missing_rows" if len(receipts) < size else "extra_rows"
+        return {"batch": batch, "error": error, "expected": size, "found": len(receipts)}
+    try:
+        rebuilt = build_levels([leaf_hash(r) for r in receipts])[-1][0].hex()
+    except (TypeError, ValueError):
+        rebuilt = None
+    if rebuilt != root:
+        return {"batch": batch, "error": "root_mismatch", "expected": root, "found": rebuilt}
+    return None
+
+def _new_report() -> dict:
+    return {
+        "rows": 0,
+        "batches": 0,
+        "mismatches": 0,
+        "missing_results": 0,
+        "unreceipted": 0,
+        "batch_errors": 0,
+        "mismatched_ids": [],
+        "missing_result_ids": [],
+        "batch_failures": [],
+    }
+
+def _extend(items: list, new: list) -> None:
+    items.extend(new[:MAX_REPORTED - len(items)])
+
+def load_checkpoint(path: Optional[str]) -> Optional[dict]:
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_checkpoint(path: Optional[str], state: dict) -> None:
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+class _Window:
+    """Bounded, ordered window of chunk futures on the process pool."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.futures: deque = deque()
+
+    def submit(self, fn, *args, on_done) -> None:
+        self.futures.append((submit_process(fn, *args), on_done))
+        if len(self.futures) >= self.size:
+            self.pop()
+
+    def pop(self) -> None:
+        future, on_done = self.futures.popleft()
+        on_done(future.result())
+
+    def drain(self) -> None:
+        while self.futures:
+            self.pop()
+
+def audit(checkpoint: Optional[str] = None, max_seconds: Optional[float] = None, restart: bool = False,
+          chunk_size: int = DEFAULT_CHUNK) -> dict:
+    """Audit rows and batches added since the checkpoint; return the report."""
+    state = None if restart else load_checkpoint(checkpoint)
+    if state is None or state.get("complete"):
+        report = _new_report()
+    else:
+        report = state["report"]
+    after = state.get("after") if state else None
+    last_batch = state.get("batch", 0) if state else 0
+
+    start = time.monotonic()
+    deadline = start + max_seconds if max_seconds else None
+    next_save = start + CHECKPOINT_INTERVAL
+    window = _Window(2 * get_process_workers())
+    position = {"after": after, "batch": last_batch}
+    rows_this_run = 0
+    complete = True
+
+    def save(done: bool) -> None:
+        save_checkpoint(checkpoint, {**position, "complete": done, "report": report})
+
+    def rows_done(outcome: dict, cursor: str) -> None:
+        nonlocal rows_this_run, next_save
+        report["rows"] += outcome["rows"]
+        rows_this_run += outcome["rows"]
+        report["mismatches"] += len(outcome["mismatched"])
+        report["missing_results"] += len(outcome["missing_results"])
+        report["unreceipted"] += outcome["unreceipted"]
+        _extend(report["mismatched_ids"], outcome["mismatched"])
+        _extend(report["missing_result_ids"], outcome["missing_results"])
+        position["after"] = cursor
+        if time.monotonic() >= next_save:
+            save(False)
+            next_save = time.monotonic() + CHECKPOINT_INTERVAL
+
+    def batch_done(failure: Optional[dict], batch: int) -> None:
+        report["batches"] += 1
+        if failure is not None:
+            report["batch_errors"] += 1
+            _extend(report["batch_failures"], [failure])
+        position["batch"] = batch
+
+    db = SessionLocal()
+    chunks_db = SessionLocal()
+    try:
+        query = (
+            db.query(ExecutionLog.id, ExecutionLog.result, ExecutionLog.receipt, ExecutionLog.status,
+                     ExecutionLog.timestamp, ExecutionLog.result_ref, ExecutionBlob.codec, ExecutionBlob.data)
+            .outerjoin(ExecutionBlob, ExecutionBlob.hash == ExecutionLog.result_ref)
+            .order_by(ExecutionLog.timestamp, ExecutionLog.id)
+            .execution_options(stream_results=True)
+        )
+        if after is not None:
+            query = query.filter(tuple_(ExecutionLog.timestamp, ExecutionLog.id) > tuple_(*decode_cursor(after)))
+        chunk: list = []
+        for row in query.yield_per(chunk_size):
+            if row.status in PENDING_STATUSES:
+                continue
+            if row.status == STREAMED:
+                chunk.append((row.id, None, row.receipt, None, STREAM, stream_receipt(chunks_db, row.id)))
+            else:
+                chunk.append((row.id, row.result, row.receipt, row.result_ref, row.codec, row.data))
+            if len(chunk) >= chunk_size:
+                cursor = encode_cursor(row.timestamp, row.id)
+                window.submit(_check_rows, chunk, on_done=lambda o, c=cursor: rows_done(o, c))
+                chunk = []
+                if deadline is not None and time.monotonic() >= deadline:
+                    complete = False
+                    break
+        else:
+            if chunk:
+                cursor = encode_cursor(row.timestamp, row.id)
+                window.submit(_check_rows, chunk, on_done=lambda o, c=cursor: rows_done(o, c))
+        window.drain()
+
+        if complete:
+            leaves = union_all(
+                select(ExecutionLog.merkle_batch.label("batch"), ExecutionLog.merkle_index.label("idx"),
+                       ExecutionLog.receipt.label("receipt")),
+                select(ArchivedExecution.merkle_batch, ArchivedExecution.merkle_index, ArchivedExecution.receipt),
+            ).subquery()
+            roots = db.query(ReceiptRoot).filter(ReceiptRoot.id > last_batch).order_by(ReceiptRoot.id).all()
+            for entry in roots:
+                receipts = [r for (r,) in db.execute(
+                    select(leaves.c.receipt).where(leaves.c.batch == entry.id).order_by(leaves.c.idx)
+                )]
+                window.submit(_check_batch, entry.id, entry.root, entry.size, receipts,
+                              on_done=lambda f, b=entry.id: batch_done(f, b))
+                if deadline is not None and time.monotonic() >= deadline:
+                    complete = False
+                    break
+            window.drain()
+    finally:
+        chunks_db.close()
+        db.close()
+
+    save(complete)
+    elapsed = time.monotonic() - start
+    return {
+        **report,
+        "complete": complete,
+        "elapsed_s": round(elapsed, 3),
+        "rows_per_s": round(rows_this_run / elapsed, 1) if elapsed else 0.0,
+        "ok": not (report["mismatches"] or report["missing_results"] or report["batch_errors"]),
+        "unaudited_shards": [shard.name for shard in all_shards()],
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m openexec.audit", description="Audit every execution receipt")
+    parser.add_argument("--checkpoint", default="", help="JSON file to resume from and record progress in")
+    parser.add_argument("--max-seconds", type=float, default=None, help="Stop and checkpoint after this long")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and audit everything")
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="Rows hashed per worker task")
+    args = parser.parse_args(argv)
+
+    from openexec.db import init_db
+    from openexec.executor import shutdown_executor
+
+    init_db()
+    try:
+        report = audit(args.checkpoint or None, args.max_seconds, args.restart, args.chunk)
+    finally:
+        shutdown_executor()
+    print(json.dumps(report))
+    return 0 if report["ok"] else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,167 @@
+"""
+Content-addressed storage for payload and result bodies.
+
+With ``OPENEXEC_BLOB_CODEC`` set to ``zlib`` or ``lzma``, payload and result
+text of at least ``OPENEXEC_BLOB_MIN_BYTES`` is moved out of execution_log
+into execution_blob. There it is keyed by the sha256 of the canonical text
+and stored once, compressed. The log row keeps only ``payload_ref`` /
+``result_ref``, so a payload sent a thousand times is stored once. Smaller
+bodies stay inline, where a blob row would cost more than it saves.
+
+Bodies are packed when the row is recorded and written in the same
+transaction as the row, through a ``before_flush`` hook. A blob that
+already exists is left alone. Reads resolve references transparently, and
+decoded bodies are kept in a small LRU. Rows written before the codec was
+enabled, or with it disabled, keep their text inline and read as before.
+"""
+
+import os
+import lzma
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+from sqlalchemy import event, select
+from openexec.db import SessionLocal
+from openexec.tables import ExecutionBlob, ExecutionLog
+
+DEFAULT_MIN_BYTES = 256
+DEFAULT_CACHE_SIZE = 128
+
+_CODECS = {
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+_COLUMNS = (("payload", "payload_ref"), ("result", "result_ref"))
+
+def get_codec() -> Optional[str]:
+    codec = os.getenv("OPENEXEC_BLOB_CODEC", "").lower()
+    if codec in ("", "off", "none"):
+        return None
+    if codec not in _CODECS:
+        raise ValueError(f"Unknown blob codec: {codec}")
+    return codec
+
+def get_min_bytes() -> int:
+    return int(os.getenv("OPENEXEC_BLOB_MIN_BYTES", DEFAULT_MIN_BYTES))
+
+def blob_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def decode(codec: str, data: bytes) -> str:
+    return _CODECS[codec][1](data).decode()
+
+def pack(log: ExecutionLog) -> None:
+    """Move large inline bodies of a row into blobs, if a codec is enabled."""
+    codec = get_codec()
+    if codec is None:
+        return
+    blobs = log.__dict__.setdefault("_blobs", {})
+    min_bytes = get_min_bytes()
+    for column, ref_column in _COLUMNS:
+        text = getattr(log, column)
+        if text is None or len(text) < min_bytes:
+            continue
+        ref = blob_hash(text)
+        blobs[ref] = {"hash": ref, "codec": codec, "size": len(text), "data": _CODECS[codec][0](text.encode())}
+        setattr(log, column, None)
+        setattr(log, ref_column, ref)
+
+def pending_blobs(log: ExecutionLog) -> Dict[str, dict]:
+    """Blob rows packed from this log row that must be written with it."""
+    return log.__dict__.get("_blobs", {})
+
+def _insert_blobs(session, rows: list) -> None:
+    dialect = session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        session.execute(insert(ExecutionBlob).on_conflict_do_nothing(index_elements=["hash"]), rows)
+        return
+    existing = set(session.scalars(select(ExecutionBlob.hash).where(ExecutionBlob.hash.in_([r["hash"] for r in rows]))))
+    missing = [r for r in rows if r["hash"] not in existing]
+    if missing:
+        session.execute(ExecutionBlob.__table__.insert(), missing)
+
+@event.listens_for(SessionLocal, "before_flush")
+def _store_blobs(session, flush_context, instances) -> None:
+    # Covers every writer (direct inserts, group commit, the async queue)
+    # and re-writes the blobs if a failed batch is retried row by row.
+    rows: Dict[str, dict] = {}
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, ExecutionLog):
+            pack(obj)
+            rows.update(pending_blobs(obj))
+    if rows:
+        _insert_blobs(session, list(rows.values()))
+
+_cache_lock = threading.Lock()
+_cache: "OrderedDict[str, str]" = OrderedDict()
+
+def cached_text(ref: str) -> Optional[str]:
+    with _cache_lock:
+        text = _cache.get(ref)
+        if text is not None:
+            _cache.move_to_end(ref)
+        return text
+
+def _cache_put(ref: str, text: str) -> None:
+    size = int(os.getenv("OPENEXEC_BLOB_CACHE_SIZE", DEFAULT_CACHE_SIZE))
+    with _cache_lock:
+        _cache[ref] = text
+        _cache.move_to_end(ref)
+        while len(_cache) > size:
+            _cache.popitem(last=False)
+
+def load_texts(db, refs: Iterable[str]) -> Dict[str, str]:
+    """Decoded bodies for the given references, fetched in one query."""
+    texts: Dict[str, str] = {}
+    missing = set()
+    for ref in refs:
+        text = cached_text(ref)
+        if text is None:
+            missing.add(ref)
+        else:
+            texts[ref] = text
+    if missing:
+        query = select(ExecutionBlob.hash, ExecutionBlob.codec, ExecutionBlob.data).where(ExecutionBlob.hash.in_(missing))
+        for ref, codec, data in db.execute(query):
+            texts[ref] = decode_cached(ref, codec, data)
+    return texts
+
+def decode_cached(ref: str, codec: str, data: bytes) -> str:
+    text = decode(codec, data)
+    _cache_put(ref, text)
+    return text
+
+def body_text(db, text: Optional[str], ref: Optional[str]) -> Optional[str]:
+    """The inline text if present, otherwise the referenced blob's."""
+    if text is not None or ref is None:
+        return text
+    return load_texts(db, [ref]).get(ref)
+
+def resolve(db, rows: Iterable[ExecutionLog]) -> None:
+    """Fill in payload and result of read-only rows from their blobs."""
+    rows = list(rows)
+    refs = {getattr(row, ref_column) for row in rows for column, ref_column in _COLUMNS
+            if getattr(row, column) is None and getattr(row, ref_column) is not None}
+    if not refs:
+        return
+    texts = load_texts(db, refs)
+    for row in rows:
+        for column, ref_column in _COLUMNS:
+            ref = getattr(row, ref_column)
+            if getattr(row, column) is None and ref is not None:
+                setattr(row, column, texts.get(ref))
+
+def collect_garbage(db) -> int:
+    """Delete blobs no live row references; archived rows carry their bodies inline."""
+    referenced = select(ExecutionLog.payload_ref).where(ExecutionLog.payload_ref.isnot(None)).union(
+        select(ExecutionLog.result_ref).where(ExecutionLog.result_ref.isnot(None))
+    )
+    deleted = db.query(ExecutionBlob).filter(ExecutionBlob.hash.notin_(referenced)).delete(synchronize_session=False)
+    db.commit()
+    return deleted
@@ -0,0 +1,176 @@
+"""
+Per-action bulkheads.
+
+An action registered with limits gets a Bulkhead: at most ``max_concurrency``
+handler calls run at once, at most ``max_queue`` more wait for a slot, and
+anything beyond that is rejected immediately with BulkheadFull instead of
+queueing without bound. ``timeout`` bounds the whole call, queue wait
+included, and raises HandlerTimeout.
+
+A sync handler cannot be interrupted, so on timeout it keeps its slot until
+it actually returns; the bulkhead then reflects real load rather than the
+number of callers still waiting. Coroutine handlers are cancelled. The same
+holds for CPU-bound handlers running on the process pool. The HandlerTimeout
+of a handler that is still running carries its future as ``late``, so the
+caller can still record the result when it arrives.
+"""
+
+import time
+import asyncio
+import inspect
+import threading
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Optional
+from openexec.executor import get_executor
+
+class BulkheadFull(Exception):
+    pass
+
+class HandlerTimeout(Exception):
+    def __init__(self, message: str, late: Optional[Future] = None):
+        super().__init__(message)
+        self.late = late
+
+class _ThreadWaiter:
+    def __init__(self):
+        self._event = threading.Event()
+
+    def grant(self) -> bool:
+        self._event.set()
+        return True
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        return self._event.wait(timeout)
+
+class _AsyncWaiter:
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.future = loop.create_future()
+
+    def grant(self) -> bool:
+        try:
+            self.loop.call_soon_threadsafe(self._set)
+        except RuntimeError:
+            return False
+        return True
+
+    def _set(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+class Bulkhead:
+    def __init__(self, name: str, max_concurrency: Optional[int] = None, max_queue: int = 0,
+                 timeout: Optional[float] = None):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._waiters: deque = deque()
+        self.in_flight = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _enter(self, waiter) -> bool:
+        """Take a slot now (True), join the queue (False) or raise BulkheadFull."""
+        with self._lock:
+            if self.max_concurrency is None or self.in_flight < self.max_concurrency:
+                self.in_flight += 1
+                return True
+            if len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                raise BulkheadFull(f"Action '{self.name}' is at capacity")
+            self._waiters.append(waiter)
+            return False
+
+    def _abandon(self, waiter) -> bool:
+        """Leave the queue; False if the waiter was already handed a slot."""
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+                return True
+            except ValueError:
+                return False
+
+    def release(self) -> None:
+        with self._lock:
+            # Hand the slot straight to the next waiter so in_flight never dips.
+            while self._waiters:
+                if self._waiters.popleft().grant():
+                    return
+            self.in_flight -= 1
+
+    def _timed_out(self, late: Optional[Future] = None) -> HandlerTimeout:
+        with self._lock:
+            self.timed_out += 1
+        return HandlerTimeout(f"Action '{self.name}' exceeded its {self.timeout}s timeout", late)
+
+    def _remaining(self, start: float) -> Optional[float]:
+        if self.timeout is None:
+            return None
+        return max(0.0, self.timeout - (time.monotonic() - start))
+
+    async def call_async(self, handler: Callable, payload: dict, submit: Optional[Callable] = None) -> dict:
+        start = time.monotonic()
+        waiter = _AsyncWaiter(asyncio.get_running_loop())
+        if not self._enter(waiter):
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self._remaining(start))
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if not self._abandon(waiter):
+                    self.release()
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                raise self._timed_out()
+
+        is_coroutine = inspect.iscoroutinefunction(handler)
+        try:
+            if is_coroutine:
+                task = asyncio.ensure_future(handler(payload))
+            else:
+                # Release on the worker's own future: an asyncio wrapper can be
+                # cancelled with its loop while the handler still runs.
+                thread_future = (submit or get_executor("handler").submit)(handler, payload)
+                task = asyncio.wrap_future(thread_future)
+        except BaseException:
+            self.release()
+            raise
+        (task if is_coroutine else thread_future).add_done_callback(lambda _: self.release())
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self._remaining(start))
+        except asyncio.TimeoutError:
+            if is_coroutine:
+                task.cancel()
+                raise self._timed_out()
+            raise self._timed_out(thread_future)
+
+    def call(self, handler: Callable, payload: dict, submit: Optional[Callable] = None) -> dict:
+        start = time.monotonic()
+        waiter = _ThreadWaiter()
+        if not self._enter(waiter) and not waiter.wait(self._remaining(start)):
+            if not self._abandon(waiter):
+                self.release()
+            raise self._timed_out()
+
+        if inspect.iscoroutinefunction(handler):
+            future = get_executor("handler").submit(asyncio.run, handler(payload))
+        else:
+            future = (submit or get_executor("handler").submit)(handler, payload)
+        future.add_done_callback(lambda _: self.release())
+        try:
+            return future.result(timeout=self._remaining(start))
+        except FutureTimeoutError:
+            raise self._timed_out(future)
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "timeout": self.timeout,
+                "in_flight": self.in_flight,
+                "queued": len(self._waiters),
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
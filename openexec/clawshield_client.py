@@ -8,6 +8,7 @@ In production, ClawShield mints these artifacts externally.
 import uuid
 import base64
 import datetime
+from typing import Optional
 from openexec.crypto import canonical_hash
 from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
 from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
@@ -22,7 +23,8 @@ def mint_approval_artifact(
     action_request: dict,
     private_key: Ed25519PrivateKey,
     tenant_id: str,
-    ttl_seconds: int = 300
+    ttl_seconds: int = 300,
+    key_id: Optional[str] = None
 ) -> dict:
     approval_id = str(uuid.uuid4())
     action_hash = canonical_hash(action_request)
@@ -40,7 +42,7 @@ def mint_approval_artifact(
     signature = private_key.sign(message)
     signature_b64 = base64.b64encode(signature).decode()
 
-    return {
+    artifact = {
         "approval_id": approval_id,
         "tenant_id": tenant_id,
         "action_hash": action_hash,
@@ -48,3 +50,6 @@ def mint_approval_artifact(
         "expires_at": expires_at,
         "signature": signature_b64
     }
+    if key_id:
+        artifact["key_id"] = key_id
+    return artifact
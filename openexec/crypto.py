@@ -2,23 +2,58 @@ import hashlib
 import json
 import base64
 import os
-from typing import Union
-from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
-from cryptography.hazmat.primitives.serialization import load_pem_public_key
-from cryptography.exceptions import InvalidSignature
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional, Union
+
+# cryptography is imported on first use: demo mode never verifies a
+# signature, and the import is a noticeable part of a cold start.
+if TYPE_CHECKING:
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+
+def canonical_json(data) -> str:
+    return json.dumps(data, sort_keys=True, separators=(",", ":"))
 
 def canonical_hash(data: Union[dict, str]) -> str:
     if isinstance(data, dict):
-        data = json.dumps(data, sort_keys=True, separators=(",", ":"))
+        data = canonical_json(data)
     return hashlib.sha256(data.encode()).hexdigest()
 
-def verify_ed25519_signature(public_key_pem: str, message: bytes, signature_b64: str) -> bool:
+def action_request_hash(action: str, payload_json: str) -> str:
+    """canonical_hash({"action": action, "payload": payload}) from the payload's canonical JSON.
+
+    The digest is fed piecewise, so the payload is encoded once and can be
+    reused for storage instead of serializing the whole request again.
+    """
+    digest = hashlib.sha256(b'{"action":')
+    digest.update(json.dumps(action).encode())
+    digest.update(b',"payload":')
+    digest.update(payload_json.encode())
+    digest.update(b"}")
+    return digest.hexdigest()
+
+@lru_cache(maxsize=64)
+def load_ed25519_public_key(public_key_pem: str) -> Optional["Ed25519PublicKey"]:
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+    from cryptography.hazmat.primitives.serialization import load_pem_public_key
+
     try:
         public_key = load_pem_public_key(public_key_pem.encode())
-        if not isinstance(public_key, Ed25519PublicKey):
-            return False
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(public_key, Ed25519PublicKey):
+        return None
+    return public_key
+
+def verify_ed25519(public_key: "Ed25519PublicKey", message: bytes, signature_b64: str) -> bool:
+    try:
         signature = base64.b64decode(signature_b64)
         public_key.verify(signature, message)
         return True
-    except (InvalidSignature, ValueError, Exception):
+    except Exception:
+        return False
+
+def verify_ed25519_signature(public_key_pem: str, message: bytes, signature_b64: str) -> bool:
+    public_key = load_ed25519_public_key(public_key_pem)
+    if public_key is None:
         return False
+    return verify_ed25519(public_key, message, signature_b64)
@@ -1,10 +1,48 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.exc import IntegrityError
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+from openexec.settings import load_config
 import os
+import time
+import queue
+import threading
 
-DATABASE_URL = os.getenv("OPENEXEC_DB_URL", "sqlite:///openexec.db")
+_config = load_config().get("database", {})
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
+DATABASE_URL = os.getenv("OPENEXEC_DB_URL", _config.get("url", "sqlite:///openexec.db"))
+
+SQLITE_DEFAULTS = {
+    "journal_mode": "WAL",
+    "synchronous": "FULL",
+    "busy_timeout_ms": 5000,
+}
+
+def make_engine(url: str, config: Optional[dict] = None):
+    config = _config if config is None else config
+    kwargs = {}
+    if "sqlite" in url:
+        kwargs["connect_args"] = {"check_same_thread": False}
+    if ":memory:" not in url and url != "sqlite://":
+        kwargs["pool_size"] = int(config.get("pool_size", 5))
+        kwargs["max_overflow"] = int(config.get("max_overflow", 10))
+    db_engine = create_engine(url, **kwargs)
+
+    if "sqlite" in url:
+        pragmas = {**SQLITE_DEFAULTS, **config.get("sqlite", {})}
+
+        @event.listens_for(db_engine, "connect")
+        def _apply_sqlite_profile(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"PRAGMA journal_mode={pragmas['journal_mode']}")
+            cursor.execute(f"PRAGMA synchronous={pragmas['synchronous']}")
+            cursor.execute(f"PRAGMA busy_timeout={int(pragmas['busy_timeout_ms'])}")
+            cursor.close()
+
+    return db_engine
+
+engine = make_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -15,6 +53,136 @@ def get_db():
     finally:
         db.close()
 
-def init_db():
-    from openexec.tables import ExecutionLog
-    Base.metadata.create_all(bind=engine)
+def init_db(db_engine=None):
+    from openexec.tables import ExecutionLog, ArchivedExecution, ExecutionBlob, ExecutionChunk, ReceiptRoot
+    db_engine = db_engine if db_engine is not None else engine
+    Base.metadata.create_all(bind=db_engine)
+    _upgrade_schema(db_engine)
+    if db_engine.dialect.name == "sqlite":
+        from openexec.tables import SQLITE_ARCHIVED_NONCE_TRIGGER
+        with db_engine.begin() as conn:
+            conn.exec_driver_sql(SQLITE_ARCHIVED_NONCE_TRIGGER)
+
+def _upgrade_schema(db_engine):
+    # create_all() only creates missing tables. Bring tables from older
+    # releases up to date with any nullable columns and indexes added since.
+    inspector = inspect(db_engine)
+    for table in Base.metadata.sorted_tables:
+        columns = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                column_type = column.type.compile(db_engine.dialect)
+                with db_engine.begin() as conn:
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+        indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(bind=db_engine)
+
+class GroupCommitWriter:
+    """Single writer thread that commits queued rows in small batches.
+
+    ``submit`` returns a future that resolves once the row's batch has been
+    committed: True if the row was inserted, False if it hit a unique
+    constraint (for example a nonce claimed by a concurrent request).
+    """
+
+    def __init__(self, session_factory=None, max_batch: int = 64, max_delay: float = 0.002):
+        self._session_factory = session_factory or SessionLocal
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: "queue.Queue[Optional[Tuple[object, Future]]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="openexec-group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, row) -> Future:
+        future: Future = Future()
+        self._queue.put((row, future))
+        return future
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stopping:
+                return
+
+    def _commit(self, batch: List[Tuple[object, Future]]) -> None:
+        db = self._session_factory()
+        try:
+            try:
+                db.add_all([row for row, _ in batch])
+                db.commit()
+                for _, future in batch:
+                    future.set_result(True)
+                return
+            except IntegrityError:
+                db.rollback()
+
+            # Isolate the conflicting rows so the rest of the batch still lands.
+            for row, future in batch:
+                try:
+                    db.add(row)
+                    db.commit()
+                    future.set_result(True)
+                except IntegrityError:
+                    db.rollback()
+                    future.set_result(False)
+        except Exception as e:
+            db.rollback()
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            db.close()
+
+_writer_lock = threading.Lock()
+_writer: Optional[GroupCommitWriter] = None
+
+def group_commit_enabled() -> bool:
+    env = os.getenv("OPENEXEC_GROUP_COMMIT", "")
+    if env:
+        return env.lower() in ("1", "on", "true")
+    return bool(_config.get("group_commit", {}).get("enabled", False))
+
+def get_group_commit_writer() -> Optional[GroupCommitWriter]:
+    global _writer
+    if not group_commit_enabled():
+        return None
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                options = _config.get("group_commit", {})
+                _writer = GroupCommitWriter(
+                    max_batch=int(options.get("max_batch", 64)),
+                    max_delay=float(options.get("max_delay_ms", 2)) / 1000,
+                )
+    return _writer
+
+def close_group_commit_writer() -> None:
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
@@ -1,87 +1,444 @@
-import os
 import uuid
 import json
-import hashlib
-from openexec.registry import get_action
-from openexec.models import ExecutionRequest, ExecutionResult
-from openexec.settings import is_demo, is_clawshield
-from openexec.db import SessionLocal
-from openexec.tables import ExecutionLog
+import asyncio
+import inspect
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+from openexec.registry import action_label, get_action, get_bulkhead, is_cpu_bound, is_pure, is_streaming
+from openexec.bulkhead import BulkheadFull, HandlerTimeout
+from openexec.models import ExecutionRequest, ExecutionResult, MerkleProof
+from openexec.policy import Mode, Policy, get_policy
+from openexec.metrics import count_outcome, timed
+from openexec.executor import get_executor, run_engine, run_handler, run_process, submit_process
+from openexec.replay import get_replay_index
+from openexec.response_cache import get_response_cache
+from openexec.memo import get_memo
+from openexec.blobs import pack
+from openexec.store import ExecutionStore, get_store
+from openexec.shards import find_shard, get_shard, shard_for
+from openexec.receipts import make_receipt, note_execution, get_proof, get_execution_proof
+from openexec.tables import ExecutionLog, PENDING_STATUSES
 from openexec.approval_validator import validate_approval, ApprovalError
-from sqlalchemy.exc import IntegrityError
+from openexec.crypto import action_request_hash, canonical_json
 
-def _check_allow_list(action: str) -> None:
-    allowed = os.getenv("OPENEXEC_ALLOWED_ACTIONS", "")
-    if allowed:
-        allow_list = [a.strip() for a in allowed.split(",") if a.strip()]
-        if action not in allow_list:
-            raise ApprovalError(f"Action '{action}' is not in the execution allow-list")
+BatchKey = Tuple[Optional[str], str]
+
+logger = logging.getLogger(__name__)
+
+class ExecutionPending(Exception):
+    """The nonce belongs to a queued execution that has not finished yet."""
+
+    def __init__(self, exec_id: str, status: str):
+        super().__init__(f"Execution {exec_id} is {status}")
+        self.exec_id = exec_id
+        self.status = status
+
+def _check_allow_list(policy: Policy, action: str) -> None:
+    if not policy.allows(action):
+        raise ApprovalError(f"Action '{action}' is not in the execution allow-list", "allow_list")
+
+def _authorize(request: ExecutionRequest, streaming: bool = False) -> Tuple[Callable, dict, str, bool]:
+    policy = get_policy()
+    _check_allow_list(policy, request.action)
+    handler = get_action(request.action)
+    if is_streaming(request.action) != streaming:
+        endpoint = "/execute/stream" if not streaming else "/execute"
+        raise ValueError(f"Action '{request.action}' must be executed through {endpoint}")
+    payload = request.payload or {}
+    clawshield = policy.mode is Mode.CLAWSHIELD
+    # Encoded once: the same canonical text is hashed for the approval and stored in the log.
+    with timed("canonical", request.action):
+        payload_json = canonical_json(payload)
+        request_hash = action_request_hash(request.action, payload_json) if clawshield else None
+
+    if policy.mode is Mode.DEMO:
+        approved = True
+    elif clawshield:
+        if not request.approval_artifact:
+            raise ApprovalError("ClawShield mode requires an approval artifact", "missing_artifact")
+        action_request = {"action": request.action, "payload": payload}
+        validate_approval(action_request, request.approval_artifact.model_dump(),
+                          request_hash=request_hash, policy=policy)
+        approved = True
+    else:
+        raise ValueError("Unknown mode")
+
+    return handler, payload, payload_json, approved
+
+def _call_handler(action: str, handler: Callable, payload: dict) -> dict:
+    submit = submit_process if is_cpu_bound(action) else None
+    bulkhead = get_bulkhead(action)
+    if bulkhead is not None:
+        return bulkhead.call(handler, payload, submit)
+    if submit is not None:
+        return submit(handler, payload).result()
+    if inspect.iscoroutinefunction(handler):
+        return asyncio.run(handler(payload))
+    return handler(payload)
+
+async def _call_handler_async(action: str, handler: Callable, payload: dict) -> dict:
+    cpu_bound = is_cpu_bound(action)
+    bulkhead = get_bulkhead(action)
+    if bulkhead is not None:
+        return await bulkhead.call_async(handler, payload, submit_process if cpu_bound else None)
+    if cpu_bound:
+        return await run_process(handler, payload)
+    if inspect.iscoroutinefunction(handler):
+        return await handler(payload)
+    return await run_handler(handler, payload)
+
+def _memo_for(action: str):
+    return get_memo() if is_pure(action) else None
+
+def _call_memoized(action: str, handler: Callable, payload: dict, payload_json: str) -> dict:
+    memo = _memo_for(action)
+    result = memo.get(action, payload_json) if memo is not None else None
+    if result is None:
+        with timed("handler", action):
+            result = _call_handler(action, handler, payload)
+        if memo is not None:
+            memo.put(action, payload_json, result)
+    return result
+
+async def _call_memoized_async(action: str, handler: Callable, payload: dict, payload_json: str) -> dict:
+    memo = _memo_for(action)
+    result = memo.get(action, payload_json) if memo is not None else None
+    if result is None:
+        with timed("handler", action):
+            result = await _call_handler_async(action, handler, payload)
+        if memo is not None:
+            memo.put(action, payload_json, result)
+    return result
+
+def _record(request: ExecutionRequest, payload_json: str, approved: bool, result: dict,
+            exec_id: Optional[str] = None) -> Tuple[ExecutionLog, ExecutionResult]:
+    exec_id = exec_id or str(uuid.uuid4())
+    # Receipts are defined over json.dumps(result, sort_keys=True), which
+    # clients recompute, so the result keeps that encoding. It is produced
+    # once and shared by the log row and the receipt.
+    result_json = json.dumps(result, sort_keys=True)
+
+    log = ExecutionLog(
+        id=exec_id,
+        action=request.action,
+        payload=payload_json,
+        result=result_json,
+        nonce=request.nonce,
+        approved=approved,
+        receipt=make_receipt(exec_id, result_json)
+    )
+    pack(log)
+    return log, ExecutionResult(
+        id=exec_id,
+        action=request.action,
+        result=result,
+        approved=approved,
+        receipt=log.receipt
+    )
+
+# A handler that timed out may still be running: its nonce is held here,
+# by (shard, nonce), until the late result has been stored. Retries get 409
+# meanwhile and the stored result afterwards.
+_late_lock = threading.Lock()
+_late: Dict[BatchKey, str] = {}
+
+def _keep_late(request: ExecutionRequest, payload_json: str, approved: bool, shard: Optional[str],
+               late: Optional[Future]) -> None:
+    if late is None:
+        return
+    key = (shard, request.nonce)
+    exec_id = str(uuid.uuid4())
+    with _late_lock:
+        if key in _late:
+            return
+        _late[key] = exec_id
+    # The callback may run on the handler thread or, if the handler already
+    # finished, right here; the insert itself always goes to the engine pool.
+    late.add_done_callback(lambda future: get_executor("engine").submit(
+        _store_late, request, payload_json, approved, shard, exec_id, future))
+
+def _store_late(request: ExecutionRequest, payload_json: str, approved: bool, shard: Optional[str],
+                exec_id: str, future: Future) -> None:
+    try:
+        if not future.cancelled() and future.exception() is None:
+            log, execution = _record(request, payload_json, approved, future.result(), exec_id)
+            _store(log, execution, shard)
+    except Exception:
+        logger.exception("Could not record the late result of execution %s", exec_id)
+    finally:
+        with _late_lock:
+            _late.pop((shard, request.nonce), None)
+
+def _check_late(nonce: str, shard: Optional[str]) -> None:
+    with _late_lock:
+        exec_id = _late.get((shard, nonce))
+    if exec_id is not None:
+        raise ExecutionPending(exec_id, "running")
+
+def _run(request: ExecutionRequest, shard: Optional[str] = None) -> Tuple[ExecutionLog, ExecutionResult]:
+    handler, payload, payload_json, approved = _authorize(request)
+    try:
+        result = _call_memoized(request.action, handler, payload, payload_json)
+    except HandlerTimeout as e:
+        _keep_late(request, payload_json, approved, shard, e.late)
+        raise
+    with timed("record", request.action):
+        return _record(request, payload_json, approved, result)
+
+def _count(request: ExecutionRequest, outcome: str, reason: str = "") -> None:
+    count_outcome(action_label(request.action), get_policy().mode_name, outcome, reason)
+
+def _count_error(request: ExecutionRequest, e: Exception) -> None:
+    if isinstance(e, ApprovalError):
+        _count(request, "rejected", e.reason)
+    elif isinstance(e, BulkheadFull):
+        _count(request, "rejected", "bulkhead_full")
+    elif isinstance(e, HandlerTimeout):
+        _count(request, "rejected", "timeout")
+    elif isinstance(e, ExecutionPending):
+        _count(request, "rejected", "pending")
+    elif isinstance(e, ValueError):
+        _count(request, "rejected", "invalid_request")
+    else:
+        _count(request, "error", type(e).__name__)
+
+def _count_stored(request: ExecutionRequest, fresh: ExecutionResult, stored: ExecutionResult) -> None:
+    # A lost insert race returns the winner's result: that is a replay.
+    _count(request, "approved" if stored.id == fresh.id else "replayed")
+
+def _replay(log: ExecutionLog) -> ExecutionResult:
+    if log.status in PENDING_STATUSES:
+        raise ExecutionPending(log.id, log.status)
+    if log.status == "streamed":
+        raise ValueError(f"Execution {log.id} streamed its result; replay it through /execute/stream")
+    return ExecutionResult(
+        id=log.id,
+        action=log.action,
+        result=json.loads(log.result),
+        approved=log.approved,
+        receipt=log.receipt or make_receipt(log.id, log.result),
+        proof=get_proof(log.merkle_batch, log.merkle_index)
+    )
+
+def _store_for(shard: Optional[str]) -> ExecutionStore:
+    return get_shard(shard).store if shard is not None else get_store()
+
+def _find_in(shard: Optional[str]) -> Optional[ExecutionStore]:
+    # Lookups never create a shard; one that does not exist has seen no nonce.
+    if shard is None:
+        return get_store()
+    existing = find_shard(shard)
+    return existing.store if existing is not None else None
+
+def _lookup(nonce: str, shard: Optional[str] = None) -> Optional[ExecutionResult]:
+    _check_late(nonce, shard)
+    index = get_replay_index()
+    if index is not None:
+        cached, needs_db_check = index.lookup(nonce)
+        if cached is not None:
+            if cached.proof is None:
+                # Cached before its batch was sealed; attach the proof once it exists.
+                anchored = get_execution_proof(cached.id)
+                if anchored is not None:
+                    cached = cached.model_copy(update={"proof": MerkleProof(**anchored["proof"])})
+                    index.remember(nonce, cached)
+            return cached
+        if not needs_db_check:
+            return None
+
+    store = _find_in(shard)
+    existing = store.find(nonce) if store is not None else None
+    replay = _replay(existing) if existing else None
+
+    if index is not None:
+        index.confirm(nonce, replay)
+    return replay
+
+def _remember(nonce: str, result: ExecutionResult) -> None:
+    index = get_replay_index()
+    if index is not None:
+        index.remember(nonce, result)
+
+def _store(log: ExecutionLog, result: ExecutionResult, shard: Optional[str] = None) -> ExecutionResult:
+    nonce = log.nonce
+    return _settle(nonce, _store_for(shard).insert(log), result)
+
+async def _store_async(log: ExecutionLog, result: ExecutionResult, shard: Optional[str] = None) -> ExecutionResult:
+    nonce = log.nonce
+    existing = await _store_for(shard).insert_async(log)
+    return await run_engine(_settle, nonce, existing, result)
+
+def _settle(nonce: str, existing: Optional[ExecutionLog], result: ExecutionResult) -> ExecutionResult:
+    if existing is None:
+        note_execution()
+    else:
+        result = _replay(existing)
+    _remember(nonce, result)
+    return result
 
 def execute(request: ExecutionRequest) -> ExecutionResult:
-    db = SessionLocal()
+    shard = shard_for(request)
+    with timed("lookup", action_label(request.action)):
+        replay = _lookup(request.nonce, shard)
+    if replay:
+        _count(request, "replayed")
+        return replay
+
+    try:
+        log, execution = _run(request, shard)
+    except Exception as e:
+        _count_error(request, e)
+        raise
+    with timed("commit", request.action):
+        result = _store(log, execution, shard)
+    _count_stored(request, execution, result)
+    return result
+
+async def execute_async(request: ExecutionRequest) -> ExecutionResult:
+    shard = shard_for(request)
+    with timed("lookup", action_label(request.action)):
+        replay = await run_engine(_lookup, request.nonce, shard)
+    if replay:
+        _count(request, "replayed")
+        return replay
+
+    try:
+        log, execution = await _prepare(request, shard)
+    except Exception as e:
+        _count_error(request, e)
+        raise
+    with timed("commit", request.action):
+        result = await _store_async(log, execution, shard)
+    _count_stored(request, execution, result)
+    return result
+
+async def execute_response_async(request: ExecutionRequest) -> bytes:
+    """Execute a request and return the rendered JSON response body.
+
+    Replays of a nonce whose response is still cached skip the engine
+    entirely and return the stored bytes.
+    """
+    cache = get_response_cache()
+    # Nonces are unique per shard, so shards key their responses apart.
+    shard = shard_for(request)
+    key = request.nonce if shard is None else f"{shard}:{request.nonce}"
+    if cache is not None:
+        body = cache.get(key)
+        if body is not None:
+            _count(request, "replayed")
+            return body
+    result = await execute_async(request)
+    return await run_engine(_render, key, result)
+
+def _render(key: str, result: ExecutionResult) -> bytes:
+    body = result.model_dump_json().encode()
+    cache = get_response_cache()
+    if cache is not None:
+        cache.put(key, body, anchored=result.proof is not None)
+    return body
+
+async def _prepare(request: ExecutionRequest, shard: Optional[str] = None) -> Tuple[ExecutionLog, ExecutionResult]:
+    handler, payload, payload_json, approved = await run_engine(_authorize, request)
     try:
-        existing = db.query(ExecutionLog).filter_by(nonce=request.nonce).first()
-        if existing:
-            return ExecutionResult(
-                id=existing.id,
-                action=existing.action,
-                result=json.loads(existing.result),
-                approved=existing.approved,
-                receipt=_make_receipt(existing.id, existing.result)
-            )
-
-        _check_allow_list(request.action)
-        handler = get_action(request.action)
-        payload = request.payload or {}
-
-        if is_demo():
-            approved = True
-        elif is_clawshield():
-            if not request.approval_artifact:
-                raise ApprovalError("ClawShield mode requires an approval artifact")
-            action_request = {"action": request.action, "payload": payload}
-            validate_approval(action_request, request.approval_artifact.model_dump())
-            approved = True
+        result = await _call_memoized_async(request.action, handler, payload, payload_json)
+    except HandlerTimeout as e:
+        _keep_late(request, payload_json, approved, shard, e.late)
+        raise
+    with timed("record", request.action):
+        return await run_engine(_record, request, payload_json, approved, result)
+
+def execute_batch(requests: List[ExecutionRequest]) -> List[Union[ExecutionResult, Exception]]:
+    return asyncio.run(execute_batch_async(requests))
+
+async def execute_batch_async(requests: List[ExecutionRequest]) -> List[Union[ExecutionResult, Exception]]:
+    """Execute many requests with one nonce lookup and one insert transaction.
+
+    Each item keeps its own replay and approval semantics: the returned list
+    holds either the ExecutionResult or the exception raised for that item,
+    in request order. Repeated nonces within a batch share one outcome.
+    """
+    # Items are keyed by (shard, nonce): nonces are unique within a shard.
+    keys = [(shard_for(r), r.nonce) for r in requests]
+    with timed("lookup", "batch"):
+        existing = await run_engine(_lookup_many, set(keys))
+
+    first: Dict[BatchKey, ExecutionRequest] = {}
+    for key, request in zip(keys, requests):
+        if key not in existing:
+            first.setdefault(key, request)
+    prepared = await asyncio.gather(*(_prepare(r, key[0]) for key, r in first.items()), return_exceptions=True)
+
+    fresh: Dict[BatchKey, Tuple[ExecutionLog, ExecutionResult]] = {}
+    errors: Dict[BatchKey, Exception] = {}
+    for key, outcome in zip(first, prepared):
+        if isinstance(outcome, Exception):
+            errors[key] = outcome
         else:
-            raise ValueError("Unknown mode")
-
-        result = handler(payload)
-        exec_id = str(uuid.uuid4())
-        result_json = json.dumps(result, sort_keys=True)
-
-        log = ExecutionLog(
-            id=exec_id,
-            action=request.action,
-            payload=json.dumps(payload, sort_keys=True),
-            result=result_json,
-            nonce=request.nonce,
-            approved=approved
-        )
-
-        try:
-            db.add(log)
-            db.commit()
-        except IntegrityError:
-            db.rollback()
-            existing = db.query(ExecutionLog).filter_by(nonce=request.nonce).first()
-            return ExecutionResult(
-                id=existing.id,
-                action=existing.action,
-                result=json.loads(existing.result),
-                approved=existing.approved,
-                receipt=_make_receipt(existing.id, existing.result)
-            )
-
-        return ExecutionResult(
-            id=exec_id,
-            action=request.action,
-            result=result,
-            approved=approved,
-            receipt=_make_receipt(exec_id, result_json)
-        )
-    finally:
-        db.close()
+            fresh[key] = outcome
+    stored = {}
+    if fresh:
+        with timed("commit", "batch"):
+            stored = await run_engine(_store_batch, fresh)
+
+    outcomes: List[Union[ExecutionResult, Exception]] = []
+    for key, request in zip(keys, requests):
+        if key in existing:
+            outcomes.append(existing[key])
+            if isinstance(existing[key], Exception):
+                _count_error(request, existing[key])
+            else:
+                _count(request, "replayed")
+        elif key in stored:
+            outcomes.append(stored[key])
+            if isinstance(stored[key], Exception):
+                _count_error(request, stored[key])
+            elif first[key] is request:
+                _count_stored(request, fresh[key][1], stored[key])
+            else:
+                _count(request, "replayed")
+        else:
+            outcomes.append(errors[key])
+            _count_error(request, errors[key])
+    return outcomes
+
+def _replay_or_pending(log: ExecutionLog) -> Union[ExecutionResult, ExecutionPending, ValueError]:
+    try:
+        return _replay(log)
+    except (ExecutionPending, ValueError) as e:
+        return e
+
+def _by_shard(keys: Iterable[BatchKey]) -> Dict[Optional[str], List[str]]:
+    groups: Dict[Optional[str], List[str]] = {}
+    for shard, nonce in keys:
+        groups.setdefault(shard, []).append(nonce)
+    return groups
+
+def _lookup_many(keys: Set[BatchKey]) -> Dict[BatchKey, Union[ExecutionResult, ExecutionPending]]:
+    found = {}
+    for shard, nonces in _by_shard(keys).items():
+        store = _find_in(shard)
+        if store is None:
+            continue
+        for nonce, log in store.find_many(nonces).items():
+            found[(shard, nonce)] = _replay_or_pending(log)
+    with _late_lock:
+        late = {key: _late[key] for key in keys if key in _late}
+    for key, exec_id in late.items():
+        found.setdefault(key, ExecutionPending(exec_id, "running"))
+    return found
+
+def _store_batch(fresh: Dict[BatchKey, Tuple[ExecutionLog, ExecutionResult]]) -> Dict[BatchKey, Union[ExecutionResult, ExecutionPending]]:
+    stored = {key: result for key, (_, result) in fresh.items()}
+    for shard, nonces in _by_shard(fresh).items():
+        conflicts = _store_for(shard).insert_many([fresh[(shard, nonce)][0] for nonce in nonces])
+        if len(conflicts) < len(nonces):
+            note_execution(len(nonces) - len(conflicts))
+        for nonce, existing in conflicts.items():
+            stored[(shard, nonce)] = _replay_or_pending(existing)
 
-def _make_receipt(exec_id: str, result: str) -> str:
-    data = f"{exec_id}:{result}"
-    return hashlib.sha256(data.encode()).hexdigest()
+    for (shard, nonce), result in stored.items():
+        if not isinstance(result, Exception):
+            _remember(nonce, result)
+    return stored
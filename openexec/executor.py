@@ -0,0 +1,124 @@
+"""
+Dedicated, bounded thread pools for the async execution path.
+
+Sync handlers run on the handler pool. Engine bookkeeping (nonce lookups,
+signature verification, serialization and commits) runs on a separate,
+smaller engine pool, so slow handlers occupying every handler thread cannot
+stall lookups and commits for other requests. Bulk approval pre-verification
+(``/approvals/verify``) gets a verify pool of its own, so a large upload
+cannot occupy the engine pool either. None of them is Starlette's shared
+threadpool.
+
+Handlers registered as CPU-bound run on a process pool instead, so they do
+not compete with the server for the GIL. Workers are started with
+``spawn`` by default (``OPENEXEC_PROCESS_START``), never by forking a
+multi-threaded server, and can be started ahead of traffic with
+``warm_process_pool``.
+"""
+
+import os
+import time
+import asyncio
+import functools
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional
+
+DEFAULT_HANDLER_THREADS = 32
+DEFAULT_ENGINE_THREADS = 8
+DEFAULT_VERIFY_THREADS = 4
+DEFAULT_PROCESS_START = "spawn"
+
+_POOLS = {
+    "handler": ("OPENEXEC_HANDLER_THREADS", DEFAULT_HANDLER_THREADS),
+    "engine": ("OPENEXEC_ENGINE_THREADS", DEFAULT_ENGINE_THREADS),
+    "verify": ("OPENEXEC_VERIFY_THREADS", DEFAULT_VERIFY_THREADS),
+}
+
+_lock = threading.Lock()
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+def get_pool_size(pool: str) -> int:
+    env, default = _POOLS[pool]
+    return int(os.getenv(env, default))
+
+def get_executor(pool: str = "handler") -> ThreadPoolExecutor:
+    executor = _executors.get(pool)
+    if executor is None:
+        with _lock:
+            executor = _executors.get(pool)
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=get_pool_size(pool),
+                    thread_name_prefix=f"openexec-{pool}",
+                )
+                _executors[pool] = executor
+    return executor
+
+async def run_handler(fn: Callable, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor("handler"), functools.partial(fn, *args))
+
+async def run_engine(fn: Callable, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor("engine"), functools.partial(fn, *args))
+
+async def run_verify(fn: Callable, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor("verify"), functools.partial(fn, *args))
+
+def get_process_workers() -> int:
+    workers = os.getenv("OPENEXEC_PROCESS_WORKERS", "")
+    return int(workers) if workers else os.cpu_count() or 1
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        with _lock:
+            if _process_pool is None:
+                _process_pool = ProcessPoolExecutor(
+                    max_workers=get_process_workers(),
+                    mp_context=multiprocessing.get_context(os.getenv("OPENEXEC_PROCESS_START", DEFAULT_PROCESS_START)),
+                )
+    return _process_pool
+
+def submit_process(fn: Callable, *args) -> Future:
+    """Submit to the process pool, replacing it once if a worker died and broke it."""
+    global _process_pool
+    pool = get_process_pool()
+    try:
+        return pool.submit(fn, *args)
+    except BrokenProcessPool:
+        with _lock:
+            if _process_pool is pool:
+                _process_pool = None
+        pool.shutdown(wait=False)
+        return get_process_pool().submit(fn, *args)
+
+async def run_process(fn: Callable, *args):
+    return await asyncio.wrap_future(submit_process(fn, *args))
+
+def _warm() -> int:
+    time.sleep(0.05)
+    return os.getpid()
+
+def warm_process_pool() -> int:
+    """Start every worker now rather than on the first CPU-bound request."""
+    pool = get_process_pool()
+    futures = [pool.submit(_warm) for _ in range(get_process_workers())]
+    wait(futures)
+    return len({f.result() for f in futures})
+
+def shutdown_executor() -> None:
+    global _process_pool
+    with _lock:
+        executors = list(_executors.values())
+        _executors.clear()
+        process_pool, _process_pool = _process_pool, None
+    for executor in executors:
+        executor.shutdown(wait=True)
+    if process_pool is not None:
+        process_pool.shutdown(wait=True)
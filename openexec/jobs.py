@@ -0,0 +1,239 @@
+"""
+Durable asynchronous execution queue.
+
+``submit`` validates the approval and reserves the nonce up front by
+inserting the execution_log row with status ``queued`` and no result, so a
+client gets an execution id back without waiting for the handler. Worker
+threads drain the table: a row is claimed with a conditional
+``queued -> running`` update, so each queued execution is picked up by
+exactly one worker, and is then completed with its result and receipt. A
+job its action's bulkhead has no room for goes back to ``queued`` and is
+retried on a later pass rather than failed.
+
+Queued rows survive a restart. With ``OPENEXEC_QUEUE_RECOVER`` on, a row
+found ``running`` or ``streaming`` at startup is taken to have been
+interrupted mid-handler and is marked ``failed`` rather than run again, so
+no execution happens twice. Rows carry no owner, so recovery cannot tell a
+crashed process's rows from a live sibling's: turn it on for exactly one
+process per database, and only when no other process is running.
+"""
+
+import os
+import json
+import uuid
+import logging
+import threading
+from typing import List, Optional, Set
+from openexec.blobs import body_text, pack
+from openexec.bulkhead import BulkheadFull, HandlerTimeout
+from openexec.db import SessionLocal
+from openexec.engine import _authorize, _call_memoized, _count, _count_error
+from openexec.metrics import count_outcome, timed
+from openexec.models import ExecutionRequest
+from openexec.policy import get_policy
+from openexec.receipts import make_receipt, note_execution
+from openexec.registry import get_action
+from openexec.replay import get_replay_index
+from openexec.shards import require_primary
+from openexec.store import get_store
+from openexec.tables import ExecutionLog
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_POLL_INTERVAL = 1.0
+
+_lock = threading.Lock()
+_wake = threading.Event()
+_stop = threading.Event()
+_workers: List[threading.Thread] = []
+
+def get_worker_count() -> int:
+    return int(os.getenv("OPENEXEC_QUEUE_WORKERS", DEFAULT_WORKERS))
+
+def get_poll_interval() -> float:
+    return float(os.getenv("OPENEXEC_QUEUE_POLL", DEFAULT_POLL_INTERVAL))
+
+def recovery_enabled() -> bool:
+    return os.getenv("OPENEXEC_QUEUE_RECOVER", "").lower() in ("1", "on", "true")
+
+def _status(log: ExecutionLog) -> dict:
+    return {"id": log.id, "status": log.status or "completed"}
+
+def submit(request: ExecutionRequest) -> dict:
+    """Validate and enqueue a request; return its execution id and status.
+
+    A nonce that is already queued, running or finished returns that
+    execution's status instead of enqueueing it again.
+    """
+    try:
+        require_primary(request, "/execute/async")
+    except ValueError as e:
+        _count_error(request, e)
+        raise
+    # The queue lives in the database, so never in the memory store.
+    store = get_store(durable=True)
+    existing = store.find(request.nonce)
+    if existing is not None:
+        _count(request, "replayed")
+        return _status(existing)
+
+    try:
+        _, _, payload_json, approved = _authorize(request)
+    except Exception as e:
+        _count_error(request, e)
+        raise
+    exec_id = str(uuid.uuid4())
+    log = ExecutionLog(
+        id=exec_id,
+        action=request.action,
+        payload=payload_json,
+        nonce=request.nonce,
+        approved=approved,
+        status="queued",
+    )
+    pack(log)
+    existing = store.insert(log)
+    if existing is not None:
+        _count(request, "replayed")
+        return _status(existing)
+
+    index = get_replay_index()
+    if index is not None:
+        # Reserved but not yet in the LRU: make sync lookups check the database.
+        index.warm(request.nonce)
+    _count(request, "queued")
+    _wake.set()
+    return {"id": exec_id, "status": "queued"}
+
+def _claim(skip: Set[str] = frozenset()) -> Optional[str]:
+    db = SessionLocal()
+    try:
+        while True:
+            query = db.query(ExecutionLog.id).filter(ExecutionLog.status == "queued")
+            if skip:
+                query = query.filter(ExecutionLog.id.notin_(skip))
+            row = query.order_by(ExecutionLog.timestamp).first()
+            if row is None:
+                return None
+            claimed = (
+                db.query(ExecutionLog)
+                .filter(ExecutionLog.id == row.id, ExecutionLog.status == "queued")
+                .update({ExecutionLog.status: "running"}, synchronize_session=False)
+            )
+            db.commit()
+            if claimed:
+                return row.id
+    finally:
+        db.close()
+
+def _finish(db, log: ExecutionLog, result: dict, status: str) -> None:
+    result_json = json.dumps(result, sort_keys=True)
+    log.result = result_json
+    log.receipt = make_receipt(log.id, result_json)
+    log.status = status
+    db.commit()
+    note_execution()
+
+def run_job(exec_id: str) -> bool:
+    """Run one claimed execution and record its outcome.
+
+    Returns False if the action had no capacity for it: the row is queued
+    again for a later pass.
+    """
+    db = SessionLocal()
+    try:
+        log = db.get(ExecutionLog, exec_id)
+        mode = get_policy().mode_name
+        try:
+            handler = get_action(log.action)
+            payload_json = body_text(db, log.payload, log.payload_ref) or "{}"
+            try:
+                result = _call_memoized(log.action, handler, json.loads(payload_json), payload_json)
+            except HandlerTimeout as e:
+                if e.late is None:
+                    raise
+                # The handler is running; no caller is waiting on a queued job.
+                result = e.late.result()
+        except (BulkheadFull, HandlerTimeout):
+            # Timed out waiting for a slot, or no room to wait: not the job's fault.
+            log.status = "queued"
+            db.commit()
+            return False
+        except Exception as e:
+            logger.exception("Queued execution %s failed", exec_id)
+            _finish(db, log, {"error": str(e)}, "failed")
+            count_outcome(log.action, mode, "error", type(e).__name__)
+            return True
+        with timed("commit", log.action):
+            _finish(db, log, result, "completed")
+        count_outcome(log.action, mode, "approved")
+        return True
+    finally:
+        db.close()
+
+def drain() -> int:
+    """Run queued executions until none are left; return how many ran."""
+    count = 0
+    # Jobs put back for lack of capacity wait for the next pass.
+    deferred: Set[str] = set()
+    while not _stop.is_set():
+        exec_id = _claim(deferred)
+        if exec_id is None:
+            break
+        if run_job(exec_id):
+            count += 1
+        else:
+            deferred.add(exec_id)
+    return count
+
+def recover() -> int:
+    """Fail executions left running or streaming by a previous process; return how many."""
+    db = SessionLocal()
+    try:
+        rows = db.query(ExecutionLog).filter(ExecutionLog.status.in_(("running", "streaming"))).all()
+        for log in rows:
+            result_json = json.dumps({"error": "Execution interrupted by a restart"}, sort_keys=True)
+            log.result = result_json
+            log.receipt = make_receipt(log.id, result_json)
+            log.status = "failed"
+        db.commit()
+    finally:
+        db.close()
+    if rows:
+        note_execution(len(rows))
+    return len(rows)
+
+def _work_loop() -> None:
+    while not _stop.is_set():
+        # Cleared before draining so a submit that lands mid-drain is not missed.
+        _wake.clear()
+        try:
+            drain()
+        except Exception:
+            logger.exception("Draining the execution queue failed")
+        _wake.wait(get_poll_interval())
+
+def start_workers() -> None:
+    with _lock:
+        if _workers:
+            return
+        if recovery_enabled():
+            recover()
+        count = get_worker_count()
+        if count <= 0:
+            return
+        _stop.clear()
+        for i in range(count):
+            worker = threading.Thread(target=_work_loop, name=f"openexec-queue-{i}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+def stop_workers() -> None:
+    """Stop the workers after their current execution; queued rows stay queued."""
+    with _lock:
+        _stop.set()
+        _wake.set()
+        for worker in _workers:
+            worker.join()
+        _workers.clear()
@@ -0,0 +1,148 @@
+"""
+Verification keyring for ClawShield approval signatures.
+
+Public keys are parsed once and held as ready Ed25519PublicKey objects.
+Several keys may be active at the same time to support rotation, and a
+reload builds a complete new key set before swapping it in atomically.
+
+Keys come from ``CLAWSHIELD_PUBLIC_KEY`` (key id ``default``),
+``CLAWSHIELD_PUBLIC_KEYS`` (JSON object of key id to PEM) and, for rotation
+without a restart, ``CLAWSHIELD_PUBLIC_KEYS_FILE`` (same JSON shape). The key
+file is re-checked by mtime at most every few seconds, and SIGHUP forces a
+reload (see ``openexec.policy``).
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional
+from openexec.crypto import load_ed25519_public_key
+
+if TYPE_CHECKING:
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KEY_ID = "default"
+DEFAULT_CHECK_INTERVAL = 5.0
+
+class KeyringError(ValueError):
+    pass
+
+class Keyring:
+    def __init__(self, keys: Dict[str, "Ed25519PublicKey"], source: tuple = ()):
+        self._keys = dict(keys)
+        self.source = source
+
+    def get(self, key_id: str) -> Optional["Ed25519PublicKey"]:
+        return self._keys.get(key_id)
+
+    def key_ids(self) -> List[str]:
+        return list(self._keys.keys())
+
+    def keys(self) -> List["Ed25519PublicKey"]:
+        return list(self._keys.values())
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+_lock = threading.Lock()
+_keyring: Optional[Keyring] = None
+_next_file_check = 0.0
+
+def _parse_key_map(text: str, origin: str) -> Dict[str, str]:
+    try:
+        keys = json.loads(text)
+    except ValueError as e:
+        raise KeyringError(f"{origin} is not valid JSON: {e}")
+    if not isinstance(keys, dict) or not all(isinstance(v, str) for v in keys.values()):
+        raise KeyringError(f"{origin} must be a JSON object of key id to PEM string")
+    return {str(k): v for k, v in keys.items()}
+
+def _file_mtime(path: str) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+def _read_source() -> tuple:
+    # os.environ hands back the same string objects until a value changes,
+    # so the source tuple can be compared by identity instead of by content.
+    keys_file = os.environ.get("CLAWSHIELD_PUBLIC_KEYS_FILE")
+    return (
+        os.environ.get("CLAWSHIELD_PUBLIC_KEY"),
+        os.environ.get("CLAWSHIELD_PUBLIC_KEYS"),
+        keys_file,
+        _file_mtime(keys_file) if keys_file else None,
+    )
+
+def _same_source(a: tuple, b: tuple) -> bool:
+    return len(a) == len(b) and all(x is y or x == y for x, y in zip(a, b))
+
+def build_keyring(primary_pem: Optional[str] = "", keys_json: Optional[str] = "",
+                  keys_file: Optional[str] = None, source: tuple = ()) -> Keyring:
+    pems: Dict[str, str] = {}
+    if primary_pem:
+        pems[DEFAULT_KEY_ID] = primary_pem
+    if keys_json:
+        pems.update(_parse_key_map(keys_json, "CLAWSHIELD_PUBLIC_KEYS"))
+    if keys_file:
+        try:
+            with open(keys_file) as f:
+                pems.update(_parse_key_map(f.read(), keys_file))
+        except OSError as e:
+            raise KeyringError(f"Cannot read key file {keys_file}: {e}")
+
+    keys: Dict[str, "Ed25519PublicKey"] = {}
+    for key_id, pem in pems.items():
+        public_key = load_ed25519_public_key(pem)
+        if public_key is None:
+            raise KeyringError(f"Key '{key_id}' is not a PEM-encoded Ed25519 public key")
+        keys[key_id] = public_key
+    return Keyring(keys, source=source)
+
+def reload_keyring() -> Keyring:
+    """Rebuild the keyring from its sources and swap it in.
+
+    If the new sources are malformed the previous keyring stays active and
+    the error is logged; with no previous keyring the error is raised.
+    """
+    global _keyring
+    source = _read_source()
+    with _lock:
+        _schedule_file_check()
+        try:
+            keyring = build_keyring(source[0], source[1], source[2], source=source)
+        except KeyringError:
+            if _keyring is None:
+                raise
+            logger.exception("Keyring reload failed; keeping the previous keys")
+            _keyring.source = source
+            return _keyring
+        _keyring = keyring
+    return keyring
+
+def get_keyring() -> Keyring:
+    keyring = _keyring
+    if keyring is None:
+        return reload_keyring()
+    current = (
+        os.environ.get("CLAWSHIELD_PUBLIC_KEY"),
+        os.environ.get("CLAWSHIELD_PUBLIC_KEYS"),
+        os.environ.get("CLAWSHIELD_PUBLIC_KEYS_FILE"),
+    )
+    if not _same_source(current, keyring.source[:3]):
+        return reload_keyring()
+    if current[2] and time.monotonic() >= _next_file_check:
+        if _file_mtime(current[2]) != keyring.source[3]:
+            return reload_keyring()
+        _schedule_file_check()
+    return keyring
+
+def _schedule_file_check() -> None:
+    global _next_file_check
+    _next_file_check = time.monotonic() + float(
+        os.getenv("OPENEXEC_KEYRING_CHECK_INTERVAL", DEFAULT_CHECK_INTERVAL)
+    )
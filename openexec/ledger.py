@@ -0,0 +1,153 @@
+"""
+Read access to the execution ledger.
+
+Listing uses keyset pagination over (timestamp, id): the cursor is the last
+row's position, so every page is an index range scan no matter how deep the
+client pages. Export walks the same order with a streaming cursor and emits
+one NDJSON line per row, splicing the stored payload and result text in
+without parsing them (blob-stored bodies are only decompressed), so memory
+stays constant for any export size.
+
+Only live rows are covered; compacted rows live in archive segments. With
+sharded storage, every shard is read and the rows are merged in the same
+(timestamp, id) order, so cursors work unchanged across shards.
+"""
+
+import json
+import heapq
+import base64
+import datetime
+from typing import Callable, Iterator, List, Optional, Tuple
+from sqlalchemy import tuple_
+from openexec.db import SessionLocal
+from openexec.tables import ExecutionLog
+from openexec.receipts import get_proof
+from openexec.retention import find_archived
+from openexec.blobs import body_text, resolve
+from openexec.shards import all_shards
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+EXPORT_CHUNK = 1000
+
+def encode_cursor(timestamp: datetime.datetime, exec_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{exec_id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, str]:
+    try:
+        timestamp, exec_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.datetime.fromisoformat(timestamp), exec_id
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+def _filtered(db, action: Optional[str], approved: Optional[bool],
+              since: Optional[datetime.datetime], until: Optional[datetime.datetime],
+              after: Optional[str]):
+    query = db.query(ExecutionLog)
+    if action is not None:
+        query = query.filter(ExecutionLog.action == action)
+    if approved is not None:
+        query = query.filter(ExecutionLog.approved == approved)
+    if since is not None:
+        query = query.filter(ExecutionLog.timestamp >= since)
+    if until is not None:
+        query = query.filter(ExecutionLog.timestamp < until)
+    if after is not None:
+        query = query.filter(tuple_(ExecutionLog.timestamp, ExecutionLog.id) > tuple_(*decode_cursor(after)))
+    return query.order_by(ExecutionLog.timestamp, ExecutionLog.id)
+
+def _databases() -> List[Callable]:
+    """Session factories for the primary database and every shard."""
+    return [SessionLocal] + [shard.SessionLocal for shard in all_shards()]
+
+def _summary(row: ExecutionLog) -> dict:
+    return {
+        "id": row.id,
+        "action": row.action,
+        "nonce": row.nonce,
+        "approved": bool(row.approved),
+        "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+        "receipt": row.receipt,
+        "merkle_batch": row.merkle_batch,
+        "merkle_index": row.merkle_index,
+        "status": row.status or "completed",
+    }
+
+def list_executions(action: Optional[str] = None, approved: Optional[bool] = None,
+                    since: Optional[datetime.datetime] = None, until: Optional[datetime.datetime] = None,
+                    after: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE) -> dict:
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    rows: List[ExecutionLog] = []
+    for factory in _databases():
+        db = factory()
+        try:
+            page = _filtered(db, action, approved, since, until, after).limit(limit + 1).all()
+            resolve(db, page)
+            rows.extend(page)
+        finally:
+            db.close()
+    rows.sort(key=lambda row: (row.timestamp, row.id))
+    more = len(rows) > limit
+    rows = rows[:limit]
+    executions = []
+    for row in rows:
+        item = _summary(row)
+        item["payload"] = json.loads(row.payload) if row.payload else None
+        item["result"] = json.loads(row.result) if row.result else None
+        executions.append(item)
+    return {
+        "executions": executions,
+        "next_cursor": encode_cursor(rows[-1].timestamp, rows[-1].id) if more else None,
+    }
+
+def export_executions(action: Optional[str] = None, approved: Optional[bool] = None,
+                      since: Optional[datetime.datetime] = None, until: Optional[datetime.datetime] = None,
+                      after: Optional[str] = None) -> Iterator[str]:
+    """Yield matching rows as NDJSON lines from a server-side cursor per database."""
+    streams = [_export_rows(factory, action, approved, since, until, after) for factory in _databases()]
+    if len(streams) == 1:
+        for _, line in streams[0]:
+            yield line
+        return
+    for _, line in heapq.merge(*streams, key=lambda item: item[0]):
+        yield line
+
+def _export_rows(factory: Callable, action: Optional[str], approved: Optional[bool],
+                 since: Optional[datetime.datetime], until: Optional[datetime.datetime],
+                 after: Optional[str]) -> Iterator[Tuple[Tuple[datetime.datetime, str], str]]:
+    db = factory()
+    try:
+        query = _filtered(db, action, approved, since, until, after).execution_options(stream_results=True)
+        for row in query.yield_per(EXPORT_CHUNK):
+            head = json.dumps(_summary(row))[:-1]
+            payload = body_text(db, row.payload, row.payload_ref)
+            result = body_text(db, row.result, row.result_ref)
+            yield (row.timestamp, row.id), f'{head}, "payload": {payload or "null"}, "result": {result or "null"}}}\n'
+            db.expunge(row)
+    finally:
+        db.close()
+
+def get_execution(exec_id: str) -> Optional[dict]:
+    """Status, result and receipt of one execution, live or archived."""
+    row = None
+    for factory in _databases():
+        db = factory()
+        try:
+            row = db.get(ExecutionLog, exec_id) or find_archived(db, exec_id=exec_id)
+            if row is not None:
+                resolve(db, [row])
+                break
+        finally:
+            db.close()
+    if row is None:
+        return None
+    return {
+        "id": row.id,
+        "action": row.action,
+        "status": row.status or "completed",
+        "approved": bool(row.approved),
+        "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+        "result": json.loads(row.result) if row.result else None,
+        "receipt": row.receipt,
+        "proof": get_proof(row.merkle_batch, row.merkle_index),
+    }
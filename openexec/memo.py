@@ -0,0 +1,91 @@
+"""
+Result memoization for pure actions.
+
+An action registered with ``pure=True`` promises that its result depends
+only on its payload. For such actions the engine looks the payload up here
+before calling the handler: entries are keyed by action and the sha256 of
+the canonical payload JSON, so a handler runs once per distinct input
+rather than once per nonce. Every execution is still recorded with its own
+id, log row and receipt; only the handler call is skipped.
+
+The cache holds at most ``OPENEXEC_MEMO_SIZE`` results, least recently used
+first out, each for at most ``OPENEXEC_MEMO_TTL`` seconds (0 keeps entries
+until evicted). Cached results are shared between executions and must not
+be mutated. Hits and misses are counted per action.
+"""
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_MEMO_SIZE = 1024
+DEFAULT_MEMO_TTL = 300.0
+
+class ResultMemo:
+    def __init__(self, max_entries: int = DEFAULT_MEMO_SIZE, ttl: float = DEFAULT_MEMO_TTL):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, bytes], Tuple[dict, float]]" = OrderedDict()
+        self._counts: Dict[str, List[int]] = {}
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(action: str, payload_json: str) -> Tuple[str, bytes]:
+        return action, hashlib.sha256(payload_json.encode()).digest()
+
+    def get(self, action: str, payload_json: str) -> Optional[dict]:
+        key = self._key(action, payload_json)
+        with self._lock:
+            counts = self._counts.setdefault(action, [0, 0])
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, expires = entry
+                if expires >= time.monotonic():
+                    self._entries.move_to_end(key)
+                    counts[0] += 1
+                    return result
+                del self._entries[key]
+            counts[1] += 1
+            return None
+
+    def put(self, action: str, payload_json: str, result: dict) -> None:
+        expires = time.monotonic() + self.ttl if self.ttl > 0 else float("inf")
+        key = self._key(action, payload_json)
+        with self._lock:
+            self._entries[key] = (result, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            actions = {
+                action: {"hits": hits, "misses": misses,
+                         "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0}
+                for action, (hits, misses) in self._counts.items()
+            }
+            return {"max_entries": self.max_entries, "ttl": self.ttl, "cached": len(self._entries),
+                    "actions": actions}
+
+_lock = threading.Lock()
+_memo: Optional[ResultMemo] = None
+
+def get_memo() -> Optional[ResultMemo]:
+    """Return the process-wide memo, or None if OPENEXEC_MEMO_SIZE is 0."""
+    global _memo
+    if _memo is None:
+        size = int(os.getenv("OPENEXEC_MEMO_SIZE", DEFAULT_MEMO_SIZE))
+        if size <= 0:
+            return None
+        with _lock:
+            if _memo is None:
+                _memo = ResultMemo(size, float(os.getenv("OPENEXEC_MEMO_TTL", DEFAULT_MEMO_TTL)))
+    return _memo
+
+def reset_memo() -> None:
+    global _memo
+    with _lock:
+        _memo = None
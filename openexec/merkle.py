@@ -0,0 +1,56 @@
+"""
+Merkle trees over execution receipts.
+
+Leaves and interior nodes are domain-separated (0x00 / 0x01 prefixes) so a
+leaf can never be passed off as an interior node. An unpaired node at the
+end of a level is promoted unchanged to the next level.
+"""
+
+import hashlib
+from typing import List, Sequence
+
+def leaf_hash(receipt: str) -> bytes:
+    return hashlib.sha256(b"\x00" + bytes.fromhex(receipt)).digest()
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+def build_levels(leaves: Sequence[bytes]) -> List[List[bytes]]:
+    if not leaves:
+        raise ValueError("Cannot build a Merkle tree without leaves")
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parent = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parent.append(level[-1])
+        levels.append(parent)
+    return levels
+
+def merkle_root(leaves: Sequence[bytes]) -> bytes:
+    return build_levels(leaves)[-1][0]
+
+def inclusion_proof(levels: List[List[bytes]], index: int) -> List[dict]:
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            side = "left" if sibling < index else "right"
+            proof.append({"side": side, "hash": level[sibling].hex()})
+        index //= 2
+    return proof
+
+def verify_proof(receipt: str, proof: List[dict], root: str) -> bool:
+    try:
+        node = leaf_hash(receipt)
+        for step in proof:
+            sibling = bytes.fromhex(step["hash"])
+            if step["side"] == "left":
+                node = node_hash(sibling, node)
+            elif step["side"] == "right":
+                node = node_hash(node, sibling)
+            else:
+                return False
+        return node.hex() == root
+    except (KeyError, TypeError, ValueError):
+        return False
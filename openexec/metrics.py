@@ -0,0 +1,92 @@
+"""
+In-process execution metrics in Prometheus text format.
+
+Stage latencies are recorded as fixed-bucket histograms labelled by stage
+and action; execution outcomes are counted by action, mode, outcome and
+rejection reason. Everything lives in this process and is rendered by the
+/metrics endpoint; no agent or push gateway is involved.
+"""
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+_lock = threading.Lock()
+_stages: Dict[Tuple[str, str], Histogram] = {}
+_outcomes: Dict[Tuple[str, str, str, str], int] = {}
+
+def observe(stage: str, action: str, seconds: float) -> None:
+    key = (stage, action)
+    with _lock:
+        histogram = _stages.get(key)
+        if histogram is None:
+            histogram = _stages[key] = Histogram()
+        histogram.observe(seconds)
+
+@contextmanager
+def timed(stage: str, action: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, action, time.perf_counter() - start)
+
+def count_outcome(action: str, mode: str, outcome: str, reason: str = "") -> None:
+    key = (action, mode, outcome, reason)
+    with _lock:
+        _outcomes[key] = _outcomes.get(key, 0) + 1
+
+def reset() -> None:
+    with _lock:
+        _stages.clear()
+        _outcomes.clear()
+
+def _labels(**labels: str) -> str:
+    parts = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+def render() -> str:
+    with _lock:
+        stages = [(key, list(h.counts), h.total, h.count) for key, h in sorted(_stages.items())]
+        outcomes = sorted(_outcomes.items())
+
+    lines: List[str] = [
+        "# HELP openexec_stage_seconds Latency of each execution stage.",
+        "# TYPE openexec_stage_seconds histogram",
+    ]
+    for (stage, action), counts, total, count in stages:
+        cumulative = 0
+        for bound, n in zip(BUCKETS, counts):
+            cumulative += n
+            lines.append(f"openexec_stage_seconds_bucket{_labels(stage=stage, action=action, le=repr(bound))} {cumulative}")
+        lines.append(f"openexec_stage_seconds_bucket{_labels(stage=stage, action=action, le='+Inf')} {count}")
+        lines.append(f"openexec_stage_seconds_sum{_labels(stage=stage, action=action)} {total}")
+        lines.append(f"openexec_stage_seconds_count{_labels(stage=stage, action=action)} {count}")
+
+    lines += [
+        "# HELP openexec_executions_total Executions by outcome.",
+        "# TYPE openexec_executions_total counter",
+    ]
+    for (action, mode, outcome, reason), n in outcomes:
+        lines.append(f"openexec_executions_total{_labels(action=action, mode=mode, outcome=outcome, reason=reason)} {n}")
+    return "\n".join(lines) + "\n"
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class ApprovalArtifact(BaseModel):
     approval_id: str
@@ -8,6 +8,7 @@ class ApprovalArtifact(BaseModel):
     issued_at: str
     expires_at: str
     signature: str
+    key_id: Optional[str] = None
 
 class ExecutionRequest(BaseModel):
     action: str
@@ -15,9 +16,16 @@ class ExecutionRequest(BaseModel):
     nonce: str
     approval_artifact: Optional[ApprovalArtifact] = None
 
+class MerkleProof(BaseModel):
+    batch: int
+    index: int
+    root: str
+    path: List[dict]
+
 class ExecutionResult(BaseModel):
     id: str
     action: str
     result: dict
     approved: bool
     receipt: Optional[str] = None
+    proof: Optional[MerkleProof] = None
@@ -0,0 +1,180 @@
+"""
+Compiled runtime policy.
+
+The execution mode, allow-list and expected tenant are compiled once into an
+immutable Policy together with the verification keyring, instead of being
+re-read and re-split from the environment on every request. A request takes
+one snapshot and uses it throughout, and reloads swap in a complete new
+Policy atomically.
+
+``OPENEXEC_MODE``, ``OPENEXEC_ALLOWED_ACTIONS`` and ``CLAWSHIELD_TENANT_ID``
+override ``mode``, ``allowed_actions`` and ``clawshield.tenant_id`` from the
+``OPENEXEC_CONFIG`` file. The config file is re-checked by mtime at most
+every few seconds, a keyring rotation is picked up as it happens, and SIGHUP
+forces a reload of both policy and keyring on the next request.
+"""
+
+import os
+import time
+import signal
+import logging
+import threading
+from enum import Enum
+from typing import FrozenSet, NamedTuple, Optional, Tuple
+from openexec.keyring import Keyring, KeyringError, get_keyring, reload_keyring
+from openexec.settings import load_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECK_INTERVAL = 5.0
+
+class Mode(str, Enum):
+    DEMO = "demo"
+    CLAWSHIELD = "clawshield"
+
+class PolicyError(ValueError):
+    pass
+
+class Policy(NamedTuple):
+    mode_name: str
+    mode: Optional[Mode]
+    allow_list: Optional[Tuple[str, ...]]
+    allowed_actions: Optional[FrozenSet[str]]
+    tenant_id: str
+    keyring: Optional[Keyring]
+    keyring_error: Optional[str]
+    version: int
+    source: tuple
+
+    def allows(self, action: str) -> bool:
+        return self.allowed_actions is None or action in self.allowed_actions
+
+_lock = threading.Lock()
+_policy: Optional[Policy] = None
+_version = 0
+_next_config_check = 0.0
+_reload_requested = threading.Event()
+
+def _config_mtime(path: Optional[str]) -> Optional[float]:
+    if not path:
+        return None
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+def _read_source() -> tuple:
+    # Compared by identity like the keyring source: os.environ returns the
+    # same string objects until a value changes.
+    return (
+        os.environ.get("OPENEXEC_MODE"),
+        os.environ.get("OPENEXEC_ALLOWED_ACTIONS"),
+        os.environ.get("CLAWSHIELD_TENANT_ID"),
+        os.environ.get("OPENEXEC_CONFIG"),
+    )
+
+def _same_source(a: tuple, b: tuple) -> bool:
+    return len(a) == len(b) and all(x is y or x == y for x, y in zip(a, b))
+
+def _load_keyring() -> Tuple[Optional[Keyring], Optional[str]]:
+    try:
+        return get_keyring(), None
+    except KeyringError as e:
+        return None, str(e)
+
+def compile_policy(source: tuple, keyring: Optional[Keyring] = None, keyring_error: Optional[str] = None,
+                   version: int = 0) -> Policy:
+    mode_env, allowed_env, tenant_env, config_path = source
+    try:
+        config = load_config() if config_path else {}
+    except (OSError, ValueError) as e:
+        raise PolicyError(f"Cannot read policy from {config_path}: {e}")
+    if not isinstance(config, dict) or not isinstance(config.get("clawshield", {}), dict):
+        raise PolicyError(f"{config_path} must be a JSON object")
+
+    mode_name = mode_env or config.get("mode") or Mode.DEMO.value
+    try:
+        mode = Mode(mode_name)
+    except ValueError:
+        mode = None
+
+    if allowed_env:
+        allow_list = tuple(a.strip() for a in allowed_env.split(",") if a.strip())
+    elif config.get("allowed_actions"):
+        allow_list = tuple(str(a) for a in config["allowed_actions"])
+    else:
+        allow_list = None
+
+    return Policy(
+        mode_name=mode_name,
+        mode=mode,
+        allow_list=allow_list,
+        allowed_actions=frozenset(allow_list) if allow_list else None,
+        tenant_id=tenant_env or config.get("clawshield", {}).get("tenant_id") or "",
+        keyring=keyring,
+        keyring_error=keyring_error,
+        version=version,
+        source=source + (_config_mtime(config_path),),
+    )
+
+def reload_policy(force_keyring: bool = False) -> Policy:
+    """Recompile the policy and swap it in.
+
+    If the new sources are malformed the previous policy stays active and
+    the error is logged; with no previous policy the error is raised.
+    """
+    global _policy, _version
+    if force_keyring:
+        try:
+            reload_keyring()
+        except KeyringError:
+            pass
+    keyring, keyring_error = _load_keyring()
+    source = _read_source()
+    with _lock:
+        _schedule_config_check()
+        try:
+            policy = compile_policy(source, keyring, keyring_error, version=_version + 1)
+        except PolicyError:
+            if _policy is None:
+                raise
+            logger.exception("Policy reload failed; keeping the previous policy")
+            _policy = _policy._replace(keyring=keyring, keyring_error=keyring_error,
+                                       source=source + (_config_mtime(source[3]),))
+            return _policy
+        _version += 1
+        _policy = policy
+    return policy
+
+def get_policy() -> Policy:
+    if _reload_requested.is_set():
+        _reload_requested.clear()
+        return reload_policy(force_keyring=True)
+    policy = _policy
+    if policy is None:
+        return reload_policy()
+    current = _read_source()
+    if not _same_source(current, policy.source[:4]):
+        return reload_policy()
+    if policy.keyring is not _load_keyring()[0]:
+        return reload_policy()
+    if current[3] and time.monotonic() >= _next_config_check:
+        if _config_mtime(current[3]) != policy.source[4]:
+            return reload_policy()
+        _schedule_config_check()
+    return policy
+
+def _schedule_config_check() -> None:
+    global _next_config_check
+    _next_config_check = time.monotonic() + float(
+        os.getenv("OPENEXEC_POLICY_CHECK_INTERVAL", DEFAULT_CHECK_INTERVAL)
+    )
+
+def install_reload_signal() -> None:
+    """Reload policy and keyring after SIGHUP. Must be called from the main thread.
+
+    The handler only flags the reload: it may interrupt a thread holding the
+    policy or keyring lock, so the next ``get_policy()`` does the work.
+    """
+    if hasattr(signal, "SIGHUP") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGHUP, lambda signum, frame: _reload_requested.set())
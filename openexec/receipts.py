@@ -1,5 +1,211 @@
+import os
 import hashlib
+import logging
+import datetime
+import threading
+from functools import lru_cache
+from typing import List, Optional
+from sqlalchemy import bindparam, or_, select, union_all, update
+from openexec.blobs import body_text
+from openexec.db import SessionLocal
+from openexec.merkle import build_levels, inclusion_proof, leaf_hash, verify_proof
+from openexec.tables import ArchivedExecution, ExecutionLog, ReceiptRoot
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MERKLE_BATCH_SIZE = 1024
+DEFAULT_MERKLE_INTERVAL = 60.0
+
+def make_receipt(exec_id: str, result: str) -> str:
+    digest = hashlib.sha256(exec_id.encode())
+    digest.update(b":")
+    digest.update(result.encode())
+    return digest.hexdigest()
 
 def verify_receipt(exec_id: str, result: str, receipt: str) -> bool:
-    expected = hashlib.sha256(f"{exec_id}:{result}".encode()).hexdigest()
+    expected = make_receipt(exec_id, result)
     return expected == receipt
+
+def get_merkle_batch_size() -> int:
+    return int(os.getenv("OPENEXEC_MERKLE_BATCH_SIZE", DEFAULT_MERKLE_BATCH_SIZE))
+
+def get_merkle_interval() -> float:
+    return float(os.getenv("OPENEXEC_MERKLE_INTERVAL", DEFAULT_MERKLE_INTERVAL))
+
+_seal_lock = threading.Lock()
+_pending_lock = threading.Lock()
+_pending = 0
+_generation = 0
+_wake = threading.Event()
+_stop = threading.Event()
+_sealer: Optional[threading.Thread] = None
+
+def note_execution(count: int = 1) -> None:
+    """Count newly stored executions and wake the sealer when a batch is full."""
+    global _pending
+    with _pending_lock:
+        _pending += count
+        full = _pending >= get_merkle_batch_size()
+    if full:
+        _wake.set()
+
+def seal_generation() -> int:
+    """Number of batches sealed by this process; changes whenever proofs may have appeared."""
+    return _generation
+
+def _seal_loop() -> None:
+    while not _stop.is_set():
+        _wake.wait(get_merkle_interval())
+        _wake.clear()
+        if _stop.is_set():
+            return
+        try:
+            while seal_pending() and _pending >= get_merkle_batch_size():
+                pass
+        except Exception:
+            logger.exception("Sealing receipts failed")
+
+def start_sealer() -> None:
+    """Seal receipts on a background thread, on a full batch or every interval."""
+    global _sealer
+    if _sealer is None:
+        _stop.clear()
+        _sealer = threading.Thread(target=_seal_loop, name="openexec-sealer", daemon=True)
+        _sealer.start()
+
+def stop_sealer() -> None:
+    global _sealer
+    if _sealer is not None:
+        _stop.set()
+        _wake.set()
+        _sealer.join()
+        _sealer = None
+
+def seal_pending(max_leaves: Optional[int] = None) -> Optional[dict]:
+    """Anchor up to ``max_leaves`` unanchored receipts into a new Merkle root."""
+    global _pending, _generation
+    if not _seal_lock.acquire(blocking=False):
+        return None
+    try:
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(ExecutionLog.id, ExecutionLog.receipt)
+                .filter(ExecutionLog.merkle_batch.is_(None))
+                # Queued executions have no result or receipt yet.
+                .filter(or_(ExecutionLog.receipt.isnot(None), ExecutionLog.status.is_(None)))
+                .order_by(ExecutionLog.timestamp, ExecutionLog.id)
+                .limit(max_leaves or get_merkle_batch_size())
+                .all()
+            )
+            if not rows:
+                return None
+
+            receipts = [row.receipt or _legacy_receipt(db, row.id) for row in rows]
+            root = build_levels([leaf_hash(r) for r in receipts])[-1][0].hex()
+            entry = ReceiptRoot(root=root, size=len(rows), created_at=datetime.datetime.utcnow())
+            db.add(entry)
+            db.flush()
+
+            # Guard on merkle_batch IS NULL so a concurrent sealer in another
+            # process cannot anchor the same rows twice.
+            table = ExecutionLog.__table__
+            stmt = (
+                update(table)
+                .where(table.c.id == bindparam("_id"), table.c.merkle_batch.is_(None))
+                .values(merkle_batch=bindparam("_batch"), merkle_index=bindparam("_index"),
+                        receipt=bindparam("_receipt"))
+            )
+            updated = db.connection().execute(stmt, [
+                {"_id": row.id, "_batch": entry.id, "_index": i, "_receipt": receipts[i]}
+                for i, row in enumerate(rows)
+            ])
+            if updated.rowcount != len(rows):
+                db.rollback()
+                return None
+            db.commit()
+            with _pending_lock:
+                _pending = max(0, _pending - len(rows))
+                _generation += 1
+            return {"batch": entry.id, "root": root, "size": len(rows)}
+        finally:
+            db.close()
+    finally:
+        _seal_lock.release()
+
+def _legacy_receipt(db, exec_id: str) -> str:
+    # Rows written before receipts were persisted only have the result text.
+    result, ref = db.query(ExecutionLog.result, ExecutionLog.result_ref).filter_by(id=exec_id).one()
+    return make_receipt(exec_id, body_text(db, result, ref))
+
+def get_root(batch: int) -> Optional[dict]:
+    db = SessionLocal()
+    try:
+        entry = db.get(ReceiptRoot, batch)
+        if entry is None:
+            return None
+        return {
+            "batch": entry.id,
+            "root": entry.root,
+            "size": entry.size,
+            "created_at": entry.created_at.isoformat() if entry.created_at else None,
+        }
+    finally:
+        db.close()
+
+@lru_cache(maxsize=64)
+def _batch_levels(batch: int) -> Optional[List[List[bytes]]]:
+    # Sealed batches are immutable, so their trees can be cached. Part of a
+    # batch may already have been compacted into execution_archive.
+    leaves = union_all(
+        select(ExecutionLog.merkle_index, ExecutionLog.receipt).where(ExecutionLog.merkle_batch == batch),
+        select(ArchivedExecution.merkle_index, ArchivedExecution.receipt).where(ArchivedExecution.merkle_batch == batch),
+    ).subquery()
+    db = SessionLocal()
+    try:
+        entry = db.get(ReceiptRoot, batch)
+        receipts = [r for (r,) in db.execute(select(leaves.c.receipt).order_by(leaves.c.merkle_index))]
+    finally:
+        db.close()
+    if entry is None or len(receipts) != entry.size:
+        return None
+    levels = build_levels([leaf_hash(r) for r in receipts])
+    if levels[-1][0].hex() != entry.root:
+        return None
+    return levels
+
+def get_proof(batch: Optional[int], index: Optional[int]) -> Optional[dict]:
+    if batch is None or index is None:
+        return None
+    levels = _batch_levels(batch)
+    if levels is None:
+        return None
+    return {
+        "batch": batch,
+        "index": index,
+        "root": levels[-1][0].hex(),
+        "path": inclusion_proof(levels, index),
+    }
+
+def get_execution_proof(exec_id: str) -> Optional[dict]:
+    db = SessionLocal()
+    try:
+        row = (
+            db.query(ExecutionLog.merkle_batch, ExecutionLog.merkle_index, ExecutionLog.receipt).filter_by(id=exec_id).first()
+            or db.query(ArchivedExecution.merkle_batch, ArchivedExecution.merkle_index, ArchivedExecution.receipt)
+            .filter_by(id=exec_id).first()
+        )
+    finally:
+        db.close()
+    if row is None:
+        return None
+    proof = get_proof(row.merkle_batch, row.merkle_index)
+    if proof is None:
+        return None
+    return {"exec_id": exec_id, "receipt": row.receipt, "proof": proof}
+
+def verify_anchored_receipt(receipt: str, batch: int, path: List[dict]) -> bool:
+    root = get_root(batch)
+    if root is None:
+        return False
+    return verify_proof(receipt, path, root["root"])
@@ -1,9 +1,76 @@
-from typing import Callable, Dict
+import pickle
+import inspect
+from typing import Callable, Dict, Optional, Set
+from openexec.bulkhead import Bulkhead
 
 _actions: Dict[str, Callable] = {}
+_bulkheads: Dict[str, Bulkhead] = {}
+_cpu_bound: Set[str] = set()
+_pure: Set[str] = set()
+_streaming: Set[str] = set()
 
-def register_action(name: str, handler: Callable):
+def register_action(name: str, handler: Callable, max_concurrency: Optional[int] = None,
+                    max_queue: int = 0, timeout: Optional[float] = None, cpu_bound: bool = False,
+                    pure: bool = False):
+    # Handlers may be plain functions or ``async def`` coroutines; the engine
+    # awaits async handlers and offloads sync ones to its handler executor.
+    # Any of max_concurrency / timeout puts the action behind its own bulkhead.
+    # cpu_bound handlers run on the process pool, so they must be sync,
+    # module-level functions that worker processes can import by name.
+    # pure handlers promise a result that depends only on the payload; the
+    # engine may then reuse a memoized result instead of calling them.
+    # Generator handlers (sync or async) stream their result as dict chunks
+    # through /execute/stream; they run unbounded, so they cannot also be
+    # cpu_bound, pure or behind a bulkhead.
+    if not callable(handler):
+        raise TypeError(f"Handler for action '{name}' is not callable")
+    streaming = inspect.isgeneratorfunction(handler) or inspect.isasyncgenfunction(handler)
+    if streaming and (cpu_bound or pure or max_concurrency is not None or timeout is not None):
+        raise TypeError(f"Streaming handler for action '{name}' cannot be cpu_bound, pure or bulkheaded")
+    if max_concurrency is not None and max_concurrency < 1:
+        raise ValueError(f"max_concurrency for action '{name}' must be at least 1")
+    if cpu_bound:
+        if inspect.iscoroutinefunction(handler):
+            raise TypeError(f"CPU-bound handler for action '{name}' must not be a coroutine")
+        try:
+            pickle.dumps(handler)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            raise TypeError(f"CPU-bound handler for action '{name}' must be an importable module-level function")
+        _cpu_bound.add(name)
+    else:
+        _cpu_bound.discard(name)
+    if pure:
+        _pure.add(name)
+    else:
+        _pure.discard(name)
+    if streaming:
+        _streaming.add(name)
+    else:
+        _streaming.discard(name)
     _actions[name] = handler
+    if max_concurrency is not None or timeout is not None:
+        _bulkheads[name] = Bulkhead(name, max_concurrency, max_queue, timeout)
+    else:
+        _bulkheads.pop(name, None)
+
+def unregister_action(name: str) -> None:
+    _actions.pop(name, None)
+    _bulkheads.pop(name, None)
+    _cpu_bound.discard(name)
+    _pure.discard(name)
+    _streaming.discard(name)
+
+def is_cpu_bound(name: str) -> bool:
+    return name in _cpu_bound
+
+def is_pure(name: str) -> bool:
+    return name in _pure
+
+def is_streaming(name: str) -> bool:
+    return name in _streaming
+
+def has_cpu_bound_actions() -> bool:
+    return bool(_cpu_bound)
 
 def get_action(name: str) -> Callable:
     handler = _actions.get(name)
@@ -11,6 +78,16 @@ def get_action(name: str) -> Callable:
         raise ValueError(f"Unknown action: {name}")
     return handler
 
+def action_label(name: str) -> str:
+    # Metrics label: unregistered, client-supplied names share one series.
+    return name if name in _actions else "unknown"
+
+def get_bulkhead(name: str) -> Optional[Bulkhead]:
+    return _bulkheads.get(name)
+
+def bulkhead_stats() -> Dict[str, dict]:
+    return {name: bulkhead.stats() for name, bulkhead in _bulkheads.items()}
+
 def list_actions():
     return list(_actions.keys())
 
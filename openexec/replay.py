@@ -0,0 +1,147 @@
+"""
+In-process replay index in front of the execution_log nonce check.
+
+A Bloom filter answers "definitely new" for fresh nonces so they can skip
+the database pre-check and go straight to the IntegrityError-guarded insert.
+A bounded LRU of recent results answers known replays from memory. The
+filter is warmed from the database on first use, so it is only a safe
+substitute for the pre-check when this process is the sole writer.
+"""
+
+import os
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_CAPACITY = 1_000_000
+DEFAULT_ERROR_RATE = 0.001
+DEFAULT_CACHE_SIZE = 10_000
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = DEFAULT_ERROR_RATE):
+        capacity = max(1, capacity)
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+class ReplayIndex:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, cache_size: int = DEFAULT_CACHE_SIZE,
+                 error_rate: float = DEFAULT_ERROR_RATE):
+        self._lock = threading.Lock()
+        self._filter = BloomFilter(capacity, error_rate)
+        self._recent: "OrderedDict[str, Any]" = OrderedDict()
+        self._cache_size = cache_size
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.db_hits = 0
+        self.false_positives = 0
+
+    def warm(self, nonce: str) -> None:
+        with self._lock:
+            self._filter.add(nonce)
+
+    def lookup(self, nonce: str) -> Tuple[Optional[Any], bool]:
+        """Return ``(cached_result, needs_db_check)`` for a nonce."""
+        with self._lock:
+            cached = self._recent.get(nonce)
+            if cached is not None:
+                self._recent.move_to_end(nonce)
+                self.hits += 1
+                return cached, False
+            if nonce not in self._filter:
+                self.misses += 1
+                return None, False
+            return None, True
+
+    def confirm(self, nonce: str, result: Optional[Any]) -> None:
+        if result is None:
+            with self._lock:
+                self.false_positives += 1
+            return
+        with self._lock:
+            self.db_hits += 1
+        self.remember(nonce, result)
+
+    def remember(self, nonce: str, result: Any) -> None:
+        with self._lock:
+            self._filter.add(nonce)
+            self._recent[nonce] = result
+            self._recent.move_to_end(nonce)
+            while len(self._recent) > self._cache_size:
+                self._recent.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "filter_bits": self._filter.num_bits,
+                "filter_hashes": self._filter.num_hashes,
+                "cached": len(self._recent),
+                "hits": self.hits,
+                "misses": self.misses,
+                "db_hits": self.db_hits,
+                "false_positives": self.false_positives,
+            }
+
+_lock = threading.Lock()
+_index: Optional[ReplayIndex] = None
+
+def replay_filter_enabled() -> bool:
+    from openexec.shards import sharding_enabled
+
+    # The filter covers one database's nonces; with shards a nonce is only
+    # unique within its shard, so the per-shard pre-check stays authoritative.
+    return os.getenv("OPENEXEC_REPLAY_FILTER", "off").lower() in ("1", "on", "true") and not sharding_enabled()
+
+def get_replay_index() -> Optional[ReplayIndex]:
+    global _index
+    if not replay_filter_enabled():
+        return None
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index = _build_index()
+    return _index
+
+def peek_replay_index() -> Optional[ReplayIndex]:
+    """Return the index only if it has already been built."""
+    return _index if replay_filter_enabled() else None
+
+def reset_replay_index() -> None:
+    global _index
+    with _lock:
+        _index = None
+
+def _build_index() -> ReplayIndex:
+    from openexec.db import SessionLocal
+    from openexec.tables import ExecutionLog, ArchivedExecution
+
+    index = ReplayIndex(
+        capacity=int(os.getenv("OPENEXEC_REPLAY_FILTER_CAPACITY", DEFAULT_CAPACITY)),
+        cache_size=int(os.getenv("OPENEXEC_REPLAY_CACHE_SIZE", DEFAULT_CACHE_SIZE)),
+    )
+    db = SessionLocal()
+    try:
+        for column in (ExecutionLog.nonce, ArchivedExecution.nonce):
+            for (nonce,) in db.query(column).yield_per(10_000):
+                index.warm(nonce)
+    finally:
+        db.close()
+    return index
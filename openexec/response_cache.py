@@ -0,0 +1,75 @@
+"""
+Bounded cache of serialized /execute responses keyed by nonce.
+
+Retrying clients replay the same nonce many times. Once a response has been
+rendered, its JSON bytes are kept so later replays are returned as-is,
+without a database lookup, JSON decoding or re-serialization.
+
+A response rendered before its receipt was anchored carries no Merkle
+proof. Such entries are only served until this process seals another
+batch, after which they are dropped and re-rendered with the proof.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from openexec.receipts import seal_generation
+
+DEFAULT_CACHE_SIZE = 10_000
+
+class ResponseCache:
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[bytes, Optional[int]]]" = OrderedDict()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, nonce: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(nonce)
+            if entry is not None:
+                body, generation = entry
+                if generation is None or generation == seal_generation():
+                    self._entries.move_to_end(nonce)
+                    self.hits += 1
+                    return body
+                del self._entries[nonce]
+            self.misses += 1
+            return None
+
+    def put(self, nonce: str, body: bytes, anchored: bool) -> None:
+        # Anchored responses never change; unanchored ones are tagged with
+        # the seal generation they were rendered under.
+        generation = None if anchored else seal_generation()
+        with self._lock:
+            self._entries[nonce] = (body, generation)
+            self._entries.move_to_end(nonce)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"max_entries": self.max_entries, "cached": len(self._entries),
+                    "hits": self.hits, "misses": self.misses}
+
+_lock = threading.Lock()
+_cache: Optional[ResponseCache] = None
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the process-wide cache, or None if OPENEXEC_RESPONSE_CACHE_SIZE is 0."""
+    global _cache
+    if _cache is None:
+        size = int(os.getenv("OPENEXEC_RESPONSE_CACHE_SIZE", DEFAULT_CACHE_SIZE))
+        if size <= 0:
+            return None
+        with _lock:
+            if _cache is None:
+                _cache = ResponseCache(size)
+    return _cache
+
+def reset_response_cache() -> None:
+    global _cache
+    with _lock:
+        _cache = None
@@ -0,0 +1,234 @@
+"""
+Retention and archival for execution_log.
+
+Live rows older than the retention window are compacted, one day bucket at
+a time, into read-only SQLite segment files whose bodies are zlib-compressed.
+Segments stay queryable by execution id and nonce. The execution_archive
+index table keeps every archived nonce in the live database, so replay
+protection continues to hold after a row has left execution_log. It also
+keeps each archived receipt and its Merkle position, so sealed batches that
+straddle the cutoff can still be rebuilt and proven.
+
+Receipts are sealed before compaction and only anchored rows are archived;
+rows that could not be sealed stay live until the next run. Bodies held in
+execution_blob are written inline into the segment, and blobs that no live
+row references any more are deleted. Streamed results stay live.
+
+Run ``python -m openexec.retention`` from cron to compact on a schedule.
+"""
+
+import os
+import json
+import zlib
+import sqlite3
+import datetime
+from typing import Callable, Dict, Iterable, Optional
+from sqlalchemy import func, insert, null, or_, select, union_all
+from openexec.db import SessionLocal, engine
+from openexec.receipts import seal_pending
+from openexec.blobs import body_text, collect_garbage
+from openexec.tables import ExecutionLog, ArchivedExecution
+
+DEFAULT_RETENTION_DAYS = 30
+DEFAULT_ARCHIVE_DIR = "archive"
+_INDEX_CHUNK = 5000
+
+_SEGMENT_SCHEMA = """
+CREATE TABLE segment (
+    id TEXT PRIMARY KEY,
+    nonce TEXT NOT NULL UNIQUE,
+    action TEXT NOT NULL,
+    approved INTEGER NOT NULL,
+    timestamp TEXT,
+    body BLOB NOT NULL
+)
+"""
+
+def get_retention_days() -> int:
+    return int(os.getenv("OPENEXEC_RETENTION_DAYS", DEFAULT_RETENTION_DAYS))
+
+def get_archive_dir() -> str:
+    return os.getenv("OPENEXEC_ARCHIVE_DIR", DEFAULT_ARCHIVE_DIR)
+
+def _segment_path(archive_dir: str, day: str) -> str:
+    base = os.path.join(archive_dir, f"execution_log-{day}")
+    path = f"{base}.seg"
+    n = 1
+    while os.path.exists(path):
+        path = f"{base}.{n}.seg"
+        n += 1
+    return path
+
+def _write_segment(path: str, rows: Iterable[ExecutionLog], on_row: Callable[[ExecutionLog], None],
+                   text: Callable[[Optional[str], Optional[str]], Optional[str]] = lambda t, ref: t) -> int:
+    tmp_path = f"{path}.tmp"
+    conn = sqlite3.connect(tmp_path)
+    count = 0
+    try:
+        conn.execute(_SEGMENT_SCHEMA)
+        for row in rows:
+            body = json.dumps({
+                # Segments are self-contained: blob references are inlined.
+                "payload": text(row.payload, row.payload_ref),
+                "result": text(row.result, row.result_ref),
+                "receipt": row.receipt,
+                "merkle_batch": row.merkle_batch,
+                "merkle_index": row.merkle_index,
+            }).encode()
+            conn.execute(
+                "INSERT INTO segment VALUES (?, ?, ?, ?, ?, ?)",
+                (row.id, row.nonce, row.action, int(bool(row.approved)),
+                 row.timestamp.isoformat() if row.timestamp else None, zlib.compress(body, 9)),
+            )
+            on_row(row)
+            count += 1
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    os.chmod(path, 0o444)
+    return count
+
+def _read_segment(path: str, exec_id: str) -> Optional[ExecutionLog]:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        row = conn.execute(
+            "SELECT id, nonce, action, approved, timestamp, body FROM segment WHERE id = ?",
+            (exec_id,),
+        ).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    body = json.loads(zlib.decompress(row[5]))
+    return ExecutionLog(
+        id=row[0],
+        nonce=row[1],
+        action=row[2],
+        approved=bool(row[3]),
+        timestamp=datetime.datetime.fromisoformat(row[4]) if row[4] else None,
+        payload=body["payload"],
+        result=body["result"],
+        receipt=body.get("receipt"),
+        merkle_batch=body.get("merkle_batch"),
+        merkle_index=body.get("merkle_index"),
+    )
+
+def find_archived(db, nonce: Optional[str] = None, exec_id: Optional[str] = None) -> Optional[ExecutionLog]:
+    """Load an archived execution by nonce or id as a detached ExecutionLog."""
+    query = db.query(ArchivedExecution)
+    if nonce is not None:
+        entry = query.filter_by(nonce=nonce).first()
+    else:
+        entry = query.filter_by(id=exec_id).first()
+    if entry is None:
+        return None
+    return _read_segment(entry.segment, entry.id)
+
+def find_by_nonce(db, nonce: str) -> Optional[ExecutionLog]:
+    """Find an execution by nonce across live and archived data in one query."""
+    live = select(
+        ExecutionLog.id, ExecutionLog.action, ExecutionLog.result, ExecutionLog.approved,
+        ExecutionLog.receipt, ExecutionLog.merkle_batch, ExecutionLog.merkle_index, ExecutionLog.status,
+        ExecutionLog.result_ref, null().label("segment"),
+    ).where(ExecutionLog.nonce == nonce)
+    archived = select(
+        ArchivedExecution.id, null(), null(), null(), null(), null(), null(), null(), null(),
+        ArchivedExecution.segment,
+    ).where(ArchivedExecution.nonce == nonce)
+    row = db.execute(union_all(live, archived).limit(1)).first()
+    if row is None:
+        return None
+    if row.segment is not None:
+        return _read_segment(row.segment, row.id)
+    return ExecutionLog(
+        id=row.id,
+        nonce=nonce,
+        action=row.action,
+        result=body_text(db, row.result, row.result_ref),
+        approved=row.approved,
+        receipt=row.receipt,
+        merkle_batch=row.merkle_batch,
+        merkle_index=row.merkle_index,
+        status=row.status,
+    )
+
+def find_archived_many(db, nonces: Iterable[str]) -> Dict[str, ExecutionLog]:
+    nonces = list(nonces)
+    if not nonces:
+        return {}
+    entries = db.query(ArchivedExecution).filter(ArchivedExecution.nonce.in_(nonces)).all()
+    found = {}
+    for entry in entries:
+        log = _read_segment(entry.segment, entry.id)
+        if log is not None:
+            found[entry.nonce] = log
+    return found
+
+# Streamed results live in execution_chunk, not in a single body, so they
+# stay live rather than being copied whole into a segment.
+_archivable = or_(ExecutionLog.status.is_(None), ExecutionLog.status != "streamed")
+
+def compact(retention_days: Optional[int] = None, archive_dir: Optional[str] = None,
+            now: Optional[datetime.datetime] = None, vacuum: bool = False) -> dict:
+    if retention_days is None:
+        retention_days = get_retention_days()
+    archive_dir = archive_dir or get_archive_dir()
+    now = now or datetime.datetime.utcnow()
+    cutoff = (now - datetime.timedelta(days=retention_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    os.makedirs(archive_dir, exist_ok=True)
+    while seal_pending():
+        pass
+
+    summary = {"cutoff": cutoff.isoformat(), "segments": [], "archived": 0}
+    db = SessionLocal()
+    try:
+        days = sorted(
+            str(day) for (day,) in
+            db.query(func.date(ExecutionLog.timestamp))
+            .filter(ExecutionLog.timestamp < cutoff, ExecutionLog.merkle_batch.isnot(None), _archivable)
+            .distinct()
+        )
+        for day in days:
+            start = datetime.datetime.fromisoformat(day)
+            end = start + datetime.timedelta(days=1)
+            bucket = db.query(ExecutionLog).filter(
+                ExecutionLog.timestamp >= start, ExecutionLog.timestamp < end,
+                ExecutionLog.merkle_batch.isnot(None), _archivable,
+            )
+            path = _segment_path(archive_dir, day)
+            pending = []
+
+            def _index(row: ExecutionLog) -> None:
+                pending.append({
+                    "nonce": row.nonce, "id": row.id, "segment": path, "timestamp": row.timestamp,
+                    "receipt": row.receipt, "merkle_batch": row.merkle_batch, "merkle_index": row.merkle_index,
+                })
+                if len(pending) >= _INDEX_CHUNK:
+                    db.execute(insert(ArchivedExecution), pending)
+                    pending.clear()
+
+            count = _write_segment(path, bucket.order_by(ExecutionLog.timestamp).yield_per(_INDEX_CHUNK), _index,
+                                   lambda t, ref: body_text(db, t, ref))
+            if pending:
+                db.execute(insert(ArchivedExecution), pending)
+            bucket.delete(synchronize_session=False)
+            db.commit()
+            db.expunge_all()
+
+            summary["segments"].append({"day": day, "path": path, "rows": count})
+            summary["archived"] += count
+        if summary["archived"]:
+            summary["blobs_deleted"] = collect_garbage(db)
+    finally:
+        db.close()
+
+    if vacuum and summary["archived"] and engine.dialect.name == "sqlite":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("VACUUM")
+    return summary
+
+if __name__ == "__main__":
+    from openexec.db import init_db
+    init_db()
+    print(json.dumps(compact(vacuum=True)))
@@ -1,10 +1,21 @@
 import os
+import json
 
 def get_mode():
-    return os.getenv("OPENEXEC_MODE", "demo")
+    from openexec.policy import get_policy
+    return get_policy().mode_name
 
 def is_demo():
-    return get_mode() == "demo"
+    from openexec.policy import Mode, get_policy
+    return get_policy().mode is Mode.DEMO
 
 def is_clawshield():
-    return get_mode() == "clawshield"
+    from openexec.policy import Mode, get_policy
+    return get_policy().mode is Mode.CLAWSHIELD
+
+def load_config() -> dict:
+    path = os.getenv("OPENEXEC_CONFIG", "")
+    if not path:
+        return {}
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,142 @@
+"""
+Tenant-sharded execution storage.
+
+SQLite admits one writer per database file, so with a single execution_log
+every tenant's inserts queue behind the same lock. With ``OPENEXEC_SHARDS``
+set, ``/execute`` and ``/execute/batch`` route each execution by its tenant
+key (the approval artifact's ``tenant_id``, else ``mode:<mode>``, as for
+admission control) to a shard database under ``OPENEXEC_SHARD_DIR``:
+
+* ``tenant``: one file per tenant named in ``OPENEXEC_SHARD_TENANTS`` or
+  configured as the policy's ``CLAWSHIELD_TENANT_ID``; other tenants stay
+  on the primary database, so a client cannot create files by inventing
+  tenant ids;
+* ``N`` (an integer): N files, the tenant key hashed onto one of them.
+
+A shard file is only created when an authorized execution is written to
+it. Lookups never create one: a missing file means the nonce was not seen.
+
+Each shard has its own engine, connection pool and execution store, so
+tenants on different shards write in parallel. Nonces are unique within a
+shard: the same nonce from two tenants on different shards is two
+executions. The ledger list, export and lookup read every shard and merge
+by (timestamp, id), so pagination cursors keep working.
+
+Shard rows carry their per-execution receipts but are not Merkle-sealed,
+archived or covered by the receipt audit; ``/health`` and the audit report
+say so. ``/execute/async`` and ``/execute/stream`` only run on the primary
+database and reject requests that route to a shard, so a nonce is never
+taken twice through different endpoints.
+"""
+
+import os
+import re
+import glob
+import hashlib
+import threading
+from typing import Dict, FrozenSet, List, Optional
+from sqlalchemy.orm import sessionmaker
+from openexec.admission import admission_key
+from openexec.db import _config, init_db, make_engine
+from openexec.policy import get_policy
+from openexec.store import SQLiteStore
+
+DEFAULT_SHARD_DIR = "shards"
+
+class Shard:
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self.engine = make_engine(f"sqlite:///{path}")
+        init_db(self.engine)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.store = SQLiteStore(path, _config.get("sqlite", {}))
+
+def get_shard_mode():
+    """None when sharding is off, ``"tenant"``, or the number of hash partitions."""
+    mode = os.getenv("OPENEXEC_SHARDS", "").lower()
+    if mode in ("", "off", "none", "0"):
+        return None
+    if mode == "tenant":
+        return mode
+    if mode.isdigit():
+        return int(mode)
+    raise ValueError(f"Unknown shard mode: {mode}")
+
+def sharding_enabled() -> bool:
+    return get_shard_mode() is not None
+
+def get_shard_dir() -> str:
+    return os.getenv("OPENEXEC_SHARD_DIR", DEFAULT_SHARD_DIR)
+
+def shard_name(key: str) -> str:
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    mode = get_shard_mode()
+    if mode == "tenant":
+        # Readable, filename-safe, and distinct even when sanitizing collides.
+        return f"{re.sub(r'[^A-Za-z0-9_.-]', '_', key)[:48]}-{digest[:8]}"
+    return f"{int(digest[:16], 16) % mode:03d}"
+
+def get_shard_tenants() -> FrozenSet[str]:
+    tenants = {t.strip() for t in os.getenv("OPENEXEC_SHARD_TENANTS", "").split(",") if t.strip()}
+    tenant_id = get_policy().tenant_id
+    if tenant_id:
+        tenants.add(tenant_id)
+    return frozenset(tenants)
+
+def shard_for(request) -> Optional[str]:
+    """The shard a request's execution belongs on, or None for the primary database."""
+    mode = get_shard_mode()
+    if mode is None:
+        return None
+    key = admission_key(request)
+    if mode == "tenant" and key not in get_shard_tenants():
+        return None
+    return shard_name(key)
+
+_lock = threading.Lock()
+_shards: Dict[str, Shard] = {}
+
+def get_shard(name: str) -> Shard:
+    shard = _shards.get(name)
+    if shard is None:
+        with _lock:
+            shard = _shards.get(name)
+            if shard is None:
+                directory = get_shard_dir()
+                os.makedirs(directory, exist_ok=True)
+                shard = _shards[name] = Shard(name, os.path.join(directory, f"shard-{name}.db"))
+    return shard
+
+def require_primary(request, endpoint: str) -> None:
+    """Reject a request for an endpoint that only runs on the primary database."""
+    if shard_for(request) is not None:
+        raise ValueError(f"{endpoint} is not available for tenants on a shard; use /execute")
+
+def find_shard(name: str) -> Optional[Shard]:
+    """An existing shard, or None if nothing was ever written to it."""
+    shard = _shards.get(name)
+    if shard is None and os.path.exists(os.path.join(get_shard_dir(), f"shard-{name}.db")):
+        shard = get_shard(name)
+    return shard
+
+def all_shards() -> List[Shard]:
+    """Every shard on disk, for reads that fan out."""
+    if not sharding_enabled():
+        return []
+    paths = sorted(glob.glob(os.path.join(get_shard_dir(), "shard-*.db")))
+    return [get_shard(os.path.basename(path)[len("shard-"):-len(".db")]) for path in paths]
+
+def shard_stats() -> dict:
+    mode = get_shard_mode()
+    with _lock:
+        opened = len(_shards)
+    # Only the primary database is sealed into Merkle batches and audited.
+    return {"mode": mode, "dir": get_shard_dir(), "open": opened, "sealed": False, "audited": False}
+
+def reset_shards() -> None:
+    with _lock:
+        for shard in _shards.values():
+            shard.store.close()
+            shard.engine.dispose()
+        _shards.clear()
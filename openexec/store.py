@@ -0,0 +1,347 @@
+"""
+Execution stores: where the engine looks up nonces and records executions.
+
+The engine only needs four operations, defined by ExecutionStore: find an
+execution by nonce, find many, and insert one or many rows, getting back the
+existing row for any nonce that was already taken. Three backends implement
+them:
+
+* ``sqlalchemy``: ORM sessions, the group commit writer when enabled, and any
+  database SQLAlchemy supports. A lost race costs an IntegrityError and a
+  re-select.
+* ``sqlite``: the stdlib driver on per-thread connections in autocommit
+  mode, with statements prepared once and reused from the connection's
+  statement cache. A new nonce is one
+  ``INSERT ... ON CONFLICT(nonce) DO NOTHING RETURNING id`` statement; a
+  lost race is that statement plus one select, with no exception or
+  rollback.
+* ``memory``: a dict, for tests and benchmarks. It backs the engine's hot
+  path only; the async queue, ledger, receipt sealing and retention still
+  read the database.
+
+``OPENEXEC_STORE`` selects the backend. The default, ``auto``, uses the
+sqlite backend for file-backed SQLite databases without group commit, and
+sqlalchemy otherwise.
+"""
+
+import os
+import abc
+import asyncio
+import sqlite3
+import datetime
+import threading
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from openexec.blobs import cached_text, decode, decode_cached, pending_blobs, resolve
+from openexec.executor import run_engine
+from openexec.db import DATABASE_URL, SQLITE_DEFAULTS, SessionLocal, _config, get_group_commit_writer, group_commit_enabled
+from openexec.retention import _read_segment, find_archived_many, find_by_nonce
+from openexec.tables import ExecutionLog
+
+STATEMENT_CACHE_SIZE = 64
+IN_CHUNK = 500
+
+class ExecutionStore(abc.ABC):
+    @abc.abstractmethod
+    def find(self, nonce: str) -> Optional[ExecutionLog]:
+        """The execution recorded for a nonce, live or archived, with its result text."""
+
+    @abc.abstractmethod
+    def find_many(self, nonces: Iterable[str]) -> Dict[str, ExecutionLog]:
+        pass
+
+    @abc.abstractmethod
+    def insert(self, log: ExecutionLog) -> Optional[ExecutionLog]:
+        """Record a new execution; return None, or the existing row if the nonce was taken."""
+
+    async def insert_async(self, log: ExecutionLog) -> Optional[ExecutionLog]:
+        """insert() for the event loop; by default it runs on the engine pool."""
+        return await run_engine(self.insert, log)
+
+    def insert_many(self, logs: List[ExecutionLog]) -> Dict[str, ExecutionLog]:
+        """Record many executions; return the existing rows of nonces that were taken."""
+        conflicts = {}
+        for log in logs:
+            existing = self.insert(log)
+            if existing is not None:
+                conflicts[log.nonce] = existing
+        return conflicts
+
+    def close(self) -> None:
+        """Release connections held by the store."""
+
+class SqlAlchemyStore(ExecutionStore):
+    def find(self, nonce: str) -> Optional[ExecutionLog]:
+        db = SessionLocal()
+        try:
+            return find_by_nonce(db, nonce)
+        finally:
+            db.close()
+
+    def find_many(self, nonces: Iterable[str]) -> Dict[str, ExecutionLog]:
+        nonces = set(nonces)
+        if not nonces:
+            return {}
+        db = SessionLocal()
+        try:
+            rows = db.query(ExecutionLog).filter(ExecutionLog.nonce.in_(nonces)).all()
+            resolve(db, rows)
+            existing = {row.nonce: row for row in rows}
+            existing.update(find_archived_many(db, nonces - existing.keys()))
+            return existing
+        finally:
+            db.close()
+
+    def insert(self, log: ExecutionLog) -> Optional[ExecutionLog]:
+        nonce = log.nonce
+        writer = get_group_commit_writer()
+        if writer is not None:
+            inserted = writer.submit(log).result()
+        else:
+            db = SessionLocal()
+            try:
+                db.add(log)
+                db.commit()
+                inserted = True
+            except IntegrityError:
+                db.rollback()
+                inserted = False
+            finally:
+                db.close()
+        return None if inserted else self.find(nonce)
+
+    async def insert_async(self, log: ExecutionLog) -> Optional[ExecutionLog]:
+        writer = get_group_commit_writer()
+        if writer is None:
+            return await run_engine(self.insert, log)
+        nonce = log.nonce
+        # Wait for the batch on the loop rather than in an engine thread, so
+        # a batch can grow past the engine pool size and lookups keep flowing.
+        if await asyncio.wrap_future(writer.submit(log)):
+            return None
+        return await run_engine(self.find, nonce)
+
+    def insert_many(self, logs: List[ExecutionLog]) -> Dict[str, ExecutionLog]:
+        conflicts = {}
+        db = SessionLocal()
+        try:
+            try:
+                db.add_all(logs)
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                # A concurrent request claimed one of our nonces; fall back to
+                # per-row inserts so only the conflicting items become replays.
+                for log in logs:
+                    try:
+                        db.add(log)
+                        db.commit()
+                    except IntegrityError:
+                        db.rollback()
+                        conflicts[log.nonce] = find_by_nonce(db, log.nonce)
+        finally:
+            db.close()
+        return conflicts
+
+_INSERT = (
+    "INSERT INTO execution_log (id, action, payload, result, nonce, approved, timestamp, receipt, status,"
+    " payload_ref, result_ref) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    " ON CONFLICT(nonce) DO NOTHING RETURNING id"
+)
+_INSERT_BLOB = "INSERT OR IGNORE INTO execution_blob (hash, codec, size, data) VALUES (:hash, :codec, :size, :data)"
+_LIVE_COLUMNS = (
+    "l.id, l.nonce, l.action, l.result, l.approved, l.receipt, l.merkle_batch, l.merkle_index, l.status,"
+    " l.result_ref, b.codec, b.data, NULL AS segment"
+)
+_FIND = (
+    f"SELECT {_LIVE_COLUMNS} FROM execution_log l LEFT JOIN execution_blob b ON b.hash = l.result_ref"
+    " WHERE l.nonce = ?"
+    " UNION ALL SELECT id, nonce, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL, segment"
+    " FROM execution_archive WHERE nonce = ? LIMIT 1"
+)
+
+def _timestamp(value: datetime.datetime) -> str:
+    # The text format SQLAlchemy's SQLite DateTime type reads and writes.
+    return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+class SQLiteStore(ExecutionStore):
+    def __init__(self, path: str, pragmas: Optional[dict] = None):
+        self.path = path
+        self.pragmas = {**SQLITE_DEFAULTS, **(pragmas or {})}
+        self._local = threading.local()
+        # Every thread's connection, so close() can reach them all.
+        self._lock = threading.Lock()
+        self._conns: List[sqlite3.Connection] = []
+        self._generation = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.generation != self._generation:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                                   cached_statements=STATEMENT_CACHE_SIZE)
+            conn.execute(f"PRAGMA journal_mode={self.pragmas['journal_mode']}")
+            conn.execute(f"PRAGMA synchronous={self.pragmas['synchronous']}")
+            conn.execute(f"PRAGMA busy_timeout={int(self.pragmas['busy_timeout_ms'])}")
+            with self._lock:
+                self._conns.append(conn)
+                self._local.generation = self._generation
+            self._local.conn = conn
+        return conn
+
+    def close(self) -> None:
+        with self._lock:
+            conns, self._conns = self._conns, []
+            self._generation += 1
+        for conn in conns:
+            conn.close()
+
+    def _log(self, row) -> Optional[ExecutionLog]:
+        (exec_id, nonce, action, result, approved, receipt, merkle_batch, merkle_index, status,
+         result_ref, codec, data, segment) = row
+        if segment is not None:
+            return _read_segment(segment, exec_id)
+        if result is None and result_ref is not None:
+            result = cached_text(result_ref) or (decode_cached(result_ref, codec, data) if data is not None else None)
+        return ExecutionLog(
+            id=exec_id, nonce=nonce, action=action, result=result, approved=bool(approved), receipt=receipt,
+            merkle_batch=merkle_batch, merkle_index=merkle_index, status=status, result_ref=result_ref,
+        )
+
+    def find(self, nonce: str) -> Optional[ExecutionLog]:
+        row = self._conn().execute(_FIND, (nonce, nonce)).fetchone()
+        return self._log(row) if row is not None else None
+
+    def find_many(self, nonces: Iterable[str]) -> Dict[str, ExecutionLog]:
+        nonces = list(set(nonces))
+        found: Dict[str, ExecutionLog] = {}
+        conn = self._conn()
+        for start in range(0, len(nonces), IN_CHUNK):
+            chunk = nonces[start:start + IN_CHUNK]
+            marks = ", ".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT {_LIVE_COLUMNS} FROM execution_log l LEFT JOIN execution_blob b ON b.hash = l.result_ref"
+                f" WHERE l.nonce IN ({marks})"
+                f" UNION ALL SELECT id, nonce, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL, segment"
+                f" FROM execution_archive WHERE nonce IN ({marks})",
+                chunk + chunk,
+            )
+            for row in rows:
+                log = self._log(row)
+                if log is not None:
+                    found.setdefault(row[1], log)
+        return found
+
+    def _insert_row(self, conn: sqlite3.Connection, log: ExecutionLog) -> bool:
+        if log.timestamp is None:
+            log.timestamp = datetime.datetime.utcnow()
+        try:
+            return conn.execute(_INSERT, (
+                log.id, log.action, log.payload, log.result, log.nonce, int(bool(log.approved)),
+                _timestamp(log.timestamp), log.receipt, log.status, log.payload_ref, log.result_ref,
+            )).fetchone() is not None
+        except sqlite3.IntegrityError:
+            # Raised by the trigger guarding archived nonces.
+            return False
+
+    def insert(self, log: ExecutionLog) -> Optional[ExecutionLog]:
+        conn = self._conn()
+        blobs = pending_blobs(log)
+        if not blobs:
+            if self._insert_row(conn, log):
+                return None
+            return self.find(log.nonce)
+        return self.insert_many([log]).get(log.nonce)
+
+    def insert_many(self, logs: List[ExecutionLog]) -> Dict[str, ExecutionLog]:
+        conn = self._conn()
+        taken = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            blobs = {}
+            for log in logs:
+                blobs.update(pending_blobs(log))
+            if blobs:
+                conn.executemany(_INSERT_BLOB, list(blobs.values()))
+            for log in logs:
+                if not self._insert_row(conn, log):
+                    taken.append(log.nonce)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return {nonce: self.find(nonce) for nonce in taken}
+
+class MemoryStore(ExecutionStore):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows: Dict[str, ExecutionLog] = {}
+
+    def find(self, nonce: str) -> Optional[ExecutionLog]:
+        return self._rows.get(nonce)
+
+    def find_many(self, nonces: Iterable[str]) -> Dict[str, ExecutionLog]:
+        return {nonce: self._rows[nonce] for nonce in nonces if nonce in self._rows}
+
+    def insert(self, log: ExecutionLog) -> Optional[ExecutionLog]:
+        if log.result is None and log.result_ref is not None:
+            # Keep the text on the row; there is no blob table to resolve it from.
+            blob = pending_blobs(log)[log.result_ref]
+            log.result = decode(blob["codec"], blob["data"])
+        if log.timestamp is None:
+            log.timestamp = datetime.datetime.utcnow()
+        with self._lock:
+            existing = self._rows.get(log.nonce)
+            if existing is None:
+                self._rows[log.nonce] = log
+            return existing
+
+    def clear(self) -> None:
+        with self._lock:
+            self._rows.clear()
+
+_lock = threading.Lock()
+_stores: Dict[str, ExecutionStore] = {}
+
+def _sqlite_path(url: str) -> Optional[str]:
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or not parsed.database or parsed.database == ":memory:":
+        return None
+    return parsed.database
+
+def get_store_kind(durable: bool = False) -> str:
+    kind = os.getenv("OPENEXEC_STORE", "auto").lower()
+    if kind == "memory" and durable:
+        kind = "auto"
+    if kind == "auto":
+        return "sqlite" if _sqlite_path(DATABASE_URL) and not group_commit_enabled() else "sqlalchemy"
+    if kind not in ("sqlite", "sqlalchemy", "memory"):
+        raise ValueError(f"Unknown execution store: {kind}")
+    return kind
+
+def get_store(durable: bool = False) -> ExecutionStore:
+    """The configured store; ``durable`` callers never get the memory backend."""
+    kind = get_store_kind(durable)
+    store = _stores.get(kind)
+    if store is None:
+        with _lock:
+            store = _stores.get(kind)
+            if store is None:
+                if kind == "sqlite":
+                    path = _sqlite_path(DATABASE_URL)
+                    if path is None:
+                        raise ValueError("The sqlite execution store needs a file-backed SQLite database")
+                    store = SQLiteStore(path, _config.get("sqlite", {}))
+                elif kind == "memory":
+                    store = MemoryStore()
+                else:
+                    store = SqlAlchemyStore()
+                _stores[kind] = store
+    return store
+
+def reset_store() -> None:
+    with _lock:
+        stores = list(_stores.values())
+        _stores.clear()
+    for store in stores:
+        store.close()
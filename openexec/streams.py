@@ -0,0 +1,281 @@
+"""
+Streamed execution results.
+
+A handler registered as a generator (``def`` or ``async def`` with
+``yield``) produces its result as a sequence of dict chunks instead of one
+dict. ``/execute/stream`` sends each chunk to the client as an NDJSON line
+as soon as it is produced. Lines are buffered into execution_chunk rows of
+about ``OPENEXEC_STREAM_CHUNK_BYTES`` each, so memory stays bounded by one
+storage chunk however large the result grows.
+
+The streamed result text is the concatenation of its lines, each
+``json.dumps(chunk, sort_keys=True) + "\\n"``. Its receipt is the usual
+``sha256(exec_id:result)``, hashed incrementally as lines are produced.
+The response ends with one trailer line carrying the id, status, line
+count and receipt, which covers every line before it. The row is
+``streaming`` while the handler runs, then ``streamed``. If the handler
+raises or the client goes away it is ``failed`` instead: its stored lines
+are dropped and it gets an error result and receipt, as a failed queued
+execution does. ``execute_stream`` also returns a ``close`` callback that
+fails a stream which never finished, for the response to run once it is
+done, so a client that leaves before the first line does not leave the
+row ``streaming``.
+
+Replaying a streamed nonce re-sends the stored lines and trailer, with the
+Merkle proof once the receipt has been sealed.
+"""
+
+import os
+import uuid
+import json
+import hashlib
+import inspect
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Iterator, List, Optional, Tuple
+from openexec.blobs import pack
+from openexec.db import SessionLocal
+from openexec.engine import ExecutionPending, _authorize, _count, _count_error
+from openexec.executor import get_executor, run_engine, run_handler
+from openexec.metrics import timed
+from openexec.models import ExecutionRequest
+from openexec.receipts import get_proof, make_receipt, note_execution
+from openexec.replay import get_replay_index
+from openexec.shards import require_primary
+from openexec.store import get_store
+from openexec.tables import ExecutionChunk, ExecutionLog, PENDING_STATUSES
+
+DEFAULT_CHUNK_BYTES = 1 << 20
+READ_CHUNKS = 4
+
+STREAMING = "streaming"
+STREAMED = "streamed"
+
+_DONE = object()
+
+def get_chunk_bytes() -> int:
+    return int(os.getenv("OPENEXEC_STREAM_CHUNK_BYTES", DEFAULT_CHUNK_BYTES))
+
+def encode_line(chunk: dict) -> str:
+    if not isinstance(chunk, dict):
+        raise TypeError(f"Streamed chunks must be dicts, not {type(chunk).__name__}")
+    return json.dumps(chunk, sort_keys=True) + "\n"
+
+class _Recorder:
+    """Hashes lines as they are produced and writes them out in chunks."""
+
+    def __init__(self, exec_id: str, chunk_bytes: int):
+        self.exec_id = exec_id
+        self.chunk_bytes = chunk_bytes
+        self.digest = hashlib.sha256(f"{exec_id}:".encode())
+        self.buffer: List[str] = []
+        self.buffered = 0
+        self.seq = 0
+        self.lines = 0
+        self.done = False
+        self._lock = threading.Lock()
+
+    def add(self, line: str) -> bool:
+        """Take one line; return True once the buffer should be flushed."""
+        self.digest.update(line.encode())
+        self.buffer.append(line)
+        self.buffered += len(line)
+        self.lines += 1
+        return self.buffered >= self.chunk_bytes
+
+    def flush(self) -> None:
+        if not self.buffer:
+            return
+        db = SessionLocal()
+        try:
+            db.add(ExecutionChunk(exec_id=self.exec_id, seq=self.seq, data="".join(self.buffer)))
+            db.commit()
+        finally:
+            db.close()
+        self.seq += 1
+        self.buffer.clear()
+        self.buffered = 0
+
+    def _settle(self) -> bool:
+        with self._lock:
+            if self.done:
+                return False
+            self.done = True
+            return True
+
+    def finish(self) -> str:
+        self.flush()
+        receipt = self.digest.hexdigest()
+        if not self._settle():
+            raise RuntimeError("Stream was closed before the handler finished")
+        _set_outcome(self.exec_id, STREAMED, receipt=receipt)
+        return receipt
+
+    def fail(self, error: str) -> bool:
+        """Fail the execution unless it already has an outcome; True if this call did."""
+        if not self._settle():
+            return False
+        result_json = json.dumps({"error": error}, sort_keys=True)
+        _set_outcome(self.exec_id, "failed", result=result_json, receipt=make_receipt(self.exec_id, result_json))
+        return True
+
+def _set_outcome(exec_id: str, status: str, receipt: str, result: Optional[str] = None) -> None:
+    db = SessionLocal()
+    try:
+        if status == "failed":
+            # The receipt covers the error, not a partial stream.
+            db.query(ExecutionChunk).filter(ExecutionChunk.exec_id == exec_id).delete(synchronize_session=False)
+        db.query(ExecutionLog).filter(ExecutionLog.id == exec_id).update(
+            {ExecutionLog.status: status, ExecutionLog.receipt: receipt, ExecutionLog.result: result},
+            synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
+    note_execution()
+
+def read_lines(db, exec_id: str) -> Iterator[str]:
+    """The stored text of a streamed result, one storage chunk at a time."""
+    query = (
+        db.query(ExecutionChunk.data)
+        .filter(ExecutionChunk.exec_id == exec_id)
+        .order_by(ExecutionChunk.seq)
+        .execution_options(stream_results=True)
+    )
+    for (data,) in query.yield_per(READ_CHUNKS):
+        yield data
+
+def stream_receipt(db, exec_id: str) -> str:
+    """Recompute a streamed result's receipt from its stored chunks."""
+    digest = hashlib.sha256(f"{exec_id}:".encode())
+    for data in read_lines(db, exec_id):
+        digest.update(data.encode())
+    return digest.hexdigest()
+
+def _trailer(log: ExecutionLog, lines: Optional[int] = None) -> str:
+    trailer = {"id": log.id, "action": log.action, "approved": bool(log.approved), "status": log.status,
+               "receipt": log.receipt, "proof": get_proof(log.merkle_batch, log.merkle_index)}
+    if lines is not None:
+        trailer["lines"] = lines
+    if log.status == "failed" and log.result:
+        trailer["error"] = json.loads(log.result).get("error")
+    return json.dumps(trailer) + "\n"
+
+def _replay(log: ExecutionLog) -> Iterator[bytes]:
+    if log.status in PENDING_STATUSES:
+        raise ExecutionPending(log.id, log.status)
+    if log.status not in (STREAMED, "failed"):
+        raise ValueError(f"Nonce was used by execution {log.id}, which did not stream its result")
+
+    def lines() -> Iterator[bytes]:
+        if log.status == STREAMED:
+            count = 0
+            db = SessionLocal()
+            try:
+                for data in read_lines(db, log.id):
+                    count += data.count("\n")
+                    yield data.encode()
+            finally:
+                db.close()
+            yield _trailer(log, count).encode()
+        else:
+            yield _trailer(log).encode()
+
+    return lines()
+
+async def _chunks(handler: Callable, payload: dict) -> AsyncIterator[dict]:
+    if inspect.isasyncgenfunction(handler):
+        async for chunk in handler(payload):
+            yield chunk
+        return
+    # Sync generators are advanced one chunk at a time on the handler pool.
+    generator = handler(payload)
+    try:
+        while True:
+            chunk = await run_handler(next, generator, _DONE)
+            if chunk is _DONE:
+                return
+            yield chunk
+    finally:
+        generator.close()
+
+def _abandon(request: ExecutionRequest, recorder: _Recorder) -> None:
+    if recorder.fail("Stream closed before the handler finished"):
+        _count(request, "error", "disconnected")
+
+async def _run(request: ExecutionRequest, recorder: _Recorder, handler: Callable, payload: dict,
+               approved: bool) -> AsyncIterator[bytes]:
+    exec_id = recorder.exec_id
+    try:
+        with timed("handler", request.action):
+            async for chunk in _chunks(handler, payload):
+                line = encode_line(chunk)
+                if recorder.add(line):
+                    await run_engine(recorder.flush)
+                yield line.encode()
+        with timed("commit", request.action):
+            receipt = await run_engine(recorder.finish)
+        _count(request, "approved")
+        trailer = {"id": exec_id, "action": request.action, "approved": approved, "status": STREAMED,
+                   "receipt": receipt, "proof": None, "lines": recorder.lines}
+        yield (json.dumps(trailer) + "\n").encode()
+    except Exception as e:
+        await run_engine(recorder.fail, str(e))
+        _count_error(request, e)
+        yield (json.dumps({"id": exec_id, "action": request.action, "approved": approved,
+                           "status": "failed", "error": str(e)}) + "\n").encode()
+    finally:
+        if not recorder.done:
+            # The client went away mid-stream and the generator is being
+            # closed, possibly cancelled: hand the write off without awaiting.
+            get_executor("engine").submit(_abandon, request, recorder)
+
+def _begin(request: ExecutionRequest) -> Tuple[Optional[ExecutionLog], str, Callable, dict, bool]:
+    handler, payload, payload_json, approved = _authorize(request, streaming=True)
+    exec_id = str(uuid.uuid4())
+    log = ExecutionLog(id=exec_id, action=request.action, payload=payload_json, nonce=request.nonce,
+                       approved=approved, status=STREAMING)
+    pack(log)
+    existing = get_store(durable=True).insert(log)
+    if existing is None:
+        index = get_replay_index()
+        if index is not None:
+            index.warm(request.nonce)
+    return existing, exec_id, handler, payload, approved
+
+async def execute_stream(request: ExecutionRequest) -> Tuple[str, object, Optional[Callable[[], Awaitable[None]]]]:
+    """Start a streamed execution; return its id, an iterator of NDJSON bytes
+    and, for a new execution, a callback to await once the response is over.
+
+    Authorization, replay and pending errors are raised here, before any
+    byte is sent. Errors from the handler end the stream with a failed
+    trailer instead. The callback fails the execution if the stream did not
+    finish, including when it was never iterated at all.
+    """
+    try:
+        require_primary(request, "/execute/stream")
+    except ValueError as e:
+        _count_error(request, e)
+        raise
+    store = get_store(durable=True)
+    existing = await run_engine(store.find, request.nonce)
+    if existing is None:
+        try:
+            existing, exec_id, handler, payload, approved = await run_engine(_begin, request)
+        except Exception as e:
+            _count_error(request, e)
+            raise
+        if existing is None:
+            recorder = _Recorder(exec_id, get_chunk_bytes())
+
+            async def close() -> None:
+                if not recorder.done:
+                    await run_engine(_abandon, request, recorder)
+
+            return exec_id, _run(request, recorder, handler, payload, approved), close
+    try:
+        lines = _replay(existing)
+    except Exception as e:
+        _count_error(request, e)
+        raise
+    _count(request, "replayed")
+    return existing.id, lines, None
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Text, Boolean
+from sqlalchemy import Column, String, DateTime, Text, Boolean, Integer, Index, LargeBinary
 from openexec.db import Base
 import datetime
 
@@ -11,4 +11,69 @@ class ExecutionLog(Base):
     result = Column(Text, nullable=True)
     nonce = Column(String, unique=True, nullable=False)
     approved = Column(Boolean, default=False)
-    timestamp = Column(DateTime, default=datetime.datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    receipt = Column(String, nullable=True)
+    merkle_batch = Column(Integer, nullable=True, index=True)
+    merkle_index = Column(Integer, nullable=True)
+    # NULL for executions run inline; queued / running / completed / failed
+    # for executions submitted to the durable queue; streaming / streamed /
+    # failed for streamed results, whose text lives in execution_chunk.
+    status = Column(String, nullable=True)
+    # sha256 of the payload / result text when it is stored in execution_blob.
+    payload_ref = Column(String, nullable=True)
+    result_ref = Column(String, nullable=True)
+
+    # Keyset pagination over (timestamp, id), optionally narrowed by action or approval.
+    __table_args__ = (
+        Index("ix_execution_log_timestamp_id", "timestamp", "id"),
+        Index("ix_execution_log_action_timestamp_id", "action", "timestamp", "id"),
+        Index("ix_execution_log_approved_timestamp_id", "approved", "timestamp", "id"),
+        Index("ix_execution_log_status_timestamp", "status", "timestamp"),
+    )
+
+PENDING_STATUSES = ("queued", "running", "streaming")
+
+class ExecutionBlob(Base):
+    __tablename__ = "execution_blob"
+
+    hash = Column(String, primary_key=True)
+    codec = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+
+class ExecutionChunk(Base):
+    __tablename__ = "execution_chunk"
+
+    exec_id = Column(String, primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    data = Column(Text, nullable=False)
+
+class ArchivedExecution(Base):
+    __tablename__ = "execution_archive"
+
+    nonce = Column(String, primary_key=True)
+    id = Column(String, unique=True, nullable=False)
+    segment = Column(String, nullable=False)
+    timestamp = Column(DateTime, nullable=True)
+    receipt = Column(String, nullable=True)
+    merkle_batch = Column(Integer, nullable=True, index=True)
+    merkle_index = Column(Integer, nullable=True)
+
+class ReceiptRoot(Base):
+    __tablename__ = "receipt_root"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    root = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+# SQLite cannot express uniqueness across two tables, so a trigger makes an
+# insert of an archived nonce fail with the same IntegrityError as a live one.
+SQLITE_ARCHIVED_NONCE_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS execution_log_archived_nonce
+BEFORE INSERT ON execution_log
+WHEN EXISTS (SELECT 1 FROM execution_archive WHERE nonce = NEW.nonce)
+BEGIN
+    SELECT RAISE(ABORT, 'UNIQUE constraint failed: execution_archive.nonce');
+END
+"""
@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# Run the suite against a throwaway database instead of ./openexec.db.
+_tmpdir = tempfile.mkdtemp(prefix="openexec-test-")
+os.environ.setdefault("OPENEXEC_DB_URL", f"sqlite:///{_tmpdir}/openexec.db")
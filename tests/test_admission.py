@@ -0,0 +1,72 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from openexec.admission import AdmissionController, AdmissionRejected, reset_admission
+from openexec.db import init_db
+
+init_db()
+
+client = TestClient(app)
+
+@pytest.fixture
+def limits(monkeypatch):
+    def configure(**env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        monkeypatch.setenv("OPENEXEC_RESPONSE_CACHE_SIZE", "0")
+        reset_admission()
+    yield configure
+    monkeypatch.undo()
+    reset_admission()
+
+def _execute(nonce=None, artifact=None):
+    body = {"action": "echo", "payload": {}, "nonce": nonce or f"adm-{uuid.uuid4().hex}"}
+    if artifact:
+        body["approval_artifact"] = artifact
+    return client.post("/execute", json=body)
+
+def _artifact(tenant):
+    return {"approval_id": "a", "tenant_id": tenant, "action_hash": "0" * 64, "issued_at": "2020-01-01T00:00:00+00:00",
+            "expires_at": "2020-01-01T00:00:00+00:00", "signature": ""}
+
+def test_tenant_burst_is_shed_with_429(limits):
+    limits(OPENEXEC_TENANT_RATE="0.001", OPENEXEC_TENANT_BURST="3")
+    assert [_execute().status_code for _ in range(3)] == [200, 200, 200]
+    shed = _execute()
+    assert shed.status_code == 429
+    assert int(shed.headers["retry-after"]) >= 1
+
+    health = client.get("/health").json()["admission"]
+    assert health["rate_limited"] == 1
+    assert health["tenants"]["mode:demo"]["rejected"] == 1
+
+def test_rate_limit_runs_before_signature_verification(limits, monkeypatch):
+    limits(OPENEXEC_TENANT_LIMITS='{"noisy": {"rate": 0.001, "burst": 1}}')
+    monkeypatch.setenv("OPENEXEC_MODE", "clawshield")
+    # The artifact is invalid, so an admitted request fails verification (403);
+    # a shed one never gets that far.
+    assert _execute(artifact=_artifact("noisy")).status_code == 403
+    assert _execute(artifact=_artifact("noisy")).status_code == 429
+    assert _execute(artifact=_artifact("quiet")).status_code == 403
+
+def test_batch_items_are_charged_per_tenant(limits):
+    limits(OPENEXEC_TENANT_RATE="0.001", OPENEXEC_TENANT_BURST="2")
+    items = [{"action": "echo", "payload": {"i": i}, "nonce": f"adm-{uuid.uuid4().hex}"} for i in range(3)]
+    results = client.post("/execute/batch", json=items).json()["results"]
+    assert [r["status_code"] for r in results] == [200, 200, 429]
+
+def test_global_in_flight_cap():
+    controller = AdmissionController(max_in_flight=1)
+    with controller.admit("a"):
+        with pytest.raises(AdmissionRejected) as rejected:
+            with controller.admit("b"):
+                pass
+        assert rejected.value.reason == "overloaded"
+    with controller.admit("b"):
+        assert controller.stats()["in_flight"] == 1
+    assert controller.stats()["overloaded"] == 1
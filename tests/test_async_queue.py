@@ -0,0 +1,157 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import uuid
+import threading
+from fastapi.testclient import TestClient
+from main import app
+from openexec import jobs
+from openexec.db import SessionLocal, init_db
+from openexec.receipts import verify_receipt
+from openexec.registry import get_bulkhead, register_action, unregister_action
+from openexec.tables import ExecutionLog
+
+init_db()
+
+client = TestClient(app)
+
+def _submit(action="echo", payload=None, nonce=None):
+    body = {"action": action, "payload": payload or {"n": 1}, "nonce": nonce or f"async-{uuid.uuid4().hex}"}
+    return client.post("/execute/async", json=body)
+
+def test_submit_returns_202_and_completes_when_drained():
+    resp = _submit(payload={"msg": "later"})
+    assert resp.status_code == 202
+    exec_id = resp.json()["id"]
+    assert resp.json()["status"] == "queued"
+    assert resp.headers["location"] == f"/executions/{exec_id}"
+    assert client.get(f"/executions/{exec_id}").json()["status"] == "queued"
+
+    assert jobs.drain() >= 1
+
+    status = client.get(f"/executions/{exec_id}").json()
+    assert status["status"] == "completed"
+    assert status["result"] == {"echo": {"msg": "later"}}
+    assert verify_receipt(exec_id, '{"echo": {"msg": "later"}}', status["receipt"])
+
+def test_nonce_is_reserved_at_submit():
+    nonce = f"async-{uuid.uuid4().hex}"
+    first = _submit(nonce=nonce).json()
+    again = _submit(nonce=nonce)
+    assert again.status_code == 202
+    assert again.json()["id"] == first["id"]
+
+    sync = client.post("/execute", json={"action": "echo", "payload": {"n": 1}, "nonce": nonce})
+    assert sync.status_code == 409
+    assert sync.headers["location"] == f"/executions/{first['id']}"
+
+    jobs.drain()
+    done = _submit(nonce=nonce)
+    assert done.status_code == 200
+    assert done.json() == {"id": first["id"], "status": "completed"}
+    assert client.post("/execute", json={"action": "echo", "payload": {"n": 1}, "nonce": nonce}).json()["id"] == first["id"]
+
+def test_rejected_submission_does_not_reserve_nonce():
+    nonce = f"async-{uuid.uuid4().hex}"
+    assert _submit(action="no_such_action", nonce=nonce).status_code == 400
+    assert _submit(nonce=nonce).status_code == 202
+    jobs.drain()
+
+def test_handler_failure_is_recorded():
+    calls = []
+
+    def explode(payload):
+        calls.append(payload)
+        raise RuntimeError("boom")
+
+    register_action("explode_async", explode)
+    try:
+        exec_id = _submit(action="explode_async").json()["id"]
+        jobs.drain()
+        jobs.drain()
+    finally:
+        unregister_action("explode_async")
+    status = client.get(f"/executions/{exec_id}").json()
+    assert status["status"] == "failed"
+    assert status["result"] == {"error": "boom"}
+    assert len(calls) == 1
+
+def test_interrupted_execution_is_failed_not_rerun():
+    exec_id = _submit().json()["id"]
+    db = SessionLocal()
+    try:
+        db.query(ExecutionLog).filter_by(id=exec_id).update({"status": "running"})
+        db.commit()
+    finally:
+        db.close()
+
+    assert jobs.recover() >= 1
+    assert jobs.drain() == 0
+    assert client.get(f"/executions/{exec_id}").json()["status"] == "failed"
+
+def test_job_without_capacity_is_requeued_not_failed():
+    register_action("busy_async", lambda payload: {"ok": True}, max_concurrency=1)
+    bulkhead = get_bulkhead("busy_async")
+    try:
+        assert bulkhead._enter(object())
+        exec_id = _submit(action="busy_async").json()["id"]
+        jobs.drain()
+        assert client.get(f"/executions/{exec_id}").json()["status"] == "queued"
+
+        bulkhead.release()
+        assert jobs.drain() >= 1
+        status = client.get(f"/executions/{exec_id}").json()
+        assert status["status"] == "completed" and status["result"] == {"ok": True}
+    finally:
+        unregister_action("busy_async")
+
+def test_workers_leave_running_rows_alone_unless_recovery_is_on():
+    exec_id = _submit().json()["id"]
+    db = SessionLocal()
+    try:
+        db.query(ExecutionLog).filter_by(id=exec_id).update({"status": "running"})
+        db.commit()
+    finally:
+        db.close()
+
+    os.environ["OPENEXEC_QUEUE_WORKERS"] = "0"
+    try:
+        jobs.start_workers()
+        assert client.get(f"/executions/{exec_id}").json()["status"] == "running"
+        os.environ["OPENEXEC_QUEUE_RECOVER"] = "1"
+        jobs.start_workers()
+        assert client.get(f"/executions/{exec_id}").json()["status"] == "failed"
+    finally:
+        del os.environ["OPENEXEC_QUEUE_WORKERS"]
+        os.environ.pop("OPENEXEC_QUEUE_RECOVER", None)
+
+def test_workers_drain_each_execution_once():
+    runs = []
+    lock = threading.Lock()
+
+    def count(payload):
+        with lock:
+            runs.append(payload["i"])
+        return {"i": payload["i"]}
+
+    register_action("count_async", count)
+    os.environ["OPENEXEC_QUEUE_WORKERS"] = "4"
+    os.environ["OPENEXEC_QUEUE_POLL"] = "0.05"
+    jobs.start_workers()
+    try:
+        ids = [_submit(action="count_async", payload={"i": i}).json()["id"] for i in range(20)]
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            if all(client.get(f"/executions/{i}").json()["status"] == "completed" for i in ids):
+                break
+            time.sleep(0.05)
+    finally:
+        jobs.stop_workers()
+        unregister_action("count_async")
+        del os.environ["OPENEXEC_QUEUE_WORKERS"], os.environ["OPENEXEC_QUEUE_POLL"]
+    assert sorted(runs) == list(range(20))
+
+def test_unknown_execution_is_404():
+    assert client.get(f"/executions/{uuid.uuid4()}").status_code == 404
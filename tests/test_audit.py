@@ -0,0 +1,66 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import uuid
+import tempfile
+from fastapi.testclient import TestClient
+from main import app
+from openexec.audit import audit
+from openexec.db import init_db, SessionLocal
+from openexec.receipts import seal_pending
+from openexec.tables import ExecutionLog
+
+init_db()
+
+client = TestClient(app)
+
+def _seed(count):
+    while seal_pending():
+        pass
+    ids = [client.post("/execute", json={"action": "echo", "payload": {"i": i}, "nonce": f"audit-{uuid.uuid4().hex}"}).json()["id"]
+           for i in range(count)]
+    while seal_pending():
+        pass
+    return ids
+
+def test_audit_detects_tampered_results_and_lost_rows():
+    ids = _seed(6)
+    clean = audit(restart=True, chunk_size=4)
+    assert clean["complete"]
+    assert clean["rows"] >= 6
+    assert not set(ids) & set(clean["mismatched_ids"])
+
+    db = SessionLocal()
+    try:
+        db.query(ExecutionLog).filter_by(id=ids[1]).update({"result": json.dumps({"echo": {"i": 99}})})
+        (batch,) = db.query(ExecutionLog.merkle_batch).filter_by(id=ids[2]).one()
+        db.query(ExecutionLog).filter_by(id=ids[2]).delete()
+        db.commit()
+    finally:
+        db.close()
+
+    report = audit(restart=True, chunk_size=4)
+    assert ids[1] in report["mismatched_ids"]
+    assert {"batch": batch, "error": "missing_rows", "expected": 6, "found": 5} in report["batch_failures"]
+    assert not report["ok"]
+
+def test_audit_resumes_from_checkpoint():
+    _seed(10)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "audit.json")
+        partial = audit(path, max_seconds=1e-9, restart=True, chunk_size=2)
+        assert not partial["complete"]
+        with open(path) as f:
+            state = json.load(f)
+        assert state["after"] and not state["complete"]
+
+        finished = audit(path, chunk_size=2)
+        assert finished["complete"]
+        assert finished["rows"] > partial["rows"]
+
+        _seed(3)
+        incremental = audit(path, chunk_size=2)
+        assert incremental["complete"]
+        assert incremental["rows"] == 3
@@ -0,0 +1,94 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import uuid
+import datetime
+import tempfile
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from openexec.audit import audit
+from openexec.blobs import blob_hash
+from openexec.db import init_db, SessionLocal
+from openexec.retention import compact, find_archived
+from openexec.tables import ExecutionBlob, ExecutionLog
+
+init_db()
+
+client = TestClient(app)
+
+@pytest.fixture(params=["zlib", "lzma"])
+def codec(request, monkeypatch):
+    monkeypatch.setenv("OPENEXEC_BLOB_CODEC", request.param)
+    monkeypatch.setenv("OPENEXEC_RESPONSE_CACHE_SIZE", "0")
+    return request.param
+
+def _execute(payload, nonce=None):
+    return client.post("/execute", json={"action": "echo", "payload": payload, "nonce": nonce or f"blob-{uuid.uuid4().hex}"})
+
+def test_repeated_payloads_are_stored_once(codec):
+    template = {"template": "x" * 20000, "marker": uuid.uuid4().hex}
+    first = _execute(template).json()
+    second = _execute(template).json()
+    small = _execute({"n": 1}).json()
+
+    payload_ref = blob_hash(json.dumps(template, sort_keys=True, separators=(",", ":")))
+    db = SessionLocal()
+    try:
+        rows = {r.id: r for r in db.query(ExecutionLog).filter(ExecutionLog.id.in_([first["id"], second["id"], small["id"]]))}
+        blob = db.get(ExecutionBlob, payload_ref)
+        assert blob.codec == codec
+        assert len(blob.data) < blob.size / 10
+        for exec_id in (first["id"], second["id"]):
+            assert rows[exec_id].payload is None and rows[exec_id].payload_ref == payload_ref
+            assert rows[exec_id].result is None and rows[exec_id].result_ref is not None
+        assert rows[first["id"]].result_ref == rows[second["id"]].result_ref
+        assert rows[small["id"]].payload == '{"n":1}' and rows[small["id"]].payload_ref is None
+        assert db.query(ExecutionBlob).filter_by(hash=payload_ref).count() == 1
+    finally:
+        db.close()
+
+def test_reads_resolve_blobs_transparently(codec):
+    payload = {"config": "y" * 5000, "marker": uuid.uuid4().hex}
+    nonce = f"blob-{uuid.uuid4().hex}"
+    executed = _execute(payload, nonce).json()
+
+    replay = _execute(payload, nonce).json()
+    assert replay["id"] == executed["id"]
+    assert replay["result"] == {"echo": payload}
+    assert client.get(f"/executions/{executed['id']}").json()["result"] == {"echo": payload}
+
+    since = (datetime.datetime.utcnow() - datetime.timedelta(seconds=5)).isoformat()
+    lines = [json.loads(line) for line in client.get("/executions/export", params={"since": since}).iter_lines() if line]
+    exported = next(line for line in lines if line["id"] == executed["id"])
+    assert exported["payload"] == payload and exported["result"] == {"echo": payload}
+
+    report = audit(restart=True)
+    assert executed["id"] not in report["mismatched_ids"]
+    assert executed["id"] not in report["missing_result_ids"]
+
+def test_compaction_inlines_bodies_and_collects_unreferenced_blobs(codec):
+    payload = {"doc": "z" * 5000, "marker": uuid.uuid4().hex}
+    executed = _execute(payload).json()
+    payload_ref = blob_hash(json.dumps(payload, sort_keys=True, separators=(",", ":")))
+
+    db = SessionLocal()
+    try:
+        stamp = datetime.datetime.utcnow() - datetime.timedelta(days=400)
+        db.query(ExecutionLog).filter_by(id=executed["id"]).update({ExecutionLog.timestamp: stamp})
+        db.commit()
+    finally:
+        db.close()
+
+    with tempfile.TemporaryDirectory() as archive_dir:
+        compact(retention_days=365, archive_dir=archive_dir)
+        db = SessionLocal()
+        try:
+            archived = find_archived(db, exec_id=executed["id"])
+            assert json.loads(archived.payload) == payload
+            assert json.loads(archived.result) == {"echo": payload}
+            assert db.get(ExecutionBlob, payload_ref) is None
+        finally:
+            db.close()
@@ -0,0 +1,109 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import uuid
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from openexec.db import init_db
+from openexec.bulkhead import Bulkhead, BulkheadFull
+from openexec.registry import register_action, unregister_action, get_bulkhead
+
+init_db()
+
+client = TestClient(app)
+
+def test_queue_cap_rejects_fast():
+    bulkhead = Bulkhead("test_queue", max_concurrency=1, max_queue=1)
+
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def handler(payload):
+            await gate.wait()
+            return payload
+
+        first = asyncio.ensure_future(bulkhead.call_async(handler, {"n": 1}))
+        second = asyncio.ensure_future(bulkhead.call_async(handler, {"n": 2}))
+        await asyncio.sleep(0.01)
+        assert bulkhead.stats()["in_flight"] == 1
+        assert bulkhead.stats()["queued"] == 1
+        with pytest.raises(BulkheadFull):
+            await bulkhead.call_async(handler, {"n": 3})
+        gate.set()
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(scenario()) == [{"n": 1}, {"n": 2}]
+    stats = bulkhead.stats()
+    assert (stats["in_flight"], stats["queued"], stats["rejected"]) == (0, 0, 1)
+
+def test_overloaded_action_returns_503():
+    register_action("test_bulkhead_busy", lambda payload: payload, max_concurrency=1)
+    bulkhead = get_bulkhead("test_bulkhead_busy")
+    try:
+        assert bulkhead._enter(object())
+        resp = client.post("/execute", json={"action": "test_bulkhead_busy", "payload": {}, "nonce": uuid.uuid4().hex})
+        assert resp.status_code == 503
+        assert resp.headers["retry-after"] == "1"
+        assert client.get("/health").json()["bulkheads"]["test_bulkhead_busy"]["in_flight"] == 1
+
+        # Cheap actions are not affected by the saturated one.
+        echo = client.post("/execute", json={"action": "echo", "payload": {}, "nonce": uuid.uuid4().hex})
+        assert echo.status_code == 200
+        bulkhead.release()
+        resp = client.post("/execute", json={"action": "test_bulkhead_busy", "payload": {"ok": 1}, "nonce": uuid.uuid4().hex})
+        assert resp.status_code == 200
+    finally:
+        unregister_action("test_bulkhead_busy")
+
+def test_timeout_returns_504_and_keeps_slot_until_handler_returns():
+    calls = []
+
+    def slow(payload):
+        calls.append(payload)
+        time.sleep(0.3)
+        return {"late": payload["n"]}
+
+    register_action("test_bulkhead_slow", slow, max_concurrency=2, timeout=0.05)
+    bulkhead = get_bulkhead("test_bulkhead_slow")
+    try:
+        nonce = uuid.uuid4().hex
+        resp = client.post("/execute", json={"action": "test_bulkhead_slow", "payload": {"n": 1}, "nonce": nonce})
+        assert resp.status_code == 504
+        assert bulkhead.stats()["timed_out"] == 1
+        assert bulkhead.stats()["in_flight"] == 1
+
+        # The handler is still running: a retry must not execute it again.
+        retry = client.post("/execute", json={"action": "test_bulkhead_slow", "payload": {"n": 1}, "nonce": nonce})
+        assert retry.status_code == 409
+        deadline = time.monotonic() + 2
+        while bulkhead.stats()["in_flight"]:
+            assert time.monotonic() < deadline
+            time.sleep(0.02)
+
+        # Once it returns, its late result is recorded under the nonce.
+        while True:
+            retry = client.post("/execute", json={"action": "test_bulkhead_slow", "payload": {"n": 1}, "nonce": nonce})
+            if retry.status_code != 409:
+                break
+            assert time.monotonic() < deadline
+            time.sleep(0.02)
+        assert retry.status_code == 200 and retry.json()["result"] == {"late": 1}
+        assert len(calls) == 1
+    finally:
+        unregister_action("test_bulkhead_slow")
+
+def test_sync_path_honours_bulkhead():
+    from openexec.engine import execute
+    from openexec.models import ExecutionRequest
+
+    register_action("test_bulkhead_sync", lambda payload: {"v": payload["v"]}, max_concurrency=1, timeout=1)
+    try:
+        result = execute(ExecutionRequest(action="test_bulkhead_sync", payload={"v": 7}, nonce=uuid.uuid4().hex))
+        assert result.result == {"v": 7}
+        assert get_bulkhead("test_bulkhead_sync").stats()["in_flight"] == 0
+    finally:
+        unregister_action("test_bulkhead_sync")
@@ -0,0 +1,47 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import json
+import uuid
+import subprocess
+from openexec.__main__ import run
+from openexec.db import init_db
+
+init_db()
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _line(action="echo", payload=None, nonce=None):
+    return json.dumps({"action": action, "payload": payload or {}, "nonce": nonce or f"cli-{uuid.uuid4().hex}"})
+
+def test_results_stream_in_input_order():
+    nonce = f"cli-{uuid.uuid4().hex}"
+    lines = [_line(payload={"i": i}) for i in range(10)]
+    lines += ["", "not json", _line(action="no_such_action"), _line(payload={"x": 1}, nonce=nonce),
+              _line(payload={"x": 1}, nonce=nonce)]
+    out = io.StringIO()
+
+    failures = run(lines, out, parallel=3)
+
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r["index"] for r in results] == list(range(14))
+    assert [r["result"]["result"] for r in results[:10]] == [{"echo": {"i": i}} for i in range(10)]
+    assert results[10]["type"] == "ValidationError"
+    assert "Unknown action" in results[11]["error"]
+    assert results[12]["result"]["id"] == results[13]["result"]["id"]
+    assert failures == 2
+
+def test_cold_start_defers_heavy_imports():
+    code = (
+        "import sys, openexec.__main__ as cli; cli._parse_args([]);"
+        "heavy = [m for m in ('sqlalchemy', 'pydantic', 'cryptography', 'fastapi') if m in sys.modules];"
+        "import openexec.engine;"
+        "heavy.append('cryptography' in sys.modules);"
+        "print(heavy)"
+    )
+    env = {k: v for k, v in os.environ.items() if not k.startswith("CLAWSHIELD_")}
+    env["OPENEXEC_MODE"] = "demo"
+    out = subprocess.check_output([sys.executable, "-c", code], cwd=ROOT, env=env, text=True)
+    assert out.strip() == "[False]"
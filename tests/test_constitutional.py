@@ -5,11 +5,12 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import unittest
 import datetime
 import base64
+import json
 from unittest.mock import patch
 from fastapi.testclient import TestClient
 from main import app
 from openexec.db import init_db
-from openexec.crypto import canonical_hash, verify_ed25519_signature
+from openexec.crypto import action_request_hash, canonical_hash, canonical_json, verify_ed25519_signature
 from openexec.clawshield_client import generate_test_keypair, mint_approval_artifact
 
 TEST_TENANT = "tenant-001"
@@ -31,6 +32,11 @@ class TestCrypto(unittest.TestCase):
         h2 = canonical_hash({"a": 1, "b": 2})
         self.assertEqual(h1, h2)
 
+    def test_action_request_hash_matches_canonical_hash(self):
+        for action, payload in [("echo", {}), ("add", {"b": 2, "a": [1, {"z": None}]}), ("é\"x", {"k": "naïve ✓"})]:
+            expected = canonical_hash({"action": action, "payload": payload})
+            self.assertEqual(action_request_hash(action, canonical_json(payload)), expected)
+
     def test_ed25519_sign_and_verify(self):
         message = b"test-message"
         signature = PRIVATE_KEY.sign(message)
@@ -170,6 +176,222 @@ class TestConstitutionalExecution(unittest.TestCase):
         self.assertEqual(resp.status_code, 403)
         self.assertIn("expired", resp.json()["detail"])
 
+ROTATED_PRIVATE_KEY, ROTATED_PUBLIC_KEY_PEM = generate_test_keypair()
+
+class TestKeyring(unittest.TestCase):
+    def test_keyring_parses_keys_once(self):
+        from openexec.keyring import build_keyring
+        keyring = build_keyring(PUBLIC_KEY_PEM, json.dumps({"k2": ROTATED_PUBLIC_KEY_PEM}))
+        self.assertEqual(sorted(keyring.key_ids()), ["default", "k2"])
+        self.assertIs(keyring.get("default"), build_keyring(PUBLIC_KEY_PEM).get("default"))
+
+    def test_malformed_keys_rejected(self):
+        from openexec.keyring import build_keyring, KeyringError
+        with self.assertRaises(KeyringError):
+            build_keyring(PUBLIC_KEY_PEM, "{not json")
+        with self.assertRaises(KeyringError):
+            build_keyring(PUBLIC_KEY_PEM, json.dumps({"bad": "not-a-pem"}))
+
+    def test_malformed_reload_keeps_previous_keys(self):
+        from openexec.keyring import get_keyring
+        with patch.dict(os.environ, {"CLAWSHIELD_PUBLIC_KEY": PUBLIC_KEY_PEM}):
+            first = get_keyring()
+            with patch.dict(os.environ, {"CLAWSHIELD_PUBLIC_KEYS": "{not json"}):
+                self.assertIs(get_keyring(), first)
+
+    def test_key_file_rotation_without_restart(self):
+        import tempfile
+        from openexec.keyring import get_keyring
+        fd, path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"k1": PUBLIC_KEY_PEM}, f)
+        env = {"CLAWSHIELD_PUBLIC_KEYS_FILE": path, "OPENEXEC_KEYRING_CHECK_INTERVAL": "0"}
+        with patch.dict(os.environ, env):
+            os.environ.pop("CLAWSHIELD_PUBLIC_KEY", None)
+            self.assertEqual(get_keyring().key_ids(), ["k1"])
+            with open(path, "w") as f:
+                json.dump({"k1": PUBLIC_KEY_PEM, "k2": ROTATED_PUBLIC_KEY_PEM}, f)
+            stat = os.stat(path)
+            os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+            self.assertEqual(sorted(get_keyring().key_ids()), ["k1", "k2"])
+        os.unlink(path)
+
+    def test_reload_swaps_keyring(self):
+        from openexec.keyring import get_keyring
+        with patch.dict(os.environ, {"CLAWSHIELD_PUBLIC_KEY": PUBLIC_KEY_PEM}):
+            first = get_keyring()
+            self.assertIs(get_keyring(), first)
+        with patch.dict(os.environ, {"CLAWSHIELD_PUBLIC_KEY": ROTATED_PUBLIC_KEY_PEM}):
+            second = get_keyring()
+            self.assertIsNot(second, first)
+            self.assertEqual(second.key_ids(), ["default"])
+
+    @patch.dict(os.environ, {
+        "OPENEXEC_MODE": "clawshield",
+        "CLAWSHIELD_PUBLIC_KEY": PUBLIC_KEY_PEM,
+        "CLAWSHIELD_PUBLIC_KEYS": json.dumps({"2026-q4": ROTATED_PUBLIC_KEY_PEM}),
+        "CLAWSHIELD_TENANT_ID": TEST_TENANT,
+    })
+    def test_rotated_key_with_key_id_executes(self):
+        action_request = {"action": "echo", "payload": {"msg": "rotated"}}
+        artifact = mint_approval_artifact(action_request, ROTATED_PRIVATE_KEY, TEST_TENANT, key_id="2026-q4")
+        resp = client.post("/execute", json={
+            "action": "echo",
+            "payload": {"msg": "rotated"},
+            "nonce": f"ed25519-rotated-{artifact['approval_id']}",
+            "approval_artifact": artifact
+        })
+        self.assertEqual(resp.status_code, 200)
+
+    @patch.dict(os.environ, {
+        "OPENEXEC_MODE": "clawshield",
+        "CLAWSHIELD_PUBLIC_KEY": PUBLIC_KEY_PEM,
+        "CLAWSHIELD_PUBLIC_KEYS": json.dumps({"2026-q4": ROTATED_PUBLIC_KEY_PEM}),
+        "CLAWSHIELD_TENANT_ID": TEST_TENANT,
+    })
+    def test_rotated_key_without_key_id_executes(self):
+        action_request = {"action": "echo", "payload": {"msg": "rotated"}}
+        artifact = mint_approval_artifact(action_request, ROTATED_PRIVATE_KEY, TEST_TENANT)
+        resp = client.post("/execute", json={
+            "action": "echo",
+            "payload": {"msg": "rotated"},
+            "nonce": f"ed25519-rotated-{artifact['approval_id']}",
+            "approval_artifact": artifact
+        })
+        self.assertEqual(resp.status_code, 200)
+
+    @patch.dict(os.environ, {
+        "OPENEXEC_MODE": "clawshield",
+        "CLAWSHIELD_PUBLIC_KEY": PUBLIC_KEY_PEM,
+        "CLAWSHIELD_TENANT_ID": TEST_TENANT,
+    })
+    def test_unknown_key_id_rejected(self):
+        artifact = _make_artifact("echo", {"msg": "hello"})
+        artifact["key_id"] = "retired"
+        resp = client.post("/execute", json={
+            "action": "echo",
+            "payload": {"msg": "hello"},
+            "nonce": "ed25519-unknown-kid-1",
+            "approval_artifact": artifact
+        })
+        self.assertEqual(resp.status_code, 403)
+        self.assertIn("Unknown signing key", resp.json()["detail"])
+
+class TestPolicy(unittest.TestCase):
+    def _config(self, policy):
+        import tempfile
+        fd, path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(policy, f)
+        return path
+
+    def _touch(self, path, policy):
+        with open(path, "w") as f:
+            json.dump(policy, f)
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+    @patch.dict(os.environ, {"OPENEXEC_ALLOWED_ACTIONS": "echo, add"})
+    def test_policy_compiled_once(self):
+        from openexec.policy import Mode, get_policy
+        policy = get_policy()
+        self.assertIs(get_policy(), policy)
+        self.assertEqual(policy.allowed_actions, frozenset({"echo", "add"}))
+        self.assertIs(policy.mode, Mode.DEMO)
+        self.assertTrue(policy.allows("add"))
+        self.assertFalse(policy.allows("rm"))
+
+    def test_config_file_change_reloads_policy(self):
+        from openexec.policy import get_policy
+        path = self._config({"allowed_actions": ["echo"], "clawshield": {"tenant_id": "from-config"}})
+        env = {"OPENEXEC_CONFIG": path, "OPENEXEC_POLICY_CHECK_INTERVAL": "0"}
+        with patch.dict(os.environ, env):
+            for name in ("OPENEXEC_ALLOWED_ACTIONS", "CLAWSHIELD_TENANT_ID", "OPENEXEC_MODE"):
+                os.environ.pop(name, None)
+            first = get_policy()
+            self.assertEqual(first.allow_list, ("echo",))
+            self.assertEqual(first.tenant_id, "from-config")
+            resp = client.post("/execute", json={"action": "add", "payload": {}, "nonce": f"policy-{first.version}"})
+            self.assertEqual(resp.status_code, 403)
+
+            self._touch(path, {"allowed_actions": ["echo", "add"]})
+            second = get_policy()
+            self.assertGreater(second.version, first.version)
+            self.assertTrue(second.allows("add"))
+            self.assertEqual(client.get("/health").json()["policy_version"], second.version)
+
+            with open(path, "w") as f:
+                f.write("{not json")
+            stat = os.stat(path)
+            os.utime(path, (stat.st_atime, stat.st_mtime + 20))
+            self.assertEqual(get_policy().allow_list, second.allow_list)
+        os.unlink(path)
+
+    def test_env_overrides_config(self):
+        from openexec.policy import get_policy
+        path = self._config({"mode": "clawshield", "allowed_actions": ["echo"]})
+        with patch.dict(os.environ, {"OPENEXEC_CONFIG": path, "OPENEXEC_MODE": "demo",
+                                     "OPENEXEC_ALLOWED_ACTIONS": "add"}):
+            policy = get_policy()
+            self.assertEqual(policy.mode_name, "demo")
+            self.assertEqual(policy.allow_list, ("add",))
+        os.unlink(path)
+
+    @unittest.skipUnless(hasattr(__import__("signal"), "SIGHUP"), "SIGHUP not available")
+    def test_sighup_forces_reload(self):
+        import signal
+        from openexec.policy import get_policy, install_reload_signal
+        previous = signal.getsignal(signal.SIGHUP)
+        try:
+            install_reload_signal()
+            version = get_policy().version
+            os.kill(os.getpid(), signal.SIGHUP)
+            self.assertGreater(get_policy().version, version)
+        finally:
+            signal.signal(signal.SIGHUP, previous)
+
+    @unittest.skipUnless(hasattr(__import__("signal"), "SIGHUP"), "SIGHUP not available")
+    def test_sighup_does_not_take_the_policy_lock(self):
+        import signal
+        from openexec import policy
+        previous = signal.getsignal(signal.SIGHUP)
+        try:
+            policy.install_reload_signal()
+            version = policy.get_policy().version
+            # A handler that reloaded in place would deadlock on this lock.
+            with policy._lock:
+                os.kill(os.getpid(), signal.SIGHUP)
+            self.assertEqual(policy._policy.version, version)
+            self.assertGreater(policy.get_policy().version, version)
+        finally:
+            signal.signal(signal.SIGHUP, previous)
+
+class TestApprovalPreVerification(unittest.TestCase):
+    @patch.dict(os.environ, {
+        "OPENEXEC_MODE": "clawshield",
+        "CLAWSHIELD_PUBLIC_KEY": PUBLIC_KEY_PEM,
+        "CLAWSHIELD_TENANT_ID": TEST_TENANT,
+    })
+    def test_bulk_verify_streams_verdict_per_item(self):
+        good = {"action": "echo", "payload": {"n": 1}}
+        tampered = {"action": "echo", "payload": {"n": 2}}
+        lines = [
+            {"action_request": good, "artifact": _make_artifact("echo", {"n": 1})},
+            {"action_request": tampered, "artifact": _make_artifact("echo", {"n": 1})},
+            {"action_request": good, "artifact": _make_artifact("echo", {"n": 1}, ttl_seconds=-60)},
+            {"action_request": good, "artifact": {"signature": "x"}},
+        ]
+        body = "\n".join(json.dumps(line) for line in lines) + "\nnot-json\n"
+        resp = client.post("/approvals/verify", content=body, headers={"Content-Type": "application/x-ndjson"})
+        self.assertEqual(resp.status_code, 200)
+        verdicts = [json.loads(line) for line in resp.text.splitlines()]
+        self.assertEqual([v["index"] for v in verdicts], [0, 1, 2, 3, 4])
+        self.assertEqual([v["valid"] for v in verdicts], [True, False, False, False, False])
+        self.assertIn("hash mismatch", verdicts[1]["error"])
+        self.assertIn("expired", verdicts[2]["error"])
+        self.assertEqual(verdicts[3]["error"], "Malformed approval artifact")
+        self.assertEqual(verdicts[4]["error"], "Invalid JSON")
+
 class TestHealthEndpoint(unittest.TestCase):
     @patch.dict(os.environ, {"OPENEXEC_MODE": "clawshield"})
     def test_health_clawshield_mode(self):
@@ -64,3 +64,91 @@ def test_receipt_verification():
     data = resp.json()
     result_str = json.dumps(data["result"], sort_keys=True)
     assert verify_receipt(data["id"], result_str, data["receipt"])
+
+def test_execute_batch():
+    import uuid
+    prefix = uuid.uuid4().hex
+    client.post("/execute", json={"action": "echo", "payload": {"n": 0}, "nonce": f"{prefix}-0"})
+    resp = client.post("/execute/batch", json=[
+        {"action": "echo", "payload": {"n": 0}, "nonce": f"{prefix}-0"},
+        {"action": "add", "payload": {"a": 1, "b": 2}, "nonce": f"{prefix}-1"},
+        {"action": "missing", "payload": {}, "nonce": f"{prefix}-2"},
+        {"action": "add", "payload": {"a": 1, "b": 2}, "nonce": f"{prefix}-1"},
+    ])
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    assert [r["status_code"] for r in results] == [200, 200, 400, 200]
+    assert results[0]["result"]["result"]["echo"]["n"] == 0
+    assert results[1]["result"]["result"]["sum"] == 3
+    assert results[3]["result"]["id"] == results[1]["result"]["id"]
+
+    replay = client.post("/execute", json={"action": "add", "payload": {"a": 1, "b": 2}, "nonce": f"{prefix}-1"})
+    assert replay.json()["id"] == results[1]["result"]["id"]
+
+def test_async_and_sync_handlers():
+    import asyncio
+    import threading
+    import uuid
+    from openexec.registry import register_action, _actions
+
+    async def _async_sleep_echo(payload):
+        await asyncio.sleep(0)
+        return {"echo": payload}
+
+    def _thread_name(payload):
+        return {"thread": threading.current_thread().name}
+
+    register_action("test_async_echo", _async_sleep_echo)
+    register_action("test_thread_name", _thread_name)
+    try:
+        resp = client.post("/execute", json={
+            "action": "test_async_echo",
+            "payload": {"msg": "async"},
+            "nonce": f"async-{uuid.uuid4().hex}"
+        })
+        assert resp.status_code == 200
+        assert resp.json()["result"]["echo"]["msg"] == "async"
+
+        resp = client.post("/execute", json={
+            "action": "test_thread_name",
+            "payload": {},
+            "nonce": f"thread-{uuid.uuid4().hex}"
+        })
+        assert resp.json()["result"]["thread"].startswith("openexec-handler")
+
+        batch = client.post("/execute/batch", json=[
+            {"action": "test_async_echo", "payload": {"msg": "batched"}, "nonce": f"async-{uuid.uuid4().hex}"},
+            {"action": "test_thread_name", "payload": {}, "nonce": f"thread-{uuid.uuid4().hex}"},
+        ]).json()["results"]
+        assert batch[0]["result"]["result"]["echo"]["msg"] == "batched"
+        assert batch[1]["result"]["result"]["thread"].startswith("openexec-handler")
+    finally:
+        _actions.pop("test_async_echo", None)
+        _actions.pop("test_thread_name", None)
+
+def test_saturated_handler_pool_does_not_block_engine():
+    import asyncio
+    import threading
+    import uuid
+    from openexec.executor import get_executor
+    from openexec.registry import register_action, _actions
+
+    async def _async_echo(payload):
+        await asyncio.sleep(0)
+        return {"echo": payload}
+
+    release = threading.Event()
+    pool = get_executor("handler")
+    blockers = [pool.submit(release.wait, 10) for _ in range(pool._max_workers)]
+    register_action("test_async_only", _async_echo)
+    try:
+        resp = client.post("/execute", json={
+            "action": "test_async_only",
+            "payload": {"n": 1},
+            "nonce": f"saturated-{uuid.uuid4().hex}"
+        })
+        assert resp.status_code == 200
+        assert not any(b.done() for b in blockers)
+    finally:
+        release.set()
+        _actions.pop("test_async_only", None)
@@ -0,0 +1,62 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import uuid
+import datetime
+from fastapi.testclient import TestClient
+from main import app
+from openexec.db import init_db
+
+init_db()
+
+client = TestClient(app)
+
+def _seed(action, count):
+    return [client.post("/execute", json={"action": action, "payload": {"i": i}, "nonce": f"{action}-{uuid.uuid4().hex}"}).json()["id"]
+            for i in range(count)]
+
+def test_keyset_pagination_walks_every_row_once():
+    action = "echo"
+    since = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+    ids = _seed(action, 7)
+
+    seen, cursor = [], None
+    while True:
+        params = {"action": action, "since": since.isoformat(), "limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/executions", params=params).json()
+        seen.extend(item["id"] for item in page["executions"])
+        assert all(item["action"] == action and item["approved"] for item in page["executions"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert [i for i in seen if i in ids] == ids
+    assert len(seen) == len(set(seen))
+
+def test_export_streams_ndjson():
+    since = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+    ids = _seed("add", 3)
+    resp = client.get("/executions/export", params={"action": "add", "since": since.isoformat()})
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    exported = {row["id"]: row for row in rows}
+    for exec_id in ids:
+        assert "sum" in exported[exec_id]["result"]
+        assert "i" in exported[exec_id]["payload"]
+        assert exported[exec_id]["receipt"]
+
+def test_invalid_cursor_rejected():
+    assert client.get("/executions", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/executions/export", params={"cursor": "not-a-cursor"}).status_code == 400
+
+def test_filtered_listing_uses_composite_index():
+    from openexec.db import engine
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT id FROM execution_log WHERE action = 'echo' "
+            "AND (timestamp, id) > ('2024-01-01', '') ORDER BY timestamp, id LIMIT 10"
+        ).fetchall()
+    assert "ix_execution_log_action_timestamp_id" in " ".join(str(row) for row in plan)
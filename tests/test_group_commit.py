@@ -0,0 +1,76 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from openexec.db import init_db, engine, GroupCommitWriter, close_group_commit_writer
+from openexec.engine import execute, execute_async
+from openexec.models import ExecutionRequest
+from openexec.tables import ExecutionLog
+
+init_db()
+
+def test_sqlite_profile_applied():
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar().lower() == "wal"
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+
+def test_writer_reports_conflicts_per_row():
+    writer = GroupCommitWriter(max_batch=8, max_delay=0.05)
+    try:
+        nonce = uuid.uuid4().hex
+        rows = [
+            ExecutionLog(id=str(uuid.uuid4()), action="echo", payload="{}", result="{}", nonce=nonce, approved=True),
+            ExecutionLog(id=str(uuid.uuid4()), action="echo", payload="{}", result="{}", nonce=nonce, approved=True),
+            ExecutionLog(id=str(uuid.uuid4()), action="echo", payload="{}", result="{}", nonce=uuid.uuid4().hex, approved=True),
+        ]
+        futures = [writer.submit(row) for row in rows]
+        assert [f.result(timeout=5) for f in futures] == [True, False, True]
+    finally:
+        writer.close()
+
+@patch.dict(os.environ, {"OPENEXEC_GROUP_COMMIT": "on"})
+def test_concurrent_executions_group_committed():
+    prefix = uuid.uuid4().hex
+    requests = [
+        ExecutionRequest(action="add", payload={"a": i % 10, "b": 1}, nonce=f"{prefix}-{i % 10}")
+        for i in range(40)
+    ]
+    try:
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(execute, requests))
+    finally:
+        close_group_commit_writer()
+
+    by_nonce = {}
+    for request, result in zip(requests, results):
+        by_nonce.setdefault(request.nonce, set()).add(result.id)
+    assert len(by_nonce) == 10
+    assert all(len(ids) == 1 for ids in by_nonce.values())
+
+@patch.dict(os.environ, {"OPENEXEC_GROUP_COMMIT": "on", "OPENEXEC_RESPONSE_CACHE_SIZE": "0"})
+def test_async_executions_fill_batches_past_the_engine_pool():
+    sizes = []
+
+    class Recording(GroupCommitWriter):
+        def _commit(self, batch):
+            sizes.append(len(batch))
+            super()._commit(batch)
+
+    writer = Recording(max_batch=64, max_delay=0.2)
+    prefix = uuid.uuid4().hex
+    requests = [ExecutionRequest(action="add", payload={"a": i, "b": 1}, nonce=f"{prefix}-{i}") for i in range(32)]
+
+    async def run_all():
+        return await asyncio.gather(*(execute_async(r) for r in requests))
+
+    try:
+        with patch("openexec.store.get_group_commit_writer", return_value=writer):
+            results = asyncio.run(run_all())
+    finally:
+        writer.close()
+    assert len({r.id for r in results}) == 32
+    assert max(sizes) > int(os.getenv("OPENEXEC_ENGINE_THREADS", 8))
@@ -0,0 +1,82 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uuid
+import time
+from fastapi.testclient import TestClient
+from main import app
+from openexec.db import init_db, SessionLocal
+from openexec.memo import ResultMemo, reset_memo
+from openexec.receipts import make_receipt
+from openexec.registry import register_action, unregister_action
+from openexec.tables import ExecutionLog
+
+init_db()
+
+client = TestClient(app)
+
+def test_pure_action_runs_once_per_payload_but_records_every_nonce(monkeypatch):
+    monkeypatch.setenv("OPENEXEC_RESPONSE_CACHE_SIZE", "0")
+    reset_memo()
+    calls = []
+
+    def square(payload):
+        calls.append(payload)
+        return {"square": payload["n"] ** 2}
+
+    register_action("memo_square", square, pure=True)
+    try:
+        marker = uuid.uuid4().hex
+        responses = [
+            client.post("/execute", json={"action": "memo_square", "payload": {"n": 7, "m": marker},
+                                          "nonce": f"memo-{uuid.uuid4().hex}"}).json()
+            for _ in range(3)
+        ]
+        assert len(calls) == 1
+        assert len({r["id"] for r in responses}) == 3
+        assert all(r["result"] == {"square": 49} for r in responses)
+
+        db = SessionLocal()
+        try:
+            rows = db.query(ExecutionLog).filter(ExecutionLog.id.in_([r["id"] for r in responses])).all()
+            assert len(rows) == 3
+            for row in rows:
+                assert row.receipt == make_receipt(row.id, row.result)
+        finally:
+            db.close()
+
+        client.post("/execute", json={"action": "memo_square", "payload": {"n": 8, "m": marker},
+                                      "nonce": f"memo-{uuid.uuid4().hex}"})
+        assert len(calls) == 2
+
+        stats = client.get("/health").json()["memo"]["actions"]["memo_square"]
+        assert stats == {"hits": 2, "misses": 2, "hit_ratio": 0.5}
+    finally:
+        unregister_action("memo_square")
+        reset_memo()
+
+def test_impure_actions_are_never_memoized():
+    reset_memo()
+    calls = []
+    register_action("memo_impure", lambda payload: calls.append(1) or {"n": len(calls)})
+    try:
+        for _ in range(2):
+            client.post("/execute", json={"action": "memo_impure", "payload": {},
+                                          "nonce": f"memo-{uuid.uuid4().hex}"})
+        assert len(calls) == 2
+    finally:
+        unregister_action("memo_impure")
+        reset_memo()
+
+def test_memo_evicts_by_size_and_ttl():
+    memo = ResultMemo(max_entries=2, ttl=0.05)
+    memo.put("a", '{"n":1}', {"r": 1})
+    memo.put("a", '{"n":2}', {"r": 2})
+    memo.put("a", '{"n":3}', {"r": 3})
+    assert memo.get("a", '{"n":1}') is None
+    assert memo.get("a", '{"n":3}') == {"r": 3}
+    assert memo.get("b", '{"n":3}') is None
+    time.sleep(0.06)
+    assert memo.get("a", '{"n":3}') is None
+    assert memo.stats()["cached"] == 1
@@ -0,0 +1,68 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uuid
+import hashlib
+from fastapi.testclient import TestClient
+from main import app
+from openexec.db import init_db
+from openexec.merkle import build_levels, inclusion_proof, leaf_hash, verify_proof
+from openexec.receipts import seal_pending
+
+init_db()
+
+client = TestClient(app)
+
+def test_inclusion_proofs_for_every_tree_size():
+    for size in range(1, 17):
+        receipts = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(size)]
+        levels = build_levels([leaf_hash(r) for r in receipts])
+        root = levels[-1][0].hex()
+        for i, receipt in enumerate(receipts):
+            proof = inclusion_proof(levels, i)
+            assert len(proof) <= size.bit_length()
+            assert verify_proof(receipt, proof, root)
+        if size > 1:
+            assert not verify_proof(receipts[0], inclusion_proof(levels, 1), root)
+
+def test_sealed_execution_carries_proof():
+    nonce = f"merkle-{uuid.uuid4().hex}"
+    first = client.post("/execute", json={"action": "echo", "payload": {"m": 1}, "nonce": nonce}).json()
+    assert first["proof"] is None
+
+    while seal_pending(max_leaves=7):
+        pass
+
+    replay = client.post("/execute", json={"action": "echo", "payload": {"m": 1}, "nonce": nonce}).json()
+    proof = replay["proof"]
+    assert proof is not None
+    assert replay["receipt"] == first["receipt"]
+
+    root = client.get(f"/receipts/roots/{proof['batch']}").json()
+    assert root["root"] == proof["root"]
+    assert client.get(f"/receipts/proofs/{first['id']}").json()["proof"] == proof
+
+    valid = client.post("/receipts/proofs/verify", json={"receipt": first["receipt"], "proof": proof})
+    assert valid.json()["valid"] is True
+    forged = client.post("/receipts/proofs/verify", json={"receipt": "00" * 32, "proof": proof})
+    assert forged.json()["valid"] is False
+
+def test_unknown_root_and_unanchored_proof_404():
+    assert client.get("/receipts/roots/999999").status_code == 404
+    assert client.get(f"/receipts/proofs/{uuid.uuid4()}").status_code == 404
+
+def test_background_sealer_anchors_without_further_traffic(monkeypatch):
+    import time
+    from openexec.receipts import start_sealer, stop_sealer
+
+    monkeypatch.setenv("OPENEXEC_MERKLE_INTERVAL", "0.05")
+    first = client.post("/execute", json={"action": "echo", "payload": {}, "nonce": f"sealer-{uuid.uuid4().hex}"}).json()
+    start_sealer()
+    try:
+        deadline = time.monotonic() + 5
+        while client.get(f"/receipts/proofs/{first['id']}").status_code == 404:
+            assert time.monotonic() < deadline
+            time.sleep(0.02)
+    finally:
+        stop_sealer()
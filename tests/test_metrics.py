@@ -0,0 +1,72 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uuid
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from main import app
+from openexec import metrics
+from openexec.db import init_db
+
+init_db()
+
+client = TestClient(app)
+
+def test_metrics_record_stages_and_outcomes():
+    metrics.reset()
+    nonce = f"metrics-{uuid.uuid4().hex}"
+    client.post("/execute", json={"action": "echo", "payload": {}, "nonce": nonce})
+    client.post("/execute", json={"action": "echo", "payload": {}, "nonce": nonce})
+    with patch.dict(os.environ, {"OPENEXEC_ALLOWED_ACTIONS": "add"}):
+        client.post("/execute", json={"action": "echo", "payload": {}, "nonce": f"metrics-{uuid.uuid4().hex}"})
+
+    resp = client.get("/metrics")
+    assert resp.headers["content-type"].startswith("text/plain")
+    text = resp.text
+    for stage in ("lookup", "canonical", "handler", "record", "commit"):
+        assert f'openexec_stage_seconds_count{{stage="{stage}",action="echo"}}' in text
+    assert 'openexec_executions_total{action="echo",mode="demo",outcome="approved",reason=""} 1' in text
+    assert 'openexec_executions_total{action="echo",mode="demo",outcome="replayed",reason=""} 1' in text
+    assert 'openexec_executions_total{action="echo",mode="demo",outcome="rejected",reason="allow_list"} 1' in text
+
+def test_histogram_buckets_are_cumulative():
+    metrics.reset()
+    metrics.observe("handler", "slow", 0.003)
+    metrics.observe("handler", "slow", 20.0)
+    text = metrics.render()
+    assert 'openexec_stage_seconds_bucket{stage="handler",action="slow",le="0.0025"} 0' in text
+    assert 'openexec_stage_seconds_bucket{stage="handler",action="slow",le="0.005"} 1' in text
+    assert 'openexec_stage_seconds_bucket{stage="handler",action="slow",le="10.0"} 1' in text
+    assert 'openexec_stage_seconds_bucket{stage="handler",action="slow",le="+Inf"} 2' in text
+
+def test_clawshield_rejection_reason_and_signature_stage():
+    from openexec.clawshield_client import generate_test_keypair, mint_approval_artifact
+
+    private_key, public_key_pem = generate_test_keypair()
+    metrics.reset()
+    with patch.dict(os.environ, {"OPENEXEC_MODE": "clawshield", "CLAWSHIELD_PUBLIC_KEY": public_key_pem}):
+        artifact = mint_approval_artifact({"action": "echo", "payload": {"v": 1}}, private_key, "tenant-metrics")
+        ok = client.post("/execute", json={"action": "echo", "payload": {"v": 1},
+                                           "nonce": f"metrics-{uuid.uuid4().hex}", "approval_artifact": artifact})
+        assert ok.status_code == 200
+        tampered = client.post("/execute", json={"action": "echo", "payload": {"v": 2},
+                                                 "nonce": f"metrics-{uuid.uuid4().hex}", "approval_artifact": artifact})
+        assert tampered.status_code == 403
+
+    text = client.get("/metrics").text
+    assert 'openexec_stage_seconds_count{stage="signature",action="echo"} 1' in text
+    assert 'outcome="approved",reason=""} 1' in text
+    assert 'mode="clawshield",outcome="rejected",reason="hash_mismatch"} 1' in text
+
+def test_unregistered_actions_share_one_label():
+    metrics.reset()
+    names = [f"bogus-{uuid.uuid4().hex}" for _ in range(3)]
+    for name in names:
+        resp = client.post("/execute", json={"action": name, "payload": {}, "nonce": f"metrics-{uuid.uuid4().hex}"})
+        assert resp.status_code == 400
+
+    text = client.get("/metrics").text
+    assert not any(name in text for name in names)
+    assert 'openexec_stage_seconds_count{stage="lookup",action="unknown"} 3' in text
+    assert 'openexec_executions_total{action="unknown",mode="demo",outcome="rejected",reason="invalid_request"} 3' in text
@@ -0,0 +1,68 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uuid
+import hashlib
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from openexec.db import init_db
+from openexec.registry import register_action, unregister_action
+
+init_db()
+
+client = TestClient(app)
+
+def _cpu_digest(payload):
+    data = payload["data"].encode()
+    for _ in range(payload.get("rounds", 1)):
+        data = hashlib.sha256(data).digest()
+    return {"digest": data.hex(), "pid": os.getpid()}
+
+def test_cpu_bound_handler_runs_in_worker_process():
+    register_action("test_cpu_digest", _cpu_digest, cpu_bound=True)
+    try:
+        nonce = uuid.uuid4().hex
+        body = {"action": "test_cpu_digest", "payload": {"data": "abc", "rounds": 1000}, "nonce": nonce}
+        first = client.post("/execute", json=body).json()
+        assert first["result"]["pid"] != os.getpid()
+        assert first["result"]["digest"] == _cpu_digest({"data": "abc", "rounds": 1000})["digest"]
+
+        replay = client.post("/execute", json=body).json()
+        assert replay["id"] == first["id"]
+        assert replay["receipt"] == first["receipt"]
+
+        batch = client.post("/execute/batch", json=[
+            {"action": "test_cpu_digest", "payload": {"data": str(i)}, "nonce": uuid.uuid4().hex} for i in range(4)
+        ]).json()["results"]
+        assert all(item["status_code"] == 200 for item in batch)
+    finally:
+        unregister_action("test_cpu_digest")
+
+def test_cpu_bound_handler_with_bulkhead_and_sync_path():
+    from openexec.engine import execute
+    from openexec.models import ExecutionRequest
+
+    register_action("test_cpu_limited", _cpu_digest, cpu_bound=True, max_concurrency=1, timeout=30)
+    try:
+        result = execute(ExecutionRequest(action="test_cpu_limited", payload={"data": "x"}, nonce=uuid.uuid4().hex))
+        assert result.result["pid"] != os.getpid()
+        resp = client.post("/execute", json={"action": "test_cpu_limited", "payload": {"data": "y"}, "nonce": uuid.uuid4().hex})
+        assert resp.status_code == 200
+    finally:
+        unregister_action("test_cpu_limited")
+
+def test_warm_process_pool_starts_workers():
+    from openexec.executor import warm_process_pool
+    assert warm_process_pool() >= 1
+
+def test_unpicklable_cpu_bound_handler_rejected():
+    with pytest.raises(TypeError):
+        register_action("test_cpu_lambda", lambda payload: payload, cpu_bound=True)
+
+    async def _coroutine(payload):
+        return payload
+
+    with pytest.raises(TypeError):
+        register_action("test_cpu_coroutine", _coroutine, cpu_bound=True)
@@ -0,0 +1,79 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uuid
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from main import app
+from openexec.db import init_db
+from openexec.replay import BloomFilter, ReplayIndex, reset_replay_index
+from openexec.response_cache import reset_response_cache
+
+init_db()
+
+client = TestClient(app)
+
+def test_bloom_filter_membership():
+    bloom = BloomFilter(capacity=1000)
+    for i in range(1000):
+        bloom.add(f"nonce-{i}")
+    assert all(f"nonce-{i}" in bloom for i in range(1000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 100
+
+def test_replay_index_counters():
+    index = ReplayIndex(capacity=100, cache_size=2)
+    assert index.lookup("a") == (None, False)
+    index.remember("a", "result-a")
+    assert index.lookup("a") == ("result-a", False)
+    index.remember("b", "result-b")
+    index.remember("c", "result-c")
+    assert index.lookup("a") == (None, True)
+    index.confirm("a", None)
+    stats = index.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["false_positives"] == 1
+    assert stats["cached"] == 2
+
+@patch.dict(os.environ, {"OPENEXEC_REPLAY_FILTER": "on", "OPENEXEC_RESPONSE_CACHE_SIZE": "0"})
+def test_replay_served_from_memory():
+    # The response cache sits in front of the replay index; keep it out of the way.
+    reset_response_cache()
+    reset_replay_index()
+    assert "replay_filter" not in client.get("/health").json()
+    old_nonce = f"pre-filter-{uuid.uuid4().hex}"
+    with patch.dict(os.environ, {"OPENEXEC_REPLAY_FILTER": "off"}):
+        first = client.post("/execute", json={"action": "echo", "payload": {}, "nonce": old_nonce})
+
+    warm_replay = client.post("/execute", json={"action": "echo", "payload": {}, "nonce": old_nonce})
+    assert warm_replay.json()["id"] == first.json()["id"]
+
+    nonce = f"filter-{uuid.uuid4().hex}"
+    resp1 = client.post("/execute", json={"action": "add", "payload": {"a": 1, "b": 1}, "nonce": nonce})
+    resp2 = client.post("/execute", json={"action": "add", "payload": {"a": 1, "b": 1}, "nonce": nonce})
+    assert resp1.json()["id"] == resp2.json()["id"]
+    assert resp1.json()["receipt"] == resp2.json()["receipt"]
+
+    stats = client.get("/health").json()["replay_filter"]
+    assert stats["misses"] == 1
+    assert stats["db_hits"] == 1
+    assert stats["hits"] == 1
+    reset_replay_index()
+    reset_response_cache()
+
+@patch.dict(os.environ, {"OPENEXEC_REPLAY_FILTER": "on"})
+def test_cached_replay_picks_up_proof_after_sealing():
+    from openexec.receipts import seal_pending
+
+    reset_replay_index()
+    nonce = f"filter-proof-{uuid.uuid4().hex}"
+    first = client.post("/execute", json={"action": "echo", "payload": {}, "nonce": nonce}).json()
+    assert first["proof"] is None
+    while seal_pending():
+        pass
+    replay = client.post("/execute", json={"action": "echo", "payload": {}, "nonce": nonce}).json()
+    assert replay["proof"] == client.get(f"/receipts/proofs/{first['id']}").json()["proof"]
+    assert client.get("/health").json()["replay_filter"]["hits"] == 1
+    reset_replay_index()
@@ -0,0 +1,52 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uuid
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from main import app
+from openexec.db import init_db
+from openexec.receipts import seal_pending
+from openexec.response_cache import ResponseCache, get_response_cache, reset_response_cache
+
+init_db()
+
+client = TestClient(app)
+
+def test_cache_is_bounded():
+    cache = ResponseCache(max_entries=2)
+    for nonce in ("a", "b", "c"):
+        cache.put(nonce, nonce.encode(), anchored=True)
+    assert cache.get("a") is None
+    assert cache.get("c") == b"c"
+    assert cache.stats()["cached"] == 2
+
+def test_replay_returns_cached_bytes_without_engine():
+    reset_response_cache()
+    nonce = f"response-cache-{uuid.uuid4().hex}"
+    first = client.post("/execute", json={"action": "add", "payload": {"a": 2, "b": 3}, "nonce": nonce})
+    assert first.json()["result"] == {"sum": 5}
+
+    with patch("openexec.engine.execute_async", side_effect=AssertionError("engine called")):
+        replay = client.post("/execute", json={"action": "add", "payload": {"a": 2, "b": 3}, "nonce": nonce})
+    assert replay.content == first.content
+    assert get_response_cache().stats()["hits"] == 1
+
+def test_unanchored_response_refreshed_after_sealing():
+    reset_response_cache()
+    nonce = f"response-cache-seal-{uuid.uuid4().hex}"
+    first = client.post("/execute", json={"action": "echo", "payload": {}, "nonce": nonce}).json()
+    assert first["proof"] is None
+    while seal_pending():
+        pass
+    replay = client.post("/execute", json={"action": "echo", "payload": {}, "nonce": nonce}).json()
+    assert replay["proof"] is not None
+    assert replay["receipt"] == first["receipt"]
+
+@patch.dict(os.environ, {"OPENEXEC_RESPONSE_CACHE_SIZE": "0"})
+def test_cache_can_be_disabled():
+    reset_response_cache()
+    assert get_response_cache() is None
+    assert "response_cache" not in client.get("/health").json()
+    reset_response_cache()
@@ -0,0 +1,105 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uuid
+import datetime
+import tempfile
+from fastapi.testclient import TestClient
+from main import app
+from openexec.db import init_db, SessionLocal
+from openexec.tables import ExecutionLog
+from openexec.retention import compact, find_archived
+
+init_db()
+
+client = TestClient(app)
+
+def _age_rows(exec_ids, days):
+    db = SessionLocal()
+    try:
+        stamp = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+        db.query(ExecutionLog).filter(ExecutionLog.id.in_(exec_ids)).update(
+            {ExecutionLog.timestamp: stamp}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def test_compact_archives_old_rows_and_keeps_replay_protection():
+    prefix = uuid.uuid4().hex
+    old = [client.post("/execute", json={"action": "add", "payload": {"a": i, "b": 1}, "nonce": f"{prefix}-old-{i}"}).json()
+           for i in range(3)]
+    recent = client.post("/execute", json={"action": "echo", "payload": {}, "nonce": f"{prefix}-recent"}).json()
+    _age_rows([r["id"] for r in old], days=90)
+
+    archive_dir = tempfile.mkdtemp(prefix="openexec-archive-")
+    summary = compact(retention_days=30, archive_dir=archive_dir)
+    assert summary["archived"] >= 3
+    segment = summary["segments"][0]["path"]
+    assert os.stat(segment).st_mode & 0o222 == 0
+
+    db = SessionLocal()
+    try:
+        assert db.query(ExecutionLog).filter_by(id=old[0]["id"]).first() is None
+        assert db.query(ExecutionLog).filter_by(id=recent["id"]).first() is not None
+        archived = find_archived(db, exec_id=old[1]["id"])
+        assert archived.nonce == f"{prefix}-old-1"
+    finally:
+        db.close()
+
+    replay = client.post("/execute", json={"action": "add", "payload": {"a": 0, "b": 1}, "nonce": f"{prefix}-old-0"})
+    assert replay.json()["id"] == old[0]["id"]
+    assert replay.json()["receipt"] == old[0]["receipt"]
+
+    batch = client.post("/execute/batch", json=[
+        {"action": "add", "payload": {"a": 2, "b": 1}, "nonce": f"{prefix}-old-2"},
+    ]).json()["results"]
+    assert batch[0]["result"]["id"] == old[2]["id"]
+
+def test_archived_nonce_rejected_at_insert():
+    import pytest
+    from sqlalchemy.exc import IntegrityError
+    from openexec.engine import _store
+    from openexec.models import ExecutionResult
+
+    nonce = f"archived-insert-{uuid.uuid4().hex}"
+    original = client.post("/execute", json={"action": "echo", "payload": {}, "nonce": nonce}).json()
+    _age_rows([original["id"]], days=90)
+    compact(retention_days=30, archive_dir=tempfile.mkdtemp(prefix="openexec-archive-"))
+
+    db = SessionLocal()
+    try:
+        db.add(ExecutionLog(id=str(uuid.uuid4()), action="echo", payload="{}", result="{}", nonce=nonce, approved=True))
+        with pytest.raises(IntegrityError):
+            db.commit()
+        db.rollback()
+    finally:
+        db.close()
+
+    raced = ExecutionLog(id=str(uuid.uuid4()), action="echo", payload="{}", result="{}", nonce=nonce, approved=True)
+    result = _store(raced, ExecutionResult(id=raced.id, action="echo", result={}, approved=True))
+    assert result.id == original["id"]
+
+def test_compaction_keeps_merkle_proofs():
+    from openexec.receipts import seal_pending, _batch_levels
+
+    while seal_pending():
+        pass
+    prefix = uuid.uuid4().hex
+    rows = [client.post("/execute", json={"action": "echo", "payload": {"i": i}, "nonce": f"{prefix}-{i}"}).json()
+            for i in range(4)]
+    seal_pending()
+    _batch_levels.cache_clear()
+    # Archive half of the batch so its tree spans live and archived rows.
+    _age_rows([r["id"] for r in rows[:2]], days=90)
+    compact(retention_days=30, archive_dir=tempfile.mkdtemp(prefix="openexec-archive-"))
+
+    for row in rows:
+        anchored = client.get(f"/receipts/proofs/{row['id']}").json()
+        assert anchored["receipt"] == row["receipt"]
+        valid = client.post("/receipts/proofs/verify", json={"receipt": row["receipt"], "proof": anchored["proof"]})
+        assert valid.json()["valid"] is True
+
+    replay = client.post("/execute", json={"action": "echo", "payload": {"i": 0}, "nonce": f"{prefix}-0"}).json()
+    assert replay["proof"] == client.get(f"/receipts/proofs/{rows[0]['id']}").json()["proof"]
@@ -0,0 +1,113 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import uuid
+import datetime
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from openexec.db import init_db
+from openexec.shards import all_shards, get_shard, reset_shards, shard_name
+from openexec.tables import ExecutionLog
+
+init_db()
+
+client = TestClient(app)
+
+@pytest.fixture
+def sharded(monkeypatch, tmp_path):
+    monkeypatch.setenv("OPENEXEC_SHARDS", "tenant")
+    monkeypatch.setenv("OPENEXEC_SHARD_DIR", str(tmp_path))
+    monkeypatch.setenv("OPENEXEC_SHARD_TENANTS", "acme,globex,initech")
+    reset_shards()
+    yield tmp_path
+    reset_shards()
+
+def _artifact(tenant):
+    return {"approval_id": "a", "tenant_id": tenant, "action_hash": "0" * 64, "issued_at": "2020-01-01T00:00:00+00:00",
+            "expires_at": "2099-01-01T00:00:00+00:00", "signature": "x"}
+
+def _request(tenant, nonce, n=1):
+    return {"action": "echo", "payload": {"n": n}, "nonce": nonce, "approval_artifact": _artifact(tenant)}
+
+def test_executions_are_routed_to_their_tenant_shard(sharded):
+    nonce = f"shard-{uuid.uuid4().hex}"
+    acme = client.post("/execute", json=_request("acme", nonce, 1)).json()
+    globex = client.post("/execute", json=_request("globex", nonce, 2)).json()
+    # Nonces are unique per shard: the same nonce is two executions.
+    assert acme["id"] != globex["id"]
+    assert client.post("/execute", json=_request("acme", nonce, 3)).json()["id"] == acme["id"]
+
+    names = {s.name for s in all_shards()}
+    assert names == {shard_name("acme"), shard_name("globex")}
+    db = get_shard(shard_name("acme")).SessionLocal()
+    try:
+        assert db.query(ExecutionLog).filter_by(nonce=nonce).one().id == acme["id"]
+    finally:
+        db.close()
+    shards = client.get("/health").json()["shards"]
+    assert shards["mode"] == "tenant" and shards["sealed"] is False and shards["audited"] is False
+
+def test_batch_groups_items_by_shard(sharded):
+    nonce = f"shard-{uuid.uuid4().hex}"
+    first = client.post("/execute/batch", json=[_request("acme", nonce), _request("globex", nonce)]).json()["results"]
+    again = client.post("/execute/batch", json=[_request("globex", nonce), _request("acme", nonce)]).json()["results"]
+    assert [r["status_code"] for r in first + again] == [200] * 4
+    assert first[0]["result"]["id"] != first[1]["result"]["id"]
+    assert [r["result"]["id"] for r in again] == [first[1]["result"]["id"], first[0]["result"]["id"]]
+
+def test_reads_and_exports_fan_out_across_shards(sharded):
+    since = (datetime.datetime.utcnow() - datetime.timedelta(seconds=1)).isoformat()
+    ids = [client.post("/execute", json=_request(tenant, f"shard-{uuid.uuid4().hex}")).json()["id"]
+           for tenant in ("acme", "globex", "acme", "initech")]
+    unsharded = client.post("/execute", json={"action": "echo", "payload": {}, "nonce": f"shard-{uuid.uuid4().hex}"}).json()
+
+    assert client.get(f"/executions/{ids[1]}").json()["id"] == ids[1]
+
+    pages, cursor = [], None
+    while True:
+        params = {"since": since, "action": "echo", "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/executions", params=params).json()
+        pages.extend(e["id"] for e in page["executions"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert set(ids) <= set(pages) and len(pages) == len(set(pages))
+
+    lines = [json.loads(line) for line in client.get("/executions/export", params={"since": since}).iter_lines() if line]
+    exported = [line["id"] for line in lines]
+    assert set(ids) | {unsharded["id"]} <= set(exported)
+    stamps = [line["timestamp"] for line in lines]
+    assert stamps == sorted(stamps)
+
+def test_hash_partitioning_bounds_the_shard_count(sharded, monkeypatch):
+    monkeypatch.setenv("OPENEXEC_SHARDS", "4")
+    names = {shard_name(f"tenant-{i}") for i in range(50)}
+    assert names <= {"000", "001", "002", "003"} and len(names) > 1
+
+def test_unknown_tenants_and_lookups_never_create_shards(sharded):
+    nonce = f"shard-{uuid.uuid4().hex}"
+    stranger = client.post("/execute", json=_request("stranger", nonce)).json()
+    assert client.post("/execute", json=_request("acme", f"shard-{uuid.uuid4().hex}")).status_code == 200
+    # A replay lookup for a known tenant that never wrote anything opens no file.
+    resp = client.post("/execute", json={**_request("globex", nonce), "action": "no_such_action"})
+    assert resp.status_code == 400
+    assert [s.name for s in all_shards()] == [shard_name("acme")]
+    assert {f.split(".db")[0] for f in os.listdir(sharded)} == {f"shard-{shard_name('acme')}"}
+    # The unknown tenant's execution went to the primary database.
+    assert client.post("/execute", json=_request("another", nonce)).json()["id"] == stranger["id"]
+
+def test_queue_and_stream_reject_sharded_requests(sharded):
+    for endpoint in ("/execute/async", "/execute/stream"):
+        resp = client.post(endpoint, json=_request("acme", f"shard-{uuid.uuid4().hex}"))
+        assert resp.status_code == 400 and "/execute" in resp.json()["detail"]
+    assert client.post("/execute/async", json=_request("stranger", f"shard-{uuid.uuid4().hex}")).status_code == 202
+
+def test_audit_reports_unaudited_shards(sharded):
+    from openexec.audit import audit
+    client.post("/execute", json=_request("acme", f"shard-{uuid.uuid4().hex}"))
+    assert audit(restart=True)["unaudited_shards"] == [shard_name("acme")]
@@ -0,0 +1,117 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uuid
+import sqlite3
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.testclient import TestClient
+from main import app
+from openexec.blobs import pack
+from openexec.db import DATABASE_URL, init_db, SessionLocal
+from openexec.store import ExecutionStore, MemoryStore, SQLiteStore, SqlAlchemyStore, get_store, get_store_kind, reset_store, _sqlite_path
+from openexec.tables import ExecutionLog
+
+init_db()
+
+client = TestClient(app)
+
+def _log(nonce=None, result='{"ok":true}'):
+    return ExecutionLog(
+        id=str(uuid.uuid4()), action="echo", payload="{}", result=result,
+        nonce=nonce or f"store-{uuid.uuid4().hex}", approved=True,
+    )
+
+@pytest.fixture(params=["sqlalchemy", "sqlite", "memory"])
+def store(request):
+    if request.param == "sqlite":
+        return SQLiteStore(_sqlite_path(DATABASE_URL))
+    if request.param == "memory":
+        return MemoryStore()
+    return SqlAlchemyStore()
+
+def test_insert_returns_existing_row_on_conflict(store):
+    first = _log()
+    exec_id, nonce = first.id, first.nonce
+    assert store.insert(first) is None
+    existing = store.insert(_log(nonce=nonce, result='{"ok":false}'))
+    assert existing.id == exec_id
+    assert existing.result == '{"ok":true}'
+    assert store.find(nonce).id == exec_id
+    assert store.find(f"store-{uuid.uuid4().hex}") is None
+
+def test_insert_many_reports_only_taken_nonces(store):
+    taken = _log()
+    expected = {taken.nonce: taken.id}
+    store.insert(taken)
+    fresh = [_log(), _log()]
+    expected.update({log.nonce: log.id for log in fresh})
+    taken_nonce = next(iter(expected))
+    conflicts = store.insert_many(fresh + [_log(nonce=taken_nonce)])
+    assert list(conflicts) == [taken_nonce]
+    assert conflicts[taken_nonce].id == expected[taken_nonce]
+    found = store.find_many(list(expected) + ["store-missing"])
+    assert {n: l.id for n, l in found.items()} == expected
+
+def test_sqlite_store_writes_blobs_with_the_row(monkeypatch):
+    monkeypatch.setenv("OPENEXEC_BLOB_CODEC", "zlib")
+    store = SQLiteStore(_sqlite_path(DATABASE_URL))
+    text = '{"doc":"' + "q" * 5000 + uuid.uuid4().hex + '"}'
+    log = _log(result=text)
+    pack(log)
+    exec_id, nonce, ref = log.id, log.nonce, log.result_ref
+    assert store.insert(log) is None
+
+    assert store.find(nonce).result == text
+    db = SessionLocal()
+    try:
+        row = db.get(ExecutionLog, exec_id)
+        assert row.result is None and row.result_ref == ref
+    finally:
+        db.close()
+
+def test_memory_store_serves_the_engine(monkeypatch):
+    monkeypatch.setenv("OPENEXEC_STORE", "memory")
+    monkeypatch.setenv("OPENEXEC_RESPONSE_CACHE_SIZE", "0")
+    reset_store()
+    try:
+        assert get_store_kind() == "memory"
+        assert get_store_kind(durable=True) != "memory"
+        nonce = f"store-{uuid.uuid4().hex}"
+        first = client.post("/execute", json={"action": "echo", "payload": {"n": 1}, "nonce": nonce}).json()
+        replay = client.post("/execute", json={"action": "echo", "payload": {"n": 1}, "nonce": nonce}).json()
+        assert replay["id"] == first["id"] and replay["result"] == {"echo": {"n": 1}}
+        assert get_store().find(nonce).id == first["id"]
+        db = SessionLocal()
+        try:
+            assert db.get(ExecutionLog, first["id"]) is None
+        finally:
+            db.close()
+    finally:
+        reset_store()
+
+def test_unknown_store_is_rejected(monkeypatch):
+    monkeypatch.setenv("OPENEXEC_STORE", "redis")
+    with pytest.raises(ValueError):
+        get_store_kind()
+
+def test_store_interface_is_abstract():
+    with pytest.raises(TypeError):
+        ExecutionStore()
+
+def test_sqlite_store_closes_every_thread_connection():
+    store = SQLiteStore(_sqlite_path(DATABASE_URL))
+    nonce = f"store-{uuid.uuid4().hex}"
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        list(pool.map(lambda _: store.find(nonce), range(3)))
+    conns = list(store._conns)
+    assert len(conns) >= 1
+
+    store.close()
+    for conn in conns:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+    # Threads that used the store reconnect on next use.
+    assert store.find(nonce) is None
+    store.close()
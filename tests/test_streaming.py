@@ -0,0 +1,151 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import uuid
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from openexec.audit import audit
+from openexec.db import init_db, SessionLocal
+from openexec.receipts import make_receipt, seal_pending
+from openexec.registry import register_action, unregister_action
+from openexec.tables import ExecutionChunk, ExecutionLog
+
+init_db()
+
+client = TestClient(app)
+
+def _rows(payload):
+    for i in range(payload.get("n", 0)):
+        yield {"i": i, "pad": "x" * 100}
+    if payload.get("explode"):
+        raise RuntimeError("boom")
+
+async def _rows_async(payload):
+    for i in range(payload.get("n", 0)):
+        await asyncio.sleep(0)
+        yield {"i": i}
+
+@pytest.fixture(autouse=True)
+def streaming_actions(monkeypatch):
+    monkeypatch.setenv("OPENEXEC_STREAM_CHUNK_BYTES", "1000")
+    register_action("stream_rows", _rows)
+    register_action("stream_rows_async", _rows_async)
+    yield
+    unregister_action("stream_rows")
+    unregister_action("stream_rows_async")
+
+def _stream(action, payload, nonce=None):
+    resp = client.post("/execute/stream", json={"action": action, "payload": payload,
+                                                 "nonce": nonce or f"stream-{uuid.uuid4().hex}"})
+    assert resp.status_code == 200, resp.text
+    text = resp.text
+    body, trailer = text[:text.rstrip("\n").rfind("\n") + 1], json.loads(text.splitlines()[-1])
+    return resp, body, trailer
+
+@pytest.mark.parametrize("action", ["stream_rows", "stream_rows_async"])
+def test_stream_sends_lines_and_a_receipt_over_them(action):
+    resp, body, trailer = _stream(action, {"n": 50})
+    lines = [json.loads(line) for line in body.splitlines()]
+    assert [line["i"] for line in lines] == list(range(50))
+    assert resp.headers["X-Execution-Id"] == trailer["id"]
+    assert trailer["status"] == "streamed" and trailer["lines"] == 50
+    assert trailer["receipt"] == make_receipt(trailer["id"], body)
+
+    db = SessionLocal()
+    try:
+        row = db.get(ExecutionLog, trailer["id"])
+        assert row.status == "streamed" and row.result is None and row.receipt == trailer["receipt"]
+        chunks = db.query(ExecutionChunk).filter_by(exec_id=trailer["id"]).order_by(ExecutionChunk.seq).all()
+        assert "".join(c.data for c in chunks) == body
+        if action == "stream_rows":
+            assert len(chunks) > 1 and all(len(c.data) < 1200 for c in chunks)
+    finally:
+        db.close()
+
+def test_replay_resends_stored_stream_with_proof():
+    nonce = f"stream-{uuid.uuid4().hex}"
+    _, body, trailer = _stream("stream_rows", {"n": 30}, nonce)
+    while seal_pending():
+        pass
+    _, replay_body, replay_trailer = _stream("stream_rows", {"n": 30}, nonce)
+    assert replay_body == body
+    assert replay_trailer["id"] == trailer["id"] and replay_trailer["receipt"] == trailer["receipt"]
+    assert replay_trailer["proof"] is not None
+
+    assert client.post("/execute", json={"action": "echo", "payload": {}, "nonce": nonce}).status_code == 400
+
+def test_handler_failure_ends_stream_with_failed_trailer():
+    nonce = f"stream-{uuid.uuid4().hex}"
+    _, _, trailer = _stream("stream_rows", {"n": 20, "explode": True}, nonce)
+    assert trailer["status"] == "failed" and trailer["error"] == "boom"
+
+    db = SessionLocal()
+    try:
+        row = db.get(ExecutionLog, trailer["id"])
+        assert row.status == "failed" and row.receipt == make_receipt(row.id, row.result)
+        assert db.query(ExecutionChunk).filter_by(exec_id=row.id).count() == 0
+    finally:
+        db.close()
+    _, body, replay = _stream("stream_rows", {}, nonce)
+    assert body == "" and replay["status"] == "failed" and replay["error"] == "boom"
+
+def test_endpoints_reject_the_wrong_kind_of_action():
+    resp = client.post("/execute", json={"action": "stream_rows", "payload": {}, "nonce": f"stream-{uuid.uuid4().hex}"})
+    assert resp.status_code == 400 and "/execute/stream" in resp.json()["detail"]
+    resp = client.post("/execute/stream", json={"action": "echo", "payload": {}, "nonce": f"stream-{uuid.uuid4().hex}"})
+    assert resp.status_code == 400
+
+def test_streaming_handlers_cannot_be_pure_or_cpu_bound():
+    with pytest.raises(TypeError):
+        register_action("stream_pure", _rows, pure=True)
+    with pytest.raises(TypeError):
+        register_action("stream_cpu", _rows, cpu_bound=True)
+
+def test_audit_detects_tampered_stream_chunks():
+    _, _, trailer = _stream("stream_rows", {"n": 5})
+    assert trailer["id"] not in audit(restart=True)["mismatched_ids"]
+
+    db = SessionLocal()
+    try:
+        chunk = db.query(ExecutionChunk).filter_by(exec_id=trailer["id"], seq=0).one()
+        original, chunk.data = chunk.data, '{"i": 99}\n'
+        db.commit()
+        try:
+            assert trailer["id"] in audit(restart=True)["mismatched_ids"]
+        finally:
+            chunk.data = original
+            db.commit()
+    finally:
+        db.close()
+
+def test_response_that_is_never_iterated_releases_slot_and_fails_row(monkeypatch):
+    from main import execute_action_stream
+    from openexec.admission import get_admission, reset_admission
+    from openexec.models import ExecutionRequest
+
+    monkeypatch.setenv("OPENEXEC_MAX_IN_FLIGHT", "4")
+    reset_admission()
+    try:
+        request = ExecutionRequest(action="stream_rows", payload={"n": 3}, nonce=f"stream-{uuid.uuid4().hex}")
+
+        async def abandoned():
+            resp = await execute_action_stream(request)
+            assert get_admission().stats()["in_flight"] == 1
+            # The client left before the body was sent; only the background task runs.
+            await resp.background()
+            return resp.headers["X-Execution-Id"]
+
+        exec_id = asyncio.run(abandoned())
+        assert get_admission().stats()["in_flight"] == 0
+        db = SessionLocal()
+        try:
+            row = db.get(ExecutionLog, exec_id)
+            assert row.status == "failed" and row.receipt == make_receipt(row.id, row.result)
+        finally:
+            db.close()
+    finally:
+        reset_admission()